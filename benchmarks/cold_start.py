@@ -0,0 +1,76 @@
+"""
+measures the cold start of the provider: the time to import the Lambda handler and the time to handle
+the first event, each in a fresh Python interpreter.
+
+The first event creates a user with inline passwords against an in-memory MySQL server, so that no network or
+AWS calls are part of the measurement. The MySQL connector, which the handler imports on first connect, is
+imported up front to install the fake and is reported separately.
+
+usage: python benchmarks/cold_start.py [--runs 10]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def child():
+    sys.path[:0] = [os.path.join(root, 'src'), os.path.join(root, 'tests')]
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-central-1')
+
+    start = time.perf_counter()
+    import provider
+    imported = time.perf_counter()
+
+    import mysql.connector
+    connector_imported = time.perf_counter()
+    from mysql_user_provider import MySQLUser
+    from fake_mysql import FakeServer
+    mysql.connector.connect = FakeServer().connect
+    MySQLUser.send_response = lambda self: None
+
+    request = {
+        'RequestType': 'Create', 'ResponseURL': 'https://example.com/response',
+        'StackId': 'arn:aws:cloudformation:us-west-2:EXAMPLE/stack-name/guid', 'RequestId': 'request-1',
+        'ResourceType': 'Custom::MySQLUser', 'LogicalResourceId': 'User',
+        'ResourceProperties': {
+            'User': 'benchmark', 'Password': 'password', 'WithDatabase': 'true',
+            'Database': {'User': 'root', 'Password': 'password', 'Host': 'localhost', 'Port': '3306',
+                         'DBName': 'mysql'}}}
+    before = time.perf_counter()
+    response = provider.handler(request, {})
+    handled = time.perf_counter()
+    assert response['Status'] == 'SUCCESS', response['Reason']
+
+    json.dump({'import': (imported - start) * 1000, 'connector_import': (connector_imported - imported) * 1000,
+               'first_event': (handled - before) * 1000, 'total': (handled - start) * 1000}, sys.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='measure the cold start of the provider')
+    parser.add_argument('--runs', type=int, default=10, help='number of fresh interpreters to measure')
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        return child()
+
+    results = []
+    # the timings of the request are written to standard output too, so they are switched off in the child
+    env = dict(os.environ, TIMING_SAMPLE_RATE='0')
+    for _ in range(args.runs):
+        output = subprocess.check_output([sys.executable, os.path.abspath(__file__), '--child'], env=env)
+        results.append(json.loads(output))
+
+    print('%-16s %10s %10s %10s' % ('phase', 'median ms', 'min ms', 'max ms'))
+    for phase in ['import', 'connector_import', 'first_event', 'total']:
+        values = [r[phase] for r in results]
+        print('%-16s %10.1f %10.1f %10.1f' % (phase, statistics.median(values), min(values), max(values)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,83 @@
+"""
+measures the wall-clock time per Create event with and without parallel I/O, against an in-memory MySQL server
+and Parameter Store with simulated latencies.
+
+By default the connection pool is disabled, so that every event opens a new connection like a cold container.
+
+usage: python benchmarks/parallel_io.py [--events 20] [--aws-latency 0.03] [--connect-latency 0.03] [--pool]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import uuid
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(root, 'src'), os.path.join(root, 'tests')]
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-central-1')
+# the timings of each request would be written between the results
+os.environ['TIMING_SAMPLE_RATE'] = '0'
+
+import aws_clients  # noqa: E402
+import mysql.connector  # noqa: E402
+import mysql_user_provider  # noqa: E402
+from connection_pool import pool  # noqa: E402
+from fake_aws import FakeSSM  # noqa: E402
+from fake_mysql import FakeServer  # noqa: E402
+from secret_cache import secret_cache  # noqa: E402
+
+
+def event(user):
+    return {
+        'RequestType': 'Create', 'ResponseURL': 'https://example.com/response',
+        'StackId': 'arn:aws:cloudformation:us-west-2:EXAMPLE/stack-name/guid',
+        'RequestId': 'request-%s' % uuid.uuid4(), 'ResourceType': 'Custom::MySQLUser', 'LogicalResourceId': 'User',
+        'ResourceProperties': {
+            'User': user, 'PasswordParameterName': '/users/%s' % user, 'WithDatabase': True,
+            'Database': {'User': 'root', 'PasswordParameterName': '/users/root', 'Host': 'localhost', 'Port': 3306,
+                         'DBName': 'mysql'}}}
+
+
+def run(parallel, args):
+    """
+    returns the duration in milliseconds of each event.
+    """
+    server = FakeServer(latency=args.query_latency, connect_latency=args.connect_latency)
+    ssm = FakeSSM({'/users/root': ('password', 1)}, latency=args.aws_latency)
+    ssm.parameters.update({'/users/u%d' % i: ('password%d' % i, 1) for i in range(args.events)})
+    mysql.connector.connect = server.connect
+    aws_clients.clients['ssm'] = ssm
+    mysql_user_provider.parallel_io = parallel
+    pool.clear()
+    pool.max_size = 4 if args.pool else 0
+    secret_cache.clear()
+
+    durations = []
+    for i in range(args.events):
+        start = time.perf_counter()
+        response = mysql_user_provider.handler(event('u%d' % i), {})
+        durations.append((time.perf_counter() - start) * 1000)
+        assert response['Status'] == 'SUCCESS', response['Reason']
+    return durations, len(ssm.calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='compare sequential and parallel I/O per event')
+    parser.add_argument('--events', type=int, default=20)
+    parser.add_argument('--aws-latency', type=float, default=0.03, help='seconds per Parameter Store call')
+    parser.add_argument('--connect-latency', type=float, default=0.03, help='seconds per MySQL connect')
+    parser.add_argument('--query-latency', type=float, default=0.002, help='seconds per MySQL round trip')
+    parser.add_argument('--pool', action='store_true', help='reuse connections across events')
+    args = parser.parse_args()
+    mysql_user_provider.MySQLUser.send_response = lambda self: None
+
+    print('%-12s %12s %12s %12s %10s' % ('mode', 'first ms', 'median ms', 'mean ms', 'ssm calls'))
+    for name, parallel in [('sequential', False), ('parallel', True)]:
+        durations, calls = run(parallel, args)
+        print('%-12s %12.1f %12.1f %12.1f %10d' % (
+            name, durations[0], statistics.median(durations[1:]), statistics.mean(durations), calls))
+
+
+if __name__ == '__main__':
+    main()
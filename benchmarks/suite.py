@@ -0,0 +1,227 @@
+"""
+measures the throughput and latency of the provider for create, update and delete events, of single users
+(Custom::MySQLUser) and of large fan-outs (Custom::MySQLUsers).
+
+By default the events are handled against the in-memory MySQL server of the tests, with simulated latencies. With
+--mysql, they are handled against a real server, e.g. the container from tests/README.md. The passwords are always
+served by the in-memory Parameter Store, and responses are not posted.
+
+For each scenario, the suite reports the events per second, the p50 and p99 latency, and the number of database
+round trips and AWS API calls per event.
+
+usage: python benchmarks/suite.py [--events 50] [--fan-out 100] [--mysql localhost:8033] [--json results.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(root, 'src'), os.path.join(root, 'tests')]
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-central-1')
+
+import aws_clients  # noqa: E402
+import mysql.connector  # noqa: E402
+import mysql_user_provider  # noqa: E402
+import mysql_users_provider  # noqa: E402
+from connection_pool import pool  # noqa: E402
+from fake_aws import FakeSSM  # noqa: E402
+from fake_mysql import FakeServer  # noqa: E402
+from secret_cache import secret_cache  # noqa: E402
+from server_capabilities import capabilities_cache  # noqa: E402
+from timing import timings  # noqa: E402
+
+connect = mysql.connector.connect
+
+
+class CountingCursor(object):
+
+    def __init__(self, cursor, counter):
+        self.cursor = cursor
+        self.counter = counter
+
+    def execute(self, operation, *args, **kwargs):
+        self.counter.round_trips += 1
+        return self.cursor.execute(operation, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+class CountingConnection(object):
+
+    def __init__(self, connection, counter):
+        self.connection = connection
+        self.counter = counter
+
+    def cursor(self, *args, **kwargs):
+        return CountingCursor(self.connection.cursor(*args, **kwargs), self.counter)
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+
+class Counter(object):
+    """
+    counts the round trips to the database, regardless of the server behind the connection.
+    """
+
+    def __init__(self, server=None):
+        self.server = server
+        self.round_trips = 0
+
+    def connect(self, **kwargs):
+        connection = self.server.connect(**kwargs) if self.server else connect(**kwargs)
+        return CountingConnection(connection, self)
+
+
+class Benchmark(object):
+
+    def __init__(self, args):
+        self.args = args
+        self.prefix = 'bench%s_' % uuid.uuid4().hex[:6]
+        if args.mysql:
+            host, _, port = args.mysql.partition(':')
+            self.host, self.port = host, int(port if port else 3306)
+            self.counter = Counter()
+        else:
+            self.host, self.port = 'localhost', 3306
+            self.counter = Counter(FakeServer(latency=args.query_latency, connect_latency=args.connect_latency))
+        self.ssm = FakeSSM({'/bench/root': (args.mysql_password, 1)}, latency=args.aws_latency)
+
+    def reset(self):
+        mysql.connector.connect = self.counter.connect
+        aws_clients.clients['ssm'] = self.ssm
+        mysql_user_provider.MySQLUser.send_response = lambda self: None
+        timings.sample_rate = 1.0 if self.args.timings else 0
+        timings.stream = open(os.devnull, 'w')
+        pool.clear()
+        pool.max_size = 0 if self.args.no_pool else 4
+        secret_cache.clear()
+        capabilities_cache.clear()
+
+    def user(self, i):
+        return '%su%s' % (self.prefix, i)
+
+    def properties(self, users, generation):
+        for user in users:
+            self.ssm.parameters['/bench/%s' % user] = ('password-%s-%d' % (user, generation), generation)
+        database = {'User': self.args.mysql_user, 'PasswordParameterName': '/bench/root', 'Host': self.host,
+                    'Port': self.port, 'DBName': 'mysql'}
+        entries = [{'User': u, 'PasswordParameterName': '/bench/%s' % u} for u in users]
+        return database, entries
+
+    def user_event(self, request_type, user, generation):
+        database, [entry] = self.properties([user], generation)
+        event = self.event(request_type, 'Custom::MySQLUser', dict(entry, Database=database, DeletionPolicy='Drop'))
+        event['PhysicalResourceId'] = 'mysql:%s:%s:mysql:%s:%s' % (self.host, self.port, user, user)
+        if request_type == 'Update':
+            event['OldResourceProperties'] = dict(event['ResourceProperties'])
+        return event
+
+    def users_event(self, request_type, index, generation):
+        users = [self.user('%d_%d' % (index, i)) for i in range(self.args.fan_out)]
+        database, entries = self.properties(users, 1)
+        old_entries = entries
+        if request_type == 'Update':
+            # changes the password of every other user, by referring to a new parameter version
+            entries = [dict(e, PasswordParameterName='%s:%d' % (e['PasswordParameterName'], generation))
+                       if i % 2 == 0 else e for i, e in enumerate(entries)]
+            for e in entries[::2]:
+                self.ssm.parameters[e['PasswordParameterName']] = ('changed-%d' % generation, generation)
+        event = self.event(request_type, 'Custom::MySQLUsers',
+                           {'Users': entries, 'Database': database, 'DeletionPolicy': 'Drop'})
+        event['LogicalResourceId'] = 'Users%d' % index
+        event['PhysicalResourceId'] = 'mysql:%s:%s:mysql:users:Users%d' % (self.host, self.port, index)
+        if request_type == 'Update':
+            event['OldResourceProperties'] = dict(event['ResourceProperties'], Users=old_entries)
+        return event
+
+    @staticmethod
+    def event(request_type, resource_type, properties):
+        return {
+            'RequestType': request_type, 'ResponseURL': 'https://example.com/response',
+            'StackId': 'arn:aws:cloudformation:us-west-2:EXAMPLE/stack-name/guid',
+            'RequestId': 'request-%s' % uuid.uuid4(), 'ResourceType': resource_type, 'LogicalResourceId': 'User',
+            'ResourceProperties': properties}
+
+    def run(self, name, handler, events):
+        """
+        handles the `events` one by one and returns the measurements of the scenario `name`.
+        """
+        durations = []
+        round_trips, aws_calls = self.counter.round_trips, len(self.ssm.calls)
+        start = time.perf_counter()
+        for event in events:
+            before = time.perf_counter()
+            response = handler(event, {})
+            durations.append((time.perf_counter() - before) * 1000)
+            if response['Status'] != 'SUCCESS':
+                raise AssertionError('%s failed, %s' % (name, response['Reason']))
+        elapsed = time.perf_counter() - start
+        return {
+            'scenario': name, 'events': len(events), 'events_per_second': len(events) / elapsed,
+            'p50_ms': statistics.median(durations), 'p99_ms': percentile(durations, 99),
+            'round_trips_per_event': (self.counter.round_trips - round_trips) / float(len(events)),
+            'aws_calls_per_event': (len(self.ssm.calls) - aws_calls) / float(len(events))}
+
+    def scenarios(self):
+        """
+        yields the name, handler and events of each scenario. Events of a scenario are generated just before they
+        are handled, as they depend on the parameters of the previous scenario.
+        """
+        n = self.args.events
+        handler = mysql_user_provider.handler
+        yield 'user create', handler, lambda: [self.user_event('Create', self.user(i), 1) for i in range(n)]
+        yield 'user update', handler, lambda: [self.user_event('Update', self.user(i), 2) for i in range(n)]
+        yield 'user delete', handler, lambda: [self.user_event('Delete', self.user(i), 2) for i in range(n)]
+
+        m = self.args.fan_out_events
+        handler = mysql_users_provider.handler
+        yield 'users create', handler, lambda: [self.users_event('Create', i, 1) for i in range(m)]
+        yield 'users update', handler, lambda: [self.users_event('Update', i, 2) for i in range(m)]
+        yield 'users delete', handler, lambda: [self.users_event('Delete', i, 2) for i in range(m)]
+
+    def __call__(self):
+        self.reset()
+        return [self.run(name, handler, events()) for name, handler, events in self.scenarios()]
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='measure throughput and latency of the provider')
+    parser.add_argument('--events', type=int, default=50, help='events per single user scenario')
+    parser.add_argument('--fan-out', type=int, default=100, help='users per Custom::MySQLUsers event')
+    parser.add_argument('--fan-out-events', type=int, default=5, help='events per fan-out scenario')
+    parser.add_argument('--aws-latency', type=float, default=0.0, help='seconds per Parameter Store call')
+    parser.add_argument('--connect-latency', type=float, default=0.0, help='seconds per connect to the fake')
+    parser.add_argument('--query-latency', type=float, default=0.0, help='seconds per round trip to the fake')
+    parser.add_argument('--mysql', metavar='HOST:PORT', help='run against a real MySQL server instead of the fake')
+    parser.add_argument('--mysql-user', default='root')
+    parser.add_argument('--mysql-password', default='password')
+    parser.add_argument('--no-pool', action='store_true', help='open a new connection for every event')
+    parser.add_argument('--timings', action='store_true', help='include the overhead of the timing instrumentation')
+    parser.add_argument('--json', metavar='FILE', help='write the results to FILE, as a baseline to compare with')
+    args = parser.parse_args()
+
+    results = Benchmark(args)()
+    print('%-14s %7s %10s %9s %9s %12s %10s' % (
+        'scenario', 'events', 'events/s', 'p50 ms', 'p99 ms', 'round trips', 'aws calls'))
+    for r in results:
+        print('%-14s %7d %10.1f %9.2f %9.2f %12.1f %10.1f' % (
+            r['scenario'], r['events'], r['events_per_second'], r['p50_ms'], r['p99_ms'],
+            r['round_trips_per_event'], r['aws_calls_per_event']))
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,16 @@
+import threading
+
+clients = {}
+lock = threading.Lock()
+
+
+def get_client(service):
+    """
+    returns the boto3 client for `service`, created on first use. boto3 itself is only imported
+    when the first client is needed, as it takes a considerable part of the cold start.
+    """
+    with lock:
+        if service not in clients:
+            import boto3
+            clients[service] = boto3.client(service)
+        return clients[service]
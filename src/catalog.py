@@ -0,0 +1,118 @@
+import logging
+
+from grants import db_privilege_columns, privileges_from_columns
+
+log = logging.getLogger()
+
+
+class Catalog(object):
+    """
+    snapshot of the users and schemas on a database server, so that existence checks for many
+    users do not require a round trip each.
+    """
+
+    def __init__(self, users=(), schemas=()):
+        self.users = set(users)
+        self.schemas = set(schemas)
+        self.credentials = {}
+
+    def has_user(self, user, host):
+        return (user, host) in self.users
+
+    def credentials_of(self, user, host):
+        """
+        returns the authentication plugin and string, and the lock state of the user, if loaded.
+        """
+        return self.credentials.get((user, host))
+
+    def has_schema(self, name):
+        return name in self.schemas
+
+    @staticmethod
+    def load(connection, users, schemas, credentials=False):
+        """
+        reads the `users` and `schemas` which exist on the server, with a single query each. With `credentials`,
+        the authentication plugin, authentication string and lock state of the users are read too.
+        """
+        catalog = Catalog()
+        cursor = connection.cursor()
+        try:
+            if users and credentials:
+                cursor.execute('SELECT user, host, plugin, authentication_string, account_locked FROM mysql.user '
+                               'WHERE user IN (%s)' % ', '.join(['%s'] * len(users)), list(users))
+                for row in cursor.fetchall():
+                    catalog.users.add((row[0], row[1]))
+                    catalog.credentials[(row[0], row[1])] = tuple(row[2:])
+            elif users:
+                cursor.execute('SELECT user, host FROM mysql.user WHERE user IN (%s)' %
+                               ', '.join(['%s'] * len(users)), list(users))
+                catalog.users.update((u, h) for u, h in cursor.fetchall())
+            if schemas:
+                cursor.execute('SELECT SCHEMA_NAME FROM information_schema.schemata WHERE SCHEMA_NAME IN (%s)' %
+                               ', '.join(['%s'] * len(schemas)), list(schemas))
+                catalog.schemas.update(r[0] for r in cursor.fetchall())
+        finally:
+            cursor.close()
+        log.info('loaded catalog of %d users and %d schemas', len(catalog.users), len(catalog.schemas))
+        return catalog
+
+
+class Snapshot(Catalog):
+    """
+    snapshot of the accounts, schemas and database privileges on a database server, indexed to compare many users
+    in a single pass.
+    """
+
+    def __init__(self, users=(), schemas=()):
+        super(Snapshot, self).__init__(users, schemas)
+        self.locked = set()
+        self.privileges = {}
+
+    def is_locked(self, user, host):
+        return (user, host) in self.locked
+
+    def database_privileges(self, user, host):
+        """
+        returns the privileges per (database, '*') of the account, as recorded in mysql.db.
+        """
+        return {(db, '*'): set(p) for db, p in self.privileges.get((user, host), {}).items()}
+
+    @staticmethod
+    def load(connection, users, schemas, capabilities=None):
+        """
+        reads the accounts of `users` with their lock state, the `schemas` which exist and the database
+        privileges of `users`, with a single query each.
+        """
+        snapshot = Snapshot()
+        if capabilities is not None and not capabilities.account_lock:
+            accounts = "SELECT user, host, 'N' FROM mysql.user"
+        elif capabilities is not None and capabilities.vendor == 'MariaDB':
+            # from MariaDB 10.4 onwards, the lock state is only stored in mysql.global_priv
+            accounts = "SELECT user, host, IF(JSON_VALUE(priv, '$.account_locked') = 'true', 'Y', 'N') " \
+                       "FROM mysql.global_priv"
+        else:
+            accounts = 'SELECT user, host, account_locked FROM mysql.user'
+        columns = ', '.join(db_privilege_columns.keys())
+
+        cursor = connection.cursor()
+        try:
+            if users:
+                in_users = ', '.join(['%s'] * len(users))
+                cursor.execute('%s WHERE user IN (%s)' % (accounts, in_users), list(users))
+                for user, host, account_locked in cursor.fetchall():
+                    snapshot.users.add((user, host))
+                    if account_locked == 'Y':
+                        snapshot.locked.add((user, host))
+                cursor.execute('SELECT user, host, db, %s FROM mysql.db WHERE user IN (%s)' % (columns, in_users),
+                               list(users))
+                for row in cursor.fetchall():
+                    snapshot.privileges.setdefault((row[0], row[1]), {})[row[2]] = privileges_from_columns(row[3:])
+            if schemas:
+                cursor.execute('SELECT SCHEMA_NAME FROM information_schema.schemata WHERE SCHEMA_NAME IN (%s)' %
+                               ', '.join(['%s'] * len(schemas)), list(schemas))
+                snapshot.schemas.update(r[0] for r in cursor.fetchall())
+        finally:
+            cursor.close()
+        log.info('loaded snapshot of %d users, %d locked, and %d schemas',
+                 len(snapshot.users), len(snapshot.locked), len(snapshot.schemas))
+        return snapshot
@@ -0,0 +1,180 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+
+log = logging.getLogger()
+
+
+def fingerprint(password):
+    """
+    returns a digest of the `password`, so the pool can detect a rotated owner password
+    without keeping the plaintext around.
+    """
+    return hashlib.sha256((password if password else '').encode('utf-8')).hexdigest()
+
+
+class PooledConnection(object):
+
+    def __init__(self, connection, key, fingerprint):
+        self.connection = connection
+        self.key = key
+        self.fingerprint = fingerprint
+        self.created = time.time()
+        self.last_used = self.created
+
+
+class ConnectionPool(object):
+    """
+    keeps database connections open across warm Lambda invocations.
+
+    Connections are keyed by endpoint and owner, e.g. (host, port, dbname, user). An idle
+    connection is only handed out again if it is still alive, has not been idle for longer
+    than `max_idle_time` seconds, is younger than `max_lifetime` seconds and was opened
+    with the same owner password.
+    """
+
+    def __init__(self, max_idle_time=300, max_lifetime=3600, max_size=4):
+        self.max_idle_time = max_idle_time
+        self.max_lifetime = max_lifetime
+        self.max_size = max_size
+        self.idle = {}
+        self.in_use = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+
+    def reason_to_discard(self, entry, now):
+        if now - entry.last_used > self.max_idle_time:
+            return 'idle for %.0f seconds' % (now - entry.last_used)
+        if now - entry.created > self.max_lifetime:
+            return 'older than %d seconds' % self.max_lifetime
+        return None
+
+    def discard(self, entry, reason):
+        log.debug('discarding connection to %s, %s', entry.key, reason)
+        with self.lock:
+            self.discarded += 1
+        try:
+            entry.connection.close()
+        except Exception as e:
+            log.debug('ignoring error on close of discarded connection, %s', e)
+
+    def prune(self):
+        """
+        closes all idle connections which exceeded their idle time or lifetime.
+        """
+        now = time.time()
+        with self.lock:
+            expired = []
+            for key, entries in self.idle.items():
+                keep = []
+                for entry in entries:
+                    reason = self.reason_to_discard(entry, now)
+                    if reason:
+                        expired.append((entry, reason))
+                    else:
+                        keep.append(entry)
+                self.idle[key] = keep
+        for entry, reason in expired:
+            self.discard(entry, reason)
+
+    def take_idle(self, key):
+        with self.lock:
+            entries = self.idle.get(key)
+            return entries.pop() if entries else None
+
+    def acquire(self, key, password, connect):
+        """
+        returns an open connection for `key`, reusing an idle one if possible. `connect` is
+        called without arguments to open a new connection on a miss.
+        """
+        self.prune()
+        owner_fingerprint = fingerprint(password)
+        entry = self.take_idle(key)
+        while entry is not None:
+            if entry.fingerprint != owner_fingerprint:
+                self.discard(entry, 'owner password has changed')
+            elif not self.is_alive(entry.connection):
+                self.discard(entry, 'connection is no longer alive')
+            else:
+                with self.lock:
+                    self.hits += 1
+                    self.in_use[id(entry.connection)] = entry
+                return entry.connection
+            entry = self.take_idle(key)
+
+        connection = connect()
+        with self.lock:
+            self.misses += 1
+            self.in_use[id(connection)] = PooledConnection(connection, key, owner_fingerprint)
+        return connection
+
+    def release(self, connection, reusable=True):
+        """
+        returns the `connection` to the pool, or closes it when it is not `reusable` or the
+        pool for its key is full. An open transaction is rolled back first, so an idle
+        connection does not keep a snapshot or metadata locks across invocations.
+        """
+        if reusable and self.in_transaction(connection):
+            try:
+                connection.rollback()
+            except Exception as e:
+                log.debug('failed to roll back the transaction of a released connection, %s', e)
+                reusable = False
+        with self.lock:
+            entry = self.in_use.pop(id(connection), None)
+            if entry is not None and reusable:
+                entry.last_used = time.time()
+                entries = self.idle.setdefault(entry.key, [])
+                if len(entries) < self.max_size:
+                    entries.append(entry)
+                    return
+        if entry is not None:
+            self.discard(entry, 'not reusable' if not reusable else 'pool is full')
+        else:
+            connection.close()
+
+    def invalidate(self, key):
+        """
+        closes all idle connections for `key`.
+        """
+        with self.lock:
+            entries = self.idle.pop(key, [])
+        for entry in entries:
+            self.discard(entry, 'invalidated')
+
+    def clear(self):
+        """
+        closes all idle connections and resets the counters.
+        """
+        with self.lock:
+            entries = [e for es in self.idle.values() for e in es]
+            self.idle = {}
+            self.hits = self.misses = self.discarded = 0
+        for entry in entries:
+            self.discard(entry, 'pool cleared')
+
+    @staticmethod
+    def is_alive(connection):
+        try:
+            return connection.is_connected()
+        except Exception:
+            return False
+
+    @staticmethod
+    def in_transaction(connection):
+        return getattr(connection, 'in_transaction', False)
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'discarded': self.discarded,
+                    'idle': sum(len(e) for e in self.idle.values())}
+
+
+pool = ConnectionPool(
+    max_idle_time=int(os.environ.get('POOL_MAX_IDLE_TIME', '300')),
+    max_lifetime=int(os.environ.get('POOL_MAX_LIFETIME', '3600')),
+    max_size=int(os.environ.get('POOL_SIZE', '4')))
@@ -0,0 +1,138 @@
+import re
+from collections import OrderedDict
+
+object_pattern = re.compile(r'^(\*|`(?:[^`]|``)+`|[^`.\s]+)\.(\*|`(?:[^`]|``)+`|[^`.\s]+)$')
+
+# the static privileges which MySQL 8.0 lists instead of ALL PRIVILEGES in SHOW GRANTS for a global grant
+global_all_privileges = {
+    'SELECT', 'INSERT', 'UPDATE', 'DELETE', 'CREATE', 'DROP', 'RELOAD', 'SHUTDOWN', 'PROCESS', 'FILE', 'REFERENCES',
+    'INDEX', 'ALTER', 'SHOW DATABASES', 'SUPER', 'CREATE TEMPORARY TABLES', 'LOCK TABLES', 'EXECUTE',
+    'REPLICATION SLAVE', 'REPLICATION CLIENT', 'CREATE VIEW', 'SHOW VIEW', 'CREATE ROUTINE', 'ALTER ROUTINE',
+    'CREATE USER', 'EVENT', 'TRIGGER', 'CREATE TABLESPACE', 'CREATE ROLE', 'DROP ROLE'}
+
+
+def quote_identifier(name):
+    return '*' if name == '*' else '`%s`' % name.replace('`', '``')
+
+
+def unquote_identifier(name):
+    return name[1:-1].replace('``', '`') if name.startswith('`') else name
+
+
+def normalize_privilege(privilege):
+    privilege = ' '.join(privilege.upper().split())
+    return 'ALL PRIVILEGES' if privilege == 'ALL' else privilege
+
+
+def parse_grant(line):
+    """
+    returns ((database, table), privileges) of a line of SHOW GRANTS output, or None if the line does not
+    grant privileges on a database or table. The grant option is returned as the privilege GRANT OPTION. Column
+    privileges, routines, roles and proxies are not managed.
+    """
+    match = re.match(r'^GRANT (.+?) ON (.+?) TO (.*)$', line)
+    if not match or '(' in match.group(1):
+        return None
+    target = object_pattern.match(match.group(2).strip())
+    if not target:
+        return None
+    privileges = set(normalize_privilege(p) for p in match.group(1).split(',')) - {'USAGE'}
+    if re.search(r'\sWITH\s+(.*\s)?GRANT OPTION\b', match.group(3), re.IGNORECASE):
+        privileges.add('GRANT OPTION')
+    if not privileges:
+        return None
+    return (unquote_identifier(target.group(1)), unquote_identifier(target.group(2))), privileges
+
+
+def parse_grants(lines):
+    """
+    returns the privileges per (database, table) granted by the SHOW GRANTS output `lines`. A global grant of all
+    static privileges, as MySQL 8.0 lists ALL PRIVILEGES, is returned as ALL PRIVILEGES.
+    """
+    result = {}
+    for line in lines:
+        grant = parse_grant(line)
+        if grant:
+            result.setdefault(grant[0], set()).update(grant[1])
+    privileges = result.get(('*', '*'), set())
+    if privileges.issuperset(global_all_privileges):
+        result[('*', '*')] = {'ALL PRIVILEGES'} | (privileges - global_all_privileges)
+    return result
+
+
+def declared_grants(grants):
+    """
+    returns the privileges per (database, table) of the `Grants` property.
+    """
+    result = {}
+    for grant in grants:
+        key = (grant['Database'], grant.get('Table', '*'))
+        result.setdefault(key, set()).update(normalize_privilege(p) for p in grant['Privileges'])
+    return result
+
+
+def diff(current, desired):
+    """
+    returns the privileges to revoke and to grant per (database, table), to get from the `current` to the
+    `desired` grants. The grant option is not part of ALL PRIVILEGES, so it is granted and revoked on its own.
+    """
+    revokes, grants = {}, {}
+    for key in set(current) | set(desired):
+        have, want = current.get(key, set()), desired.get(key, set())
+        revoke, grant = set(), set()
+        if 'GRANT OPTION' in have - want:
+            revoke.add('GRANT OPTION')
+        if 'GRANT OPTION' in want - have:
+            grant.add('GRANT OPTION')
+        have, want = have - {'GRANT OPTION'}, want - {'GRANT OPTION'}
+        if 'ALL PRIVILEGES' in want:
+            if 'ALL PRIVILEGES' not in have:
+                grant.add('ALL PRIVILEGES')
+        else:
+            if 'ALL PRIVILEGES' in have:
+                revoke.add('ALL PRIVILEGES')
+                have = set()
+            revoke.update(have - want)
+            grant.update(want - have)
+        if revoke:
+            revokes[key] = revoke
+        if grant:
+            grants[key] = grant
+    return revokes, grants
+
+
+def statements(account, current, desired):
+    """
+    returns the REVOKE and GRANT statements for `account`, a (user, host) tuple, to get from the `current` to
+    the `desired` grants. Unchanged grants yield no statements.
+    """
+    revokes, grants = diff(current, desired)
+    result = []
+    for verb, preposition, changes in [('REVOKE', 'FROM', revokes), ('GRANT', 'TO', grants)]:
+        for (database, table) in sorted(changes):
+            target = '*.*' if database == '*' else '%s.%s' % (quote_identifier(database), quote_identifier(table))
+            result.append(('%s %s ON %s %s %%s@%%s' % (verb, ', '.join(sorted(changes[(database, table)])),
+                                                     target, preposition), list(account)))
+    return result
+
+
+# the privilege columns of mysql.db, and the privilege they represent
+db_privilege_columns = OrderedDict([
+    ('Select_priv', 'SELECT'), ('Insert_priv', 'INSERT'), ('Update_priv', 'UPDATE'), ('Delete_priv', 'DELETE'),
+    ('Create_priv', 'CREATE'), ('Drop_priv', 'DROP'), ('References_priv', 'REFERENCES'), ('Index_priv', 'INDEX'),
+    ('Alter_priv', 'ALTER'), ('Create_tmp_table_priv', 'CREATE TEMPORARY TABLES'), ('Lock_tables_priv', 'LOCK TABLES'),
+    ('Create_view_priv', 'CREATE VIEW'), ('Show_view_priv', 'SHOW VIEW'), ('Create_routine_priv', 'CREATE ROUTINE'),
+    ('Alter_routine_priv', 'ALTER ROUTINE'), ('Execute_priv', 'EXECUTE'), ('Event_priv', 'EVENT'),
+    ('Trigger_priv', 'TRIGGER'), ('Grant_priv', 'GRANT OPTION'),
+])
+
+
+def privileges_from_columns(values):
+    """
+    returns the privileges of a row of mysql.db, given the `values` of the `db_privilege_columns`. If all privileges
+    are granted, they are reported as ALL PRIVILEGES, as SHOW GRANTS does.
+    """
+    granted = set(p for p, v in zip(db_privilege_columns.values(), values) if v == 'Y')
+    if granted.issuperset(set(db_privilege_columns.values()) - {'GRANT OPTION'}):
+        granted = {'ALL PRIVILEGES'} | (granted & {'GRANT OPTION'})
+    return granted
@@ -0,0 +1,63 @@
+import logging
+import os
+import threading
+import time
+
+from aws_clients import get_client
+
+log = logging.getLogger()
+
+# marks the connections of an owner with IAM authentication in the pool, as the token itself changes on each refresh
+iam_credential = 'AWSAuthenticationPlugin'
+
+
+class TokenCache(object):
+    """
+    IAM database authentication tokens per endpoint and owner, from `rds.generate_db_auth_token`.
+
+    A token is valid for 15 minutes, so it is reused for `ttl` seconds across warm invocations, leaving a margin to
+    open the connection. A token is only needed to open a new connection: pooled connections stay authenticated
+    after the token has expired.
+    """
+
+    def __init__(self, ttl=840):
+        self.ttl = ttl
+        self.entries = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, host, port, user):
+        """
+        returns a token for `user` on `host`:`port`, generating a new one if the cached one is about to expire.
+        """
+        key = (host, port, user)
+        now = time.time()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry and now - entry[1] < self.ttl:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        log.info('generating IAM authentication token for %s on %s:%s', user, host, port)
+        token = get_client('rds').generate_db_auth_token(DBHostname=host, Port=port, DBUsername=user)
+        with self.lock:
+            self.entries[key] = (token, now)
+        return token
+
+    def invalidate(self, host, port, user):
+        with self.lock:
+            self.entries.pop((host, port, user), None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+
+token_cache = TokenCache(ttl=int(os.environ.get('IAM_TOKEN_TTL', '840')))
@@ -0,0 +1,172 @@
+"""
+provisions the users of a manifest directly, without CloudFormation, with the same create and drop code as the
+Custom::MySQLUsers provider. Use it to migrate or rotate large numbers of users.
+
+The manifest is a YAML or JSON file with the properties of a Custom::MySQLUsers resource. A user may specify its own
+`Database`, and a `State` of `Present` (default) to create or update it, or `Absent` to drop it. The servers are
+provisioned in parallel, each with a single pooled connection. A summary with the result and duration per user is
+printed; the exit code is 1 if any user failed.
+
+usage: python src/manifest.py [--plan] [--json] [--verbose] users.yaml
+"""
+import argparse
+import copy
+import json
+import logging
+import os
+import sys
+import time
+import uuid
+from collections import OrderedDict
+
+import plan
+from mysql_user_provider import endpoint_executor, endpoint_key
+from mysql_users_provider import MySQLUsers
+
+log = logging.getLogger()
+
+states = {'Present': 'created', 'Absent': 'dropped'}
+
+# the properties of the manifest which apply to all users, unless specified on the user
+defaults = ['WithDatabase', 'DeletionPolicy', 'DropStrategy', 'DropChunkSize', 'ActiveSessions', 'DrainTimeout',
+            'ResourceLimits', 'Plan']
+
+
+def load(path):
+    """
+    returns the manifest in the YAML or JSON file at `path`. Reading YAML requires PyYAML.
+    """
+    with open(path) as f:
+        if os.path.splitext(path)[1].lower() not in ('.yaml', '.yml'):
+            return json.load(f)
+        try:
+            import yaml
+        except ImportError:
+            raise ValueError('PyYAML is required to read %s, install it or use a JSON manifest' % path)
+        return yaml.safe_load(f)
+
+
+def group_by_endpoint(manifest):
+    """
+    returns the users of the `manifest` per endpoint, as a tuple of the properties of a Custom::MySQLUsers resource
+    and the action per user, 'created' or 'dropped'.
+    """
+    groups = OrderedDict()
+    for user in manifest.get('Users', []):
+        user = dict(user)
+        state = user.pop('State', 'Present')
+        if state not in states:
+            raise ValueError('State of user %s must be Present or Absent, not %s' % (user.get('User'), state))
+        database = user.pop('Database', manifest.get('Database'))
+        if not database:
+            raise ValueError('no Database specified for user %s' % user.get('User'))
+        for connection in database if isinstance(database, list) else [database]:
+            key = endpoint_key(connection)
+            if key not in groups:
+                properties = {k: manifest[k] for k in defaults if k in manifest}
+                groups[key] = (dict(properties, Database=connection, Users=[]), OrderedDict())
+            groups[key][0]['Users'].append(user)
+            groups[key][1][user.get('User')] = states[state]
+    return groups
+
+
+class Provisioner(MySQLUsers):
+    """
+    provisions the users of a manifest on a single server.
+    """
+
+    def prepare(self, properties):
+        """
+        sets the `properties` as a request, and raises a ValueError if they are invalid.
+        """
+        self.set_request({'RequestType': 'Create', 'StackId': '', 'LogicalResourceId': 'Manifest',
+                          'RequestId': str(uuid.uuid4()), 'ResourceType': 'Custom::MySQLUsers',
+                          'ResourceProperties': copy.deepcopy(properties)}, None)
+        if not self.is_valid_request() or not self.has_unique_users():
+            raise ValueError(self.reason)
+
+    def provision(self, actions):
+        """
+        applies the `actions` per user, and returns the result and duration per user.
+        """
+        try:
+            results = self.apply([(p, actions[u]) for u, p in self.users.items()])
+        except Exception as e:
+            log.error('failed to provision users on %s, %s', endpoint_key(self.get('Database')), e)
+            results = OrderedDict((u, 'failed: %s' % e) for u in actions)
+        finally:
+            self.close()
+        return OrderedDict((u, OrderedDict([('Result', r), ('Seconds', round(self.durations.get(u, 0.0), 3))]))
+                           for u, r in results.items())
+
+
+def provision(manifest):
+    """
+    provisions the users of the `manifest` on all servers at the same time, and returns a report with the result
+    and duration per user on each server. With `Plan`, the statements are reported instead of executed.
+    """
+    started = time.monotonic()
+    groups = group_by_endpoint(manifest)
+    provisioners = OrderedDict()
+    for endpoint, (properties, _) in groups.items():
+        provisioners[endpoint] = Provisioner()
+        try:
+            provisioners[endpoint].prepare(properties)
+        except ValueError as e:
+            raise ValueError('%s: %s' % (endpoint, e))
+
+    jobs = OrderedDict((e, endpoint_executor.submit(p.provision, groups[e][1])) for e, p in provisioners.items())
+    servers = OrderedDict()
+    for endpoint, job in jobs.items():
+        servers[endpoint] = OrderedDict([('Users', job.result())])
+        if provisioners[endpoint].planning:
+            servers[endpoint]['Plan'] = plan.text(provisioners[endpoint].plan)
+
+    results = [u['Result'] for s in servers.values() for u in s['Users'].values()]
+    report = OrderedDict((status.capitalize(), len([r for r in results if r.startswith(status)]))
+                         for status in ['created', 'dropped', 'failed'])
+    report['Seconds'] = round(time.monotonic() - started, 3)
+    report['Servers'] = servers
+    return report
+
+
+def summary(report):
+    """
+    returns the `report` as text, with a line per user.
+    """
+    lines = ['%-40s %-32s %8s  %s' % ('SERVER', 'USER', 'SECONDS', 'RESULT')]
+    for endpoint, server in report['Servers'].items():
+        for user, result in server['Users'].items():
+            lines.append('%-40s %-32s %8.3f  %s' % (endpoint, user, result['Seconds'], result['Result']))
+    for endpoint, server in report['Servers'].items():
+        if server.get('Plan'):
+            lines.extend(['', '-- %s' % endpoint, server['Plan']])
+    lines.append('')
+    lines.append('%d created, %d dropped, %d failed on %d servers in %.3fs' % (
+        report['Created'], report['Dropped'], report['Failed'], len(report['Servers']), report['Seconds']))
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='provisions the MySQL users of a manifest')
+    parser.add_argument('manifest', help='YAML or JSON file with the users')
+    parser.add_argument('--plan', action='store_true', help='print the statements instead of executing them')
+    parser.add_argument('--json', action='store_true', help='print the report as JSON')
+    parser.add_argument('--verbose', action='store_true', help='log the progress per user')
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, format='%(levelname)s %(message)s')
+
+    try:
+        manifest = load(args.manifest)
+        if args.plan:
+            manifest['Plan'] = True
+        report = provision(manifest)
+    except (OSError, ValueError) as e:
+        sys.stderr.write('%s\n' % e)
+        return 2
+    print(json.dumps(report, indent=2) if args.json else summary(report))
+    return 1 if report['Failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
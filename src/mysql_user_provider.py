@@ -1,27 +1,67 @@
+import copy
+import json
 import logging
 import os
 
-import random
+import secrets
 import string
-import boto3
+import time
+from collections import OrderedDict
+from concurrent import futures
 from hashlib import sha1
-import mysql.connector
-from botocore.exceptions import ClientError
+import jsonschema
+import requests
+from jsonschema import Draft4Validator, validators
+import grants
+import plan
+from aws_clients import get_client
 from cfn_resource_provider import ResourceProvider
+from connection_pool import pool
+from iam_auth import iam_credential, token_cache
+import retry
+from retry import Retry, is_connection_lost
+from schema_drop import SchemaDrop, time_margin
+from secret_cache import secret_cache
+from server_capabilities import capabilities_cache
+from sessions import drain_sessions, find_sessions, kill_sessions
+import slots
+from slots import EndpointSlots
+from timing import statement_label, timings
 
 log = logging.getLogger()
 log.setLevel(os.environ.get("LOG_LEVEL", "INFO"))
 
+parallel_io = os.environ.get('PARALLEL_IO', 'true').lower() == 'true'
+executor = futures.ThreadPoolExecutor(max_workers=int(os.environ.get('IO_THREADS', '4')))
+endpoint_executor = futures.ThreadPoolExecutor(max_workers=int(os.environ.get('ENDPOINT_THREADS', '8')))
+max_invocations = int(os.environ.get('MAX_INVOCATIONS', '20'))
+rds_ca_bundle = os.environ.get(
+    'RDS_CA_BUNDLE', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'rds-global-bundle.pem'))
+http = requests.Session()
+
 request_schema = {
     "$schema": "http://json-schema.org/draft-04/schema#",
     "type": "object",
     "oneOf": [
         {"required": ["Database", "User", "Password"]},
         {"required": ["Database", "User", "PasswordParameterName"]},
-        {"required": ["Database", "User", "PasswordSecretName"]}
+        {"required": ["Database", "User", "PasswordSecretName"]},
+        {"required": ["Database", "User", "PasswordHash"]},
+        {"required": ["Database", "User", "GeneratePassword"]},
+        {"required": ["Database", "User", "AuthPlugin"],
+         "properties": {"AuthPlugin": {"enum": ["AWSAuthenticationPlugin"]}}}
     ],
+    "dependencies": {
+        "PasswordHash": ["AuthPlugin"]
+    },
     "properties": {
-        "Database": {"$ref": "#/definitions/connection"},
+        "Database": {
+            "oneOf": [
+                {"$ref": "#/definitions/connection"},
+                {"type": "array", "items": {"$ref": "#/definitions/connection"}, "minItems": 1}
+            ],
+            "description": "the database server, or a list of database servers to create the user on"
+        },
         "User": {
             "type": "string",
             "pattern": "^[_$A-Za-z][A-Za-z0-9_$]*(@[.A-Za-z0-9%_$\\-]+)?$",
@@ -43,6 +83,44 @@ request_schema = {
             "minLength": 1,
             "description": "the name of the password in the Secret Manager."
         },
+        "PasswordHash": {
+            "type": "string",
+            "minLength": 1,
+            "description": "the password of the user, hashed by the AuthPlugin"
+        },
+        "GeneratePassword": {
+            "type": "object",
+            "additionalProperties": False,
+            "oneOf": [
+                {"required": ["ParameterName"]},
+                {"required": ["SecretName"]}
+            ],
+            "properties": {
+                "ParameterName": {
+                    "type": "string",
+                    "minLength": 1,
+                    "description": "the name of the parameter in the Parameter Store to store the password in"
+                },
+                "SecretName": {
+                    "type": "string",
+                    "minLength": 1,
+                    "description": "the name of the secret in the Secrets Manager to store the password in"
+                },
+                "Length": {
+                    "type": "integer",
+                    "default": 32,
+                    "minimum": 16,
+                    "maximum": 32,
+                    "description": "the number of characters of the password"
+                }
+            },
+            "description": "generate the password of the user, and store it"
+        },
+        "AuthPlugin": {
+            "type": "string",
+            "enum": ["mysql_native_password", "caching_sha2_password", "AWSAuthenticationPlugin"],
+            "description": "the authentication plugin of the user, defaults to the default of the server"
+        },
         "WithDatabase": {
             "type": "boolean",
             "default": True,
@@ -52,15 +130,90 @@ request_schema = {
             "type": "string",
             "default": "Retain",
             "enum": ["Drop", "Retain"]
+        },
+        "DropStrategy": {
+            "type": "string",
+            "default": "Database",
+            "enum": ["Database", "Chunked", "Rename"],
+            "description": "drop the database at once, in chunks of tables, or move its tables out first"
+        },
+        "DropChunkSize": {
+            "type": "integer",
+            "default": 100,
+            "minimum": 1,
+            "description": "the number of tables to drop per statement, for the Chunked and Rename strategies"
+        },
+        "ActiveSessions": {
+            "type": "string",
+            "default": "Keep",
+            "enum": ["Keep", "Kill", "Drain"],
+            "description": "what to do with sessions of the user before its password is changed or it is dropped"
+        },
+        "DrainTimeout": {
+            "type": "integer",
+            "default": 30,
+            "minimum": 0,
+            "description": "the seconds to wait for active sessions to finish, before they are killed"
+        },
+        "Resumable": {
+            "type": "boolean",
+            "default": False,
+            "description": "continue work which does not fit in one invocation in the next, before responding"
+        },
+        "Grants": {
+            "type": "array",
+            "items": {"$ref": "#/definitions/grant"},
+            "description": "the privileges of the user. If absent, the grants are not managed"
+        },
+        "Plan": {
+            "type": "boolean",
+            "default": False,
+            "description": "return the statements which would be executed, without executing them"
+        },
+        "ResourceLimits": {
+            "type": "object",
+            "additionalProperties": False,
+            "properties": {
+                "MaxQueriesPerHour": {"type": "integer", "minimum": 0},
+                "MaxUpdatesPerHour": {"type": "integer", "minimum": 0},
+                "MaxConnectionsPerHour": {"type": "integer", "minimum": 0},
+                "MaxUserConnections": {"type": "integer", "minimum": 0}
+            },
+            "description": "the limits on the use of server resources by the user, 0 means no limit"
         }
     },
     "definitions": {
+        "grant": {
+            "type": "object",
+            "required": ["Database", "Privileges"],
+            "properties": {
+                "Database": {
+                    "type": "string",
+                    "minLength": 1,
+                    "description": "the database to grant privileges on, or * for all databases"
+                },
+                "Table": {
+                    "type": "string",
+                    "minLength": 1,
+                    "default": "*",
+                    "description": "the table to grant privileges on, or * for all tables"
+                },
+                "Privileges": {
+                    "type": "array",
+                    "minItems": 1,
+                    "items": {"type": "string", "pattern": "^[A-Za-z_ ]+$"},
+                    "description": "the privileges to grant, e.g. SELECT, INSERT or ALL"
+                }
+            }
+        },
         "connection": {
             "type": "object",
             "oneOf": [
                 {"required": ["DBName", "Host", "Port", "User", "Password"]},
                 {"required": ["DBName", "Host", "Port", "User", "PasswordParameterName"]},
-                {"required": ["DBName", "Host", "Port", "User", "PasswordSecretName"]}
+                {"required": ["DBName", "Host", "Port", "User", "PasswordSecretName"]},
+                {"required": ["DBName", "Host", "Port", "User", "IAMAuthentication"],
+                 "properties": {"IAMAuthentication": {"enum": [True]}}}
             ],
             "properties": {
                 "DBName": {
@@ -94,6 +247,21 @@ request_schema = {
                 "PasswordSecretName": {
                     "type": "string",
                     "description": "the name of the database owner password in the Secrets Manager."
+                },
+                "IAMAuthentication": {
+                    "type": "boolean",
+                    "default": False,
+                    "description": "connect as the database owner with an IAM authentication token"
+                },
+                "SSLMode": {
+                    "type": "string",
+                    "default": "Preferred",
+                    "enum": ["Disabled", "Preferred", "Required", "VerifyCA", "VerifyIdentity"],
+                    "description": "the security of the connection, like the --ssl-mode of the mysql client"
+                },
+                "SSLCA": {
+                    "type": "string",
+                    "description": "the path of the CA bundle to verify the server with, defaults to the RDS bundle"
                 }
             }
         }
@@ -113,47 +281,231 @@ def mysql_password(passwd):
     return "*" + pass2.upper()
 
 
+password_alphabet = string.ascii_letters + string.digits
+
+# the properties which determine the password of a user
+password_properties = ['Password', 'PasswordParameterName', 'PasswordSecretName', 'PasswordHash', 'AuthPlugin',
+                       'GeneratePassword']
+
+
+def random_password(length=32):
+    """
+    returns a password of `length` letters and digits, from a cryptographically secure source.
+    """
+    return ''.join(secrets.choice(password_alphabet) for _ in range(length))
+
+
+def inject_defaults(validate_properties):
+    """
+    returns a `properties` validator which puts the defaults in the object which is validated, like
+    `cfn_resource_provider.default_injecting_validator`. Only objects are changed, so that a property can be either
+    an object or a list of objects.
+    """
+
+    def set_defaults(validator, properties, instance, schema):
+        if validator.is_type(instance, 'object'):
+            for name, subschema in properties.items():
+                if 'default' in subschema:
+                    instance.setdefault(name, subschema['default'])
+        for error in validate_properties(validator, properties, instance, schema):
+            yield error
+
+    return set_defaults
+
+
+default_injecting_validator = validators.extend(
+    Draft4Validator, {'properties': inject_defaults(Draft4Validator.VALIDATORS['properties'])})
+
+
+# the resource options of CREATE and ALTER USER, per property of the ResourceLimits
+resource_options = OrderedDict([
+    ('MaxQueriesPerHour', 'MAX_QUERIES_PER_HOUR'),
+    ('MaxUpdatesPerHour', 'MAX_UPDATES_PER_HOUR'),
+    ('MaxConnectionsPerHour', 'MAX_CONNECTIONS_PER_HOUR'),
+    ('MaxUserConnections', 'MAX_USER_CONNECTIONS')
+])
+
+
+def endpoint_key(connection):
+    """
+    returns the host, port and database name of the `connection` properties, as a string.
+    """
+    return '%s:%s:%s' % (connection.get('Host'), connection.get('Port', 3306), connection.get('DBName', 'mysql'))
+
+
+class Continued(Exception):
+    """
+    raised by a step which stopped before the time of the invocation ran out, to be continued in a new invocation
+    from the `checkpoint`.
+    """
+
+    def __init__(self, checkpoint):
+        super(Continued, self).__init__('continued in a new invocation')
+        self.checkpoint = checkpoint
+
+
 class MySQLUser(ResourceProvider):
 
-    def __init__(self):
+    def __init__(self, ssm=None, secretsmanager=None):
         super(MySQLUser, self).__init__()
-        self.ssm = boto3.client('ssm')
-        self.secretsmanager = boto3.client('secretsmanager')
+        self._ssm = ssm
+        self._secretsmanager = secretsmanager
+        self.validator = None
         self.connection = None
+        self.server_capabilities = None
+        self.catalog = None
+        self.slots = None
+        self.passwords = {}
+        self.password_versions = {}
+        self.created_password = False
+        self.parent = None
+        self.nested = False
+        self.retry = Retry()
+        self.plan = []
         self.request_schema = request_schema
 
+    @property
+    def ssm(self):
+        return self._ssm if self._ssm else get_client('ssm')
+
+    @property
+    def secretsmanager(self):
+        return self._secretsmanager if self._secretsmanager else get_client('secretsmanager')
+
     def convert_property_types(self):
         self.heuristic_convert_property_types(self.properties)
 
-    def get_password(self, name):
+    def is_valid_request(self):
+        """
+        validates the properties like `ResourceProvider.is_valid_request`, but compiles the schema validator only once.
+        """
+        if self.validator is None or self.validator.schema is not self.request_schema:
+            self.validator = default_injecting_validator(self.request_schema)
         try:
-            if 'PasswordParameterName' in self.properties:
-                response = self.ssm.get_parameter(Name=name, WithDecryption=True)
-                return response['Parameter']['Value']
-            else: 
-                response = self.secretsmanager.get_secret_value(SecretId=name)
-                return response['SecretString']
-        except ClientError as e:
-            raise ValueError('Could not obtain password using name {}, {}'.format(name, e))
+            self.convert_property_types()
+            self.validator.validate(self.properties)
+            return True
+        except jsonschema.ValidationError as e:
+            message = e.message.replace(str(e.instance), "<instance>") if isinstance(e.instance, dict) else e.message
+            self.fail('invalid resource properties: %s' % message)
+            return False
+
+    def set_request(self, request, context):
+        super(MySQLUser, self).set_request(request, context)
+        self.passwords = {}
+        self.password_versions = {}
+        self.created_password = False
+        self.plan = []
+        remaining_time = self.remaining_time
+        self.retry = Retry(retry.attempts, retry.base_delay, deadline=time.monotonic() + remaining_time - time_margin
+                           if remaining_time is not None else None)
+
+    def for_properties(self, properties, old_properties=None):
+        """
+        returns a provider for this request with the resource `properties` and `old_properties`, sharing the
+        connection and the passwords already resolved.
+        """
+        provider = MySQLUser(self._ssm, self._secretsmanager)
+        provider.set_request(dict(self.request, ResourceProperties=properties,
+                                  OldResourceProperties=old_properties if old_properties else {}), self.context)
+        provider.connection = self.connection
+        provider.server_capabilities = self.server_capabilities
+        provider.catalog = self.catalog
+        provider.passwords = self.passwords
+        provider.password_versions = self.password_versions
+        provider.parent = self
+        provider.retry = self.retry
+        provider.plan = self.plan
+        return provider
+
+    def client(self, kind):
+        return self.ssm if kind == 'ssm' else self.secretsmanager
+
+    def get_passwords(self, references, refresh=()):
+        """
+        returns the passwords for all `references`, fetching the ones not yet resolved in this request at once.
+        """
+        missing = [r for r in references if r not in self.passwords]
+        if missing:
+            try:
+                with timings.phase('secrets'):
+                    self.passwords.update(self.retry(
+                        lambda: secret_cache.get_many(missing, self.client, refresh, self.password_versions),
+                        'fetching %s' % ', '.join(name for _, name in missing)))
+            except Exception as e:
+                from botocore.exceptions import ClientError
+
+                if not isinstance(e, ClientError):
+                    raise
+                raise ValueError('Could not obtain password using name {}, {}'.format(
+                    ', '.join(name for _, name in missing), e))
+        return {r: self.passwords[r] for r in references}
+
+    def get_password(self, name, kind='ssm'):
+        return self.get_passwords([(kind, name)])[(kind, name)]
+
+    @staticmethod
+    def password_reference(properties):
+        if 'PasswordParameterName' in properties:
+            return ('ssm', properties['PasswordParameterName'])
+        elif 'PasswordSecretName' in properties:
+            return ('secretsmanager', properties['PasswordSecretName'])
+        elif 'GeneratePassword' in properties:
+            generate = properties['GeneratePassword']
+            if 'ParameterName' in generate:
+                return ('ssm', generate['ParameterName'])
+            return ('secretsmanager', generate.get('SecretName'))
+        return None
+
+    @property
+    def user_password_reference(self):
+        return self.password_reference(self.properties)
+
+    @property
+    def dbowner_password_reference(self):
+        return self.password_reference(self.get('Database', {}))
+
+    def prefetch_passwords(self, references):
+        """
+        resolves the owner password and the password `references` in one go. The owner password may be
+        served from the cache, the `references` are always fetched as they may just have been changed.
+        """
+        owner = [self.dbowner_password_reference] if self.dbowner_password_reference else []
+        self.get_passwords(owner + references, references)
+
+    def open(self, references=()):
+        """
+        resolves the password `references` and connects to the database. With parallel I/O enabled, the
+        `references` are fetched while the owner password is resolved and the connection is opened.
+        """
+        references = list(references)
+        if not references:
+            self.connect()
+        elif not parallel_io:
+            self.prefetch_passwords(references)
+            self.connect()
+        else:
+            future = executor.submit(self.get_passwords, references, references)
+            try:
+                self.connect()
+            except Exception:
+                futures.wait([future])
+                raise
+            future.result()
 
     @property
     def user_password(self):
         if 'Password' in self.properties:
             return self.get('Password')
-        elif 'PasswordParameterName' in self.properties:
-            return self.get_password(self.get('PasswordParameterName'))
-        else:
-            return self.get_password(self.get('PasswordSecretName'))
+        reference = self.user_password_reference
+        return self.get_passwords([reference], [reference])[reference]
 
     @property
     def dbowner_password(self):
         db = self.get('Database')
         if 'Password' in db:
             return db.get('Password')
-        elif 'PasswordParameterName' in db:
-            return self.get_password(db['PasswordParameterName'])
-        else:
-            return self.get_password(db['PasswordSecretName'])
+        return self.get_passwords([self.dbowner_password_reference])[self.dbowner_password_reference]
 
     @property
     def user(self):
@@ -192,10 +544,113 @@ class MySQLUser(ResourceProvider):
     def deletion_policy(self):
         return self.get('DeletionPolicy')
 
+    @property
+    def drop_strategy(self):
+        return self.get('DropStrategy', 'Database')
+
+    @property
+    def drop_chunk_size(self):
+        return self.get('DropChunkSize', 100)
+
+    @property
+    def resumable(self):
+        return self.get('Resumable', False)
+
+    @property
+    def checkpoint(self):
+        """
+        returns the progress saved by the previous invocation of this request, if any.
+        """
+        return self.request.get('Checkpoint', {})
+
+    @property
+    def auth_plugin(self):
+        return self.get('AuthPlugin')
+
+    @property
+    def password_hash(self):
+        return self.get('PasswordHash')
+
+    @property
+    def active_sessions(self):
+        return self.get('ActiveSessions', 'Keep')
+
+    @property
+    def drain_timeout(self):
+        return self.get('DrainTimeout', 30)
+
+    @property
+    def remaining_time(self):
+        """
+        returns the seconds left before the invocation times out, or None when not running in Lambda.
+        """
+        get_remaining_time = getattr(self.context, 'get_remaining_time_in_millis', None)
+        return get_remaining_time() / 1000.0 if get_remaining_time else None
+
+    @property
+    def grants(self):
+        return self.get('Grants')
+
+    @property
+    def grants_changed(self):
+        return self.request_type == 'Create' or self.was_planned or self.grants != self.get_old('Grants')
+
+    @property
+    def endpoint(self):
+        return (self.host, self.port, self.dbname, self.dbowner)
+
+    @property
+    def iam_authentication(self):
+        return self.get('Database', {}).get('IAMAuthentication', False)
+
+    @property
+    def ssl_mode(self):
+        return self.get('Database', {}).get('SSLMode', 'Preferred')
+
+    @property
+    def tls_options(self):
+        """
+        returns the connection arguments for the `SSLMode`. With `Preferred`, TLS is used if the server supports it,
+        without verifying the server. The other modes verify the server with the `SSLCA` bundle, which defaults to
+        the bundle of Amazon RDS.
+        """
+        mode = self.ssl_mode
+        if mode == 'Disabled':
+            if self.iam_authentication:
+                raise ValueError('IAM authentication requires TLS, SSLMode cannot be Disabled')
+            return {'ssl_disabled': True}
+        if mode == 'Preferred':
+            return {}
+        return {'ssl_ca': self.get('Database', {}).get('SSLCA', rds_ca_bundle),
+                'ssl_verify_cert': mode != 'Required',
+                'ssl_verify_identity': mode == 'VerifyIdentity'}
+
     @property
     def connect_info(self):
-        return {'host': self.host, 'port': self.port, 'database': self.dbname,
-                'user': self.dbowner, 'password': self.dbowner_password}
+        # in autocommit, the reads of the catalog do not leave a transaction open on a pooled connection
+        if self.iam_authentication:
+            # the token is sent as is, which the server only accepts over TLS
+            return dict({'host': self.host, 'port': self.port, 'database': self.dbname, 'user': self.dbowner,
+                         'auth_plugin': 'mysql_clear_password', 'autocommit': True}, **self.tls_options)
+        return dict({'host': self.host, 'port': self.port, 'database': self.dbname, 'user': self.dbowner,
+                     'password': self.dbowner_password, 'autocommit': True}, **self.tls_options)
+
+    @property
+    def endpoints(self):
+        """
+        returns the connection properties of each endpoint, keyed by endpoint, if `Database` is a list.
+        """
+        database = self.get('Database')
+        if not isinstance(database, list):
+            return None
+        return OrderedDict((endpoint_key(c), c) for c in database)
+
+    @property
+    def old_endpoints(self):
+        database = self.heuristic_convert_property_types(copy.deepcopy(self.get_old('Database', [])))
+        if not isinstance(database, list):
+            database = [database] if database else []
+        return OrderedDict((endpoint_key(c), c) for c in database)
 
     @property
     def allow_update(self):
@@ -203,6 +658,10 @@ class MySQLUser(ResourceProvider):
 
     @property
     def url(self):
+        if self.endpoints is not None:
+            digest = sha1(','.join(sorted(self.endpoints.keys())).encode('utf-8')).hexdigest()[:16]
+            return 'mysql:endpoints:%s:%s:%s' % (
+                digest, self.mysql_user if self.with_database else '', self.user)
         if self.with_database:
             return 'mysql:%s:%s:%s:%s:%s' % (self.host, self.port, self.dbname, self.mysql_user, self.user)
         else:
@@ -210,18 +669,148 @@ class MySQLUser(ResourceProvider):
 
     def connect(self):
         log.info('connecting to database %s on port %d as user %s', self.host, self.port, self.dbowner)
+        self.open_connection()
+        self.acquire_slot()
+
+    def open_connection(self):
         try:
-            self.connection = mysql.connector.connect(**self.connect_info)
+            self.retry(self.connect_once, 'connecting to %s' % self.host)
         except Exception as e:
             raise ValueError('Failed to connect, %s' % e)
 
+    def disconnect(self):
+        """
+        closes the connection without pooling it, so that it no longer counts towards the connections of the server.
+        """
+        pool.release(self.connection, reusable=False)
+        self.connection = None
+
+    def acquire_slot(self):
+        """
+        takes one of the `ENDPOINT_CONCURRENCY` slots on the server for the connection, waiting at most
+        `ENDPOINT_SLOT_WAIT` seconds and no longer than the remaining time of the invocation. The connection is
+        closed while waiting, so the slots limit the connections to the server as well.
+        """
+        if not slots.endpoint_concurrency or self.planning:
+            return
+        timeout = slots.slot_wait
+        if self.remaining_time is not None:
+            timeout = max(0, min(timeout, self.remaining_time - time_margin))
+        # detects the server first, so that the detection is not recorded as time in the queue
+        self.capabilities
+        self.slots = EndpointSlots(self, slots.endpoint_concurrency)
+        with timings.phase('queue'):
+            self.slots.acquire(timeout)
+
+    def release_slot(self):
+        """
+        frees the slot of the connection, and returns false if that failed, as the connection may still hold it.
+        """
+        if self.slots is None:
+            return True
+        try:
+            self.slots.release()
+            return True
+        except Exception as e:
+            log.warning('failed to free the slot on %s, %s', self.host, e)
+            return False
+        finally:
+            self.slots = None
+
+    def connect_once(self):
+        import mysql.connector
+
+        try:
+            self.connect_with(self.connect_info)
+        except mysql.connector.Error as e:
+            if e.errno != 1045 or not (self.dbowner_password_reference or self.iam_authentication):
+                raise
+            if self.iam_authentication:
+                log.info('access denied, retrying with a new authentication token')
+                token_cache.invalidate(self.host, self.port, self.dbowner)
+            else:
+                log.info('access denied, retrying with the latest owner password')
+                self.passwords.pop(self.dbowner_password_reference, None)
+                # a newer version cached by a concurrent request is kept
+                secret_cache.invalidate(self.dbowner_password_reference,
+                                        self.password_versions.pop(self.dbowner_password_reference, None))
+            self.connect_with(self.connect_info)
+
+    def reconnect(self):
+        """
+        replaces a lost connection by a new one. A provider sharing the connection of its parent, reconnects the
+        parent unless it has done so already.
+        """
+        if self.parent is not None:
+            if self.connection is self.parent.connection:
+                self.parent.reconnect()
+            self.connection = self.parent.connection
+            return
+        log.info('reconnecting to database %s', self.host)
+        # the slot of the lost session is freed by the server, and a new one is taken after connecting
+        pool.release(self.connection, reusable=False)
+        self.connection = None
+        self.slots = None
+        self.connect()
+
+    def connect_with(self, connect_info):
+        import mysql.connector
+
+        def connect():
+            if self.iam_authentication:
+                return mysql.connector.connect(password=token_cache.get(self.host, self.port, self.dbowner),
+                                               **connect_info)
+            return mysql.connector.connect(**connect_info)
+
+        with timings.phase('connect'):
+            # the TLS handshake is only paid for new connections, as pooled connections stay encrypted
+            self.connection = pool.acquire(self.endpoint + (self.ssl_mode,),
+                                           iam_credential if self.iam_authentication else connect_info['password'],
+                                           connect)
+
+    def cursor(self):
+        """
+        returns a cursor on the connection, which records the duration of each statement if the request is sampled.
+        When planning, only read only statements are executed.
+        """
+        cursor = timings.cursor(self.connection.cursor())
+        return plan.PlanningCursor(cursor, self.plan, self.secrets) if self.planning else cursor
+
+    @property
+    def planning(self):
+        return self.get('Plan', False)
+
+    @property
+    def was_planned(self):
+        """
+        returns true if the resource was only planned, so that nothing has been applied for it yet.
+        """
+        return self.request_type != 'Create' and plan.is_planned_id(self.physical_resource_id)
+
+    @property
+    def secrets(self):
+        """
+        returns the passwords and password hashes known to this request, which are redacted from a plan.
+        """
+        passwords = list(self.passwords.values()) + [self.get('Password')]
+        if isinstance(self.get('Database'), dict):
+            passwords.append(self.get('Database').get('Password'))
+        passwords = [p for p in passwords if p]
+        hashes = [mysql_password(p) for p in passwords] + ([self.password_hash] if self.password_hash else [])
+        return set(passwords + hashes)
+
     def close(self):
         if self.connection:
-            self.connection.close()
+            # a pooled connection must not hold on to its slot, or the slot would be taken while it is idle
+            pool.release(self.connection, self.release_slot())
             self.connection = None
+            self.server_capabilities = None
+            log.info('connection pool statistics %s, secret cache statistics %s', pool.stats(), secret_cache.stats())
 
     def db_exists(self):
-        cursor = self.connection.cursor()
+        if self.catalog is not None:
+            return self.catalog.has_schema(self.mysql_user)
+        cursor = self.cursor()
         try:
             cursor.execute(
                 "SELECT SCHEMA_NAME FROM information_schema.schemata WHERE SCHEMA_NAME = %s", [self.mysql_user])
@@ -231,7 +820,9 @@ class MySQLUser(ResourceProvider):
             cursor.close()
 
     def user_exists(self):
-        cursor = self.connection.cursor()
+        if self.catalog is not None:
+            return self.catalog.has_user(self.mysql_user, self.mysql_user_host)
+        cursor = self.cursor()
         try:
             cursor.execute(
                 "SELECT * FROM mysql.user WHERE user = %s AND host = %s", [self.mysql_user, self.mysql_user_host])
@@ -241,27 +832,30 @@ class MySQLUser(ResourceProvider):
             cursor.close()
 
     def drop_user(self):
-        cursor = self.connection.cursor()
+        cursor = self.cursor()
         try:
             if self.deletion_policy == 'Drop':
                 log.info('drop user %s', self.user)
-                cursor.execute('DROP USER %s', [self.user])
+                if self.capabilities.drop_user_if_exists:
+                    cursor.execute('DROP USER IF EXISTS %s@%s', [self.mysql_user, self.mysql_user_host])
+                else:
+                    cursor.execute('DROP USER %s@%s', [self.mysql_user, self.mysql_user_host])
             else:
-                if self.is_5_7_or_higher():
+                if self.capabilities.account_lock:
                     log.info('disable login of %s', self.user)
-                    cursor.execute("ALTER USER %s ACCOUNT LOCK", [self.user])
+                    cursor.execute("ALTER USER %s@%s ACCOUNT LOCK", [self.mysql_user, self.mysql_user_host])
                 else:
                     log.info('set random password for %s to disable login', self.user)
-                    cursor.execute("SET PASSWORD FOR %s = %s", [
-                        self.user,
-                        mysql_password(''.join(random.choices(string.ascii_uppercase + string.digits, k=16)))])
+                    cursor.execute("SET PASSWORD FOR %s@%s = %s", [
+                        self.mysql_user, self.mysql_user_host,
+                        mysql_password(random_password())])
         finally:
             cursor.close()
 
     def drop_database(self):
         if self.deletion_policy == 'Drop':
             log.info('drop database of %s', self.user)
-            cursor = self.connection.cursor()
+            cursor = self.cursor()
             try:
                 cursor.execute('DROP DATABASE %s' % self.mysql_user)
             finally:
@@ -269,69 +863,420 @@ class MySQLUser(ResourceProvider):
         else:
             log.info('not dropping database %s', self.mysql_user)
 
+    @property
+    def capabilities(self):
+        """
+        returns the capabilities of the connected server, detected once per connection.
+        """
+        if self.server_capabilities is None:
+            try:
+                with timings.phase('detect'):
+                    self.server_capabilities = capabilities_cache.detect(self.connection, (self.host, self.port))
+            except Exception as e:
+                self.fail('failed to determine database version, {}'.format(e))
+                raise e
+        return self.server_capabilities
+
     def is_5_7_or_higher(self):
-        cursor = self.connection.cursor()
+        return self.capabilities.version >= (5, 7)
+
+    def execute_batch(self, statements, retry=True, completed=None):
+        """
+        executes the `statements`, a list of (operation, params) tuples, in a single round trip. On a transient
+        error, the statements which did not complete are executed again, on a new connection if it was lost. The
+        statements which completed are appended to the list `completed`, if given, so that a caller can tell which
+        statement failed.
+        """
+        if not statements:
+            return
+        if self.planning:
+            self.plan.append([plan.render(op, params, self.secrets) for op, params in statements])
+            if completed is not None:
+                completed.extend(statements)
+            return
+        pending = list(statements)
+
+        def execute():
+            operation = ';\n'.join(op for op, _ in pending)
+            params = [p for _, ps in pending for p in (ps if ps else [])]
+            cursor = self.connection.cursor()
+            try:
+                with timings.phase('sql', '; '.join(statement_label(op) for op, _ in pending)):
+                    for _ in self.execute_multi(cursor, operation, params):
+                        statement = pending.pop(0)
+                        if completed is not None:
+                            completed.append(statement)
+            finally:
+                cursor.close()
+
+        def recover(error):
+            if is_connection_lost(error):
+                self.reconnect()
+
+        if retry:
+            self.retry(execute, 'executing %s' % statement_label(pending[0][0]), recover)
+        else:
+            execute()
+
+    @staticmethod
+    def execute_multi(cursor, operation, params):
+        """
+        executes the statements of `operation`, yielding after each statement which completed.
+        """
         try:
-            cursor.execute('select version()')
-            version = cursor.fetchone()[0].split('.')
-            return int(version[0]) > 5 or (int(version[0]) == 5 and int(version[1]) >= 7)
-        except Exception as e:
-            self.fail('failed to determine database version, {}'.format(e))
-            raise e
+            results = cursor.execute(operation, params, multi=True)
+        except TypeError:
+            # from connector 9.2 onwards, multiple statements are executed without the multi flag
+            cursor.execute(operation, params)
+            yield
+            while cursor.nextset():
+                yield
+        else:
+            for _ in results:
+                yield
+
+    def identification(self):
+        """
+        returns the IDENTIFIED clause of CREATE and ALTER USER with its parameters. A `PasswordHash` is passed on
+        as is, so the plaintext password is neither needed nor hashed again.
+        """
+        plugin = self.auth_plugin
+        if plugin and plugin not in self.capabilities.auth_plugins:
+            raise ValueError('authentication plugin %s is not supported by %s' % (plugin, self.capabilities))
+        if plugin == 'AWSAuthenticationPlugin':
+            return "IDENTIFIED WITH AWSAuthenticationPlugin AS 'RDS'", []
+        elif self.password_hash:
+            return 'IDENTIFIED WITH %s AS %%s' % plugin, [self.password_hash]
+        elif plugin:
+            return 'IDENTIFIED WITH %s BY %%s' % plugin, [self.user_password]
+        return 'IDENTIFIED BY %s', [self.user_password]
+
+    @property
+    def resource_limits(self):
+        """
+        returns the resource options to set for the `ResourceLimits`, or None if the limits are not managed. Limits
+        which were removed by an update are reset to 0, which means no limit.
+        """
+        limits = self.get('ResourceLimits')
+        old_limits = self.get_old('ResourceLimits') if self.request_type == 'Update' else None
+        if limits is None and old_limits is None:
+            return None
+        limits, old_limits = limits if limits else {}, old_limits if old_limits else {}
+        return ' '.join('%s %d' % (option, int(limits.get(name, 0))) for name, option in resource_options.items()
+                        if name in limits or name in old_limits)
+
+    def resource_limits_statement(self):
+        """
+        returns the statement to set the resource limits of the user, or None if the limits are not managed.
+        """
+        limits = self.resource_limits
+        if not limits:
+            return None
+        if self.capabilities.alter_user:
+            return 'ALTER USER %%s@%%s WITH %s' % limits, [self.mysql_user, self.mysql_user_host]
+        return 'GRANT USAGE ON *.* TO %%s@%%s WITH %s' % limits, [self.mysql_user, self.mysql_user_host]
+
+    def account_statements(self, password=True):
+        """
+        returns the statements to set the password, if `password`, and the resource limits of the user. With
+        ALTER USER, both are set by a single statement.
+        """
+        statements = [self.password_statement()] if password else []
+        limits = self.resource_limits_statement()
+        if limits and not (password and self.capabilities.alter_user):
+            statements.append(limits)
+        return statements
+
+    def password_statement(self, unlock=True):
+        """
+        returns the statement to set the password of the user. With ALTER USER, it unlocks the account too, if
+        `unlock`, as an account retained by a delete is locked.
+        """
+        if self.capabilities.alter_user:
+            clause, params = self.identification()
+            limits = ' WITH %s' % self.resource_limits if self.resource_limits else ''
+            unlock = ' ACCOUNT UNLOCK' if unlock and self.capabilities.account_lock else ''
+            return 'ALTER USER %%s@%%s %s%s%s' % (clause, limits, unlock), [
+                self.mysql_user, self.mysql_user_host] + params
+        else:
+            self.check_legacy_auth_plugin()
+            return "SET PASSWORD FOR %s@%s = %s", [
+                self.mysql_user, self.mysql_user_host,
+                self.password_hash if self.password_hash else mysql_password(self.user_password)]
+
+    def stored_credentials(self):
+        """
+        returns the authentication plugin and string of the user and whether it is locked, or None if the user does
+        not exist. Read from the catalog, if it is available.
+        """
+        if self.catalog is not None:
+            return self.catalog.credentials_of(self.mysql_user, self.mysql_user_host)
+        cursor = self.cursor()
+        try:
+            cursor.execute('SELECT plugin, authentication_string, account_locked FROM mysql.user '
+                           'WHERE user = %s AND host = %s', [self.mysql_user, self.mysql_user_host])
+            row = cursor.fetchone()
+            return tuple(row) if row else None
         finally:
             cursor.close()
 
+    @property
+    def password_is_verifiable(self):
+        """
+        returns true if the stored password can be compared with the desired one, which is the case for a
+        `PasswordHash`, an IAM authenticated user or a mysql_native_password, on MySQL.
+        """
+        return bool(self.password_hash or self.auth_plugin in ('mysql_native_password', 'AWSAuthenticationPlugin')) \
+            and self.capabilities.account_lock and self.capabilities.vendor != 'MariaDB'
+
+    def password_is_current(self, unlocked=True):
+        """
+        returns true if the user is identified with the desired plugin and password, and unlocked if `unlocked`.
+        """
+        if not self.password_is_verifiable:
+            return False
+        stored = self.stored_credentials()
+        if not stored:
+            return False
+        plugin, authentication_string, locked = stored
+        if (unlocked and locked == 'Y') or (self.auth_plugin and plugin != self.auth_plugin):
+            return False
+        if plugin == 'AWSAuthenticationPlugin':
+            return True
+        if self.password_hash:
+            return authentication_string == self.password_hash
+        if plugin == 'mysql_native_password':
+            return authentication_string == mysql_password(self.user_password)
+        return False
+
     def update_password(self):
         log.info('update password of user %s', self.user)
-        cursor = self.connection.cursor()
+        cursor = self.cursor()
         try:
-            if self.is_5_7_or_higher():
-                cursor.execute("ALTER USER %s IDENTIFIED BY %s ACCOUNT UNLOCK", [
-                    self.user, self.user_password])
-            else:
-                cursor.execute("SET PASSWORD FOR %s = %s", [
-                    self.user, mysql_password(self.user_password)])
+            cursor.execute(*self.password_statement())
         finally:
             cursor.close()
 
+    def check_legacy_auth_plugin(self):
+        """
+        raises a ValueError if the user has an authentication plugin which cannot be set without ALTER USER, as on
+        servers before MySQL 5.7.6 and MariaDB 10.2 the provider identifies users by a native password only.
+        """
+        if self.auth_plugin not in (None, 'mysql_native_password'):
+            raise ValueError('authentication plugin %s requires MySQL 5.7.6 or MariaDB 10.2' % self.auth_plugin)
+
     def do_create_user(self):
         log.info('create user %s', self.user)
+        self.check_legacy_auth_plugin()
 
-        cursor = self.connection.cursor()
+        cursor = self.cursor()
         try:
-            cursor.execute('CREATE USER %s@%s IDENTIFIED BY %s', [
-                self.mysql_user, self.mysql_user_host, self.user_password])
+            if self.password_hash:
+                cursor.execute('CREATE USER %s@%s IDENTIFIED BY PASSWORD %s', [
+                    self.mysql_user, self.mysql_user_host, self.password_hash])
+            else:
+                cursor.execute('CREATE USER %s@%s IDENTIFIED BY %s', [
+                    self.mysql_user, self.mysql_user_host, self.user_password])
         finally:
             cursor.close()
 
     def create_database(self):
         log.info('create database %s', self.user)
-        cursor = self.connection.cursor()
+        cursor = self.cursor()
         try:
             cursor.execute("CREATE DATABASE %s" % self.mysql_user)
         finally:
             cursor.close()
 
+    def grant_ownership_statement(self):
+        return "GRANT ALL ON %s.* TO '%s'@'%s' WITH GRANT OPTION" % (
+            self.mysql_user, self.mysql_user, self.mysql_user_host), None
+
     def grant_ownership(self):
         log.info('grant ownership on %s to %s', self.user, self.user)
-        cursor = self.connection.cursor()
+        cursor = self.cursor()
         try:
-            cursor.execute("GRANT ALL ON %s.* TO '%s'@'%s' WITH GRANT OPTION" %
-                           (self.mysql_user, self.mysql_user, self.mysql_user_host))
+            cursor.execute(*self.grant_ownership_statement())
         finally:
             cursor.close()
 
+    def current_grants(self):
+        """
+        returns the privileges per (database, table) currently granted to the user, read with a single SHOW GRANTS.
+        The ownership of the database of the user is not included, as it is managed by `WithDatabase`.
+        """
+        import mysql.connector
+
+        cursor = self.cursor()
+        try:
+            cursor.execute('SHOW GRANTS FOR %s@%s', [self.mysql_user, self.mysql_user_host])
+            result = grants.parse_grants(r[0] for r in cursor.fetchall())
+        except mysql.connector.Error as e:
+            if e.errno != 1141:
+                raise
+            result = {}
+        finally:
+            cursor.close()
+        if self.with_database:
+            result.pop((self.mysql_user, '*'), None)
+        return result
+
+    def grant_statements(self):
+        """
+        returns the REVOKE and GRANT statements to bring the privileges of the user in line with `Grants`. No
+        statements are returned if the grants are not managed or did not change.
+        """
+        if self.grants is None or not self.grants_changed:
+            return []
+        desired = grants.declared_grants(self.grants)
+        statements = grants.statements((self.mysql_user, self.mysql_user_host), self.current_grants(), desired)
+        log.info('%d grant statements to apply for user %s', len(statements), self.user)
+        return statements
+
+    @property
+    def supports_idempotent_create(self):
+        return self.capabilities.create_user_if_not_exists and self.capabilities.alter_user
+
+    @property
+    def supports_idempotent_drop(self):
+        return self.capabilities.drop_user_if_exists and (
+            self.deletion_policy == 'Drop' or self.capabilities.account_lock)
+
+    def create_user_statements(self):
+        """
+        returns the statements to create or adopt the user and its database, which can be executed regardless
+        of their existence. If a catalog is available, statements for existing objects are omitted.
+        """
+        statements = []
+        exists = self.user_exists() if self.catalog is not None or self.planning else None
+        if not exists:
+            log.info('create user %s', self.user)
+            clause, params = self.identification()
+            limits = ' WITH %s' % self.resource_limits if self.resource_limits else ''
+            statements.append(('CREATE USER IF NOT EXISTS %%s@%%s %s%s' % (clause, limits),
+                               [self.mysql_user, self.mysql_user_host] + params))
+        if exists and self.password_is_current():
+            log.info('password of user %s is unchanged', self.user)
+            statements.extend(self.account_statements(password=False))
+        elif exists is not False:
+            log.info('update password of user %s', self.user)
+            statements.extend(self.account_statements())
+        if self.with_database:
+            log.info('grant ownership on %s to %s', self.user, self.user)
+            statements.append(('CREATE DATABASE IF NOT EXISTS %s' % self.mysql_user, None))
+            statements.append(self.grant_ownership_statement())
+        return statements
+
+    def drop_statements(self):
+        """
+        returns the statements to drop or lock the user and drop its database, which can be executed regardless
+        of their existence.
+        """
+        statements = []
+        if self.deletion_policy == 'Drop':
+            if self.with_database:
+                log.info('drop database of %s', self.user)
+                statements.append(('DROP DATABASE IF EXISTS %s' % self.mysql_user, None))
+            log.info('drop user %s', self.user)
+            statements.append(('DROP USER IF EXISTS %s@%s', [self.mysql_user, self.mysql_user_host]))
+        else:
+            if self.with_database:
+                log.info('not dropping database %s', self.mysql_user)
+            log.info('disable login of %s', self.user)
+            statements.append(('ALTER USER IF EXISTS %s@%s ACCOUNT LOCK', [self.mysql_user, self.mysql_user_host]))
+        return statements
+
+    def drop_schema_in_steps(self):
+        """
+        drops the database of the user with the `DropStrategy`, within the remaining time of the invocation.
+        """
+        drop = SchemaDrop(self, self.mysql_user, self.drop_strategy, self.drop_chunk_size, self.remaining_time)
+        completed = drop.run()
+        dropped = self.checkpoint.get('TablesDropped', 0) + drop.dropped
+        self.set_attribute('TablesDropped', dropped)
+        self.set_attribute('TablesRemaining', drop.remaining)
+        if not completed and self.resumable:
+            raise Continued({'TablesDropped': dropped})
+        if not completed:
+            raise ValueError('dropped %d tables of database %s, %d remaining, delete again to resume' % (
+                drop.dropped, self.mysql_user, drop.remaining))
+
+    def end_sessions(self):
+        """
+        kills the sessions of the user, after waiting for them to finish their statements if `ActiveSessions` is
+        `Drain`. The wait is bounded by the `DrainTimeout` and the remaining time of the invocation.
+        """
+        if self.active_sessions == 'Keep':
+            return
+        if self.active_sessions == 'Drain' and not self.planning:
+            timeout = self.drain_timeout
+            if self.remaining_time is not None:
+                timeout = min(timeout, self.remaining_time - time_margin)
+            sessions = drain_sessions(self, self.mysql_user, time.monotonic() + timeout)
+        else:
+            sessions = find_sessions(self, self.mysql_user)
+        if sessions:
+            log.info('killing %d sessions of %s', len(sessions), self.user)
+            kill_sessions(self, [s[0] for s in sessions])
+        self.set_attribute('SessionsKilled', len(sessions))
+
+    def changes_password(self):
+        """
+        returns true if the update gives the user another password, so that its sessions are to be ended first. A
+        password which cannot be compared with the stored one is considered changed if its properties changed.
+        """
+        if self.password_is_verifiable:
+            return not self.password_is_current()
+        old = self.heuristic_convert_property_types(copy.deepcopy(self.old_properties))
+        if old.get('GeneratePassword'):
+            old['GeneratePassword'] = dict({'Length': 32}, **old['GeneratePassword'])
+        return any(self.get(p) != old.get(p) for p in password_properties)
+
+    def prepare_drop(self):
+        """
+        ends the sessions of the user and drops the tables of its database in steps, if required. Returns the
+        statements to complete the drop, which can be executed in a batch with those of other users, or None if
+        the server requires the existence of the user and database to be checked first.
+        """
+        self.end_sessions()
+        if self.deletion_policy == 'Drop' and self.with_database and self.drop_strategy != 'Database':
+            self.drop_schema_in_steps()
+        return self.drop_statements() if self.supports_idempotent_drop else None
+
     def drop(self):
+        statements = self.prepare_drop()
+        if statements is not None:
+            self.execute_batch(statements)
+        else:
+            self.drop_existing()
+
+    def drop_existing(self):
         if self.with_database and self.db_exists():
             self.drop_database()
         if self.user_exists():
             self.drop_user()
 
+    def create_user_batch(self):
+        """
+        returns the statements to create or update the user, which can be executed in a batch with those of other
+        users, or None if the server requires the existence of the user to be checked first.
+        """
+        if not self.supports_idempotent_create:
+            return None
+        grant_statements = self.grant_statements()
+        return self.create_user_statements() + grant_statements
+
     def create_user(self):
+        statements = self.create_user_batch()
+        if statements is not None:
+            self.execute_batch(statements)
+            return
+
         if self.user_exists():
             self.update_password()
         else:
             self.do_create_user()
+        self.execute_batch(self.account_statements(password=False))
 
         if self.with_database:
             if self.db_exists():
@@ -339,42 +1284,373 @@ class MySQLUser(ResourceProvider):
             else:
                 self.create_database()
                 self.grant_ownership()
+        self.execute_batch(self.grant_statements())
 
-    def create(self):
+    @property
+    def user_password_references(self):
+        return [self.user_password_reference] if self.user_password_reference else []
+
+    def endpoint_provider(self, request_type, properties, old_properties=None):
+        """
+        returns a provider for the request on a single endpoint, sharing the passwords already resolved.
+        """
+        request = dict(self.request, RequestType=request_type, ResourceProperties=properties)
+        request.pop('OldResourceProperties', None)
+        if old_properties is not None:
+            request['OldResourceProperties'] = old_properties
+        provider = MySQLUser(self._ssm, self._secretsmanager)
+        provider.set_request(request, self.context)
+        provider.passwords = self.passwords
+        provider.password_versions = self.password_versions
+        provider.retry = self.retry
+        provider.nested = True
+        if request_type != 'Create':
+            provider.physical_resource_id = provider.url
+        return provider
+
+    @staticmethod
+    def execute_on_endpoint(provider):
+        if provider.request_type == 'Create':
+            provider.create()
+        elif provider.request_type == 'Update':
+            provider.update()
+        else:
+            provider.delete()
+        return provider.status, provider.reason
+
+    def apply_to_endpoints(self, changes):
+        """
+        executes the `changes` on all endpoints at the same time, a list of tuples (endpoint, request type,
+        properties, old properties). The passwords are resolved once for all endpoints. Returns the result per
+        endpoint.
+        """
+        references = [self.password_reference(p['Database']) for _, _, p, _ in changes]
+        references = [r for r in references if r]
+        if any(request_type != 'Delete' for _, request_type, _, _ in changes):
+            references.extend(self.user_password_references)
+        self.get_passwords(references, self.user_password_references)
+
+        actions = {'Create': 'created', 'Update': 'updated', 'Delete': 'dropped'}
+        done = self.checkpoint.get('Results', {})
+        jobs = OrderedDict()
+        for endpoint, request_type, properties, old_properties in changes:
+            if endpoint not in done:
+                provider = self.endpoint_provider(request_type, properties, old_properties)
+                jobs[endpoint] = (actions[request_type], provider,
+                                  endpoint_executor.submit(self.execute_on_endpoint, provider))
+
+        results = OrderedDict((e, done[e]) for e, _, _, _ in changes if e in done)
+        for endpoint, (action, provider, job) in jobs.items():
+            try:
+                status, reason = job.result()
+                results[endpoint] = action if status == 'SUCCESS' else 'failed: %s' % reason
+            except Continued:
+                results[endpoint] = 'continued'
+            except Exception as e:
+                results[endpoint] = 'failed: %s' % e
+            if results[endpoint].startswith('failed'):
+                log.error('failed to %s user %s on %s, %s', action[:-1], self.user, endpoint, results[endpoint][8:])
+            if provider.plan:
+                self.plan.append(['-- %s' % endpoint])
+                self.plan.extend(provider.plan)
+        return results
+
+    def resume_later(self, checkpoint):
+        """
+        saves the `checkpoint` in the request and invokes the provider again asynchronously, to continue the request.
+        The response is sent by the invocation which completes the request, so the request is not bound to the
+        time of a single invocation.
+        """
+        invocation = self.request.get('Invocation', 1)
+        function_arn = getattr(self.context, 'invoked_function_arn', None)
+        if invocation >= max_invocations:
+            raise ValueError('request did not complete within %d invocations' % max_invocations)
+        if not function_arn:
+            raise ValueError('request cannot be continued without the ARN of the function')
+
+        request = dict(self.request, Checkpoint=checkpoint, Invocation=invocation + 1)
+        log.info('continuing request %s in invocation %d, from %s', self.request_id, invocation + 1,
+                 json.dumps(checkpoint))
+        get_client('lambda').invoke(FunctionName=function_arn, InvocationType='Event',
+                                    Payload=json.dumps(request).encode('utf-8'))
+        self.asynchronous = True
+
+    def resume_pending(self, results):
+        """
+        continues the request in a new invocation if any of the `results` is pending. Returns true if so.
+        """
+        if 'continued' not in results.values():
+            return False
+        self.resume_later({'Results': OrderedDict((k, r) for k, r in results.items() if r != 'continued')})
+        return True
+
+    def report_endpoints(self, results):
+        for status in ['created', 'updated', 'dropped', 'failed']:
+            self.set_attribute(status.capitalize(), len([r for r in results.values() if r.startswith(status)]))
+        log.info('results per endpoint %s', json.dumps(results))
+
+        failed = OrderedDict((e, r[len('failed: '):]) for e, r in results.items() if r.startswith('failed'))
+        if failed:
+            self.fail('Failed on %d of %d endpoints, %s' % (
+                len(failed), len(results), ', '.join('%s: %s' % f for f in failed.items())))
+
+    def create_on_endpoints(self):
         try:
-            self.connect()
-            self.create_user()
-            self.physical_resource_id = self.url
+            results = self.apply_to_endpoints(
+                [(e, 'Create', dict(self.properties, Database=c), None) for e, c in self.endpoints.items()])
+            if self.resume_pending(results):
+                return
+            succeeded = any(not r.startswith('failed') for r in results.values())
+            # with the composite id, a rollback drops the user from the endpoints on which it was created
+            self.physical_resource_id = self.url if succeeded else 'could-not-create'
+            self.report_endpoints(results)
         except Exception as e:
             self.physical_resource_id = 'could-not-create'
             self.fail('Failed to create user, %s' % e)
-        finally:
-            self.close()
+
+    def update_on_endpoints(self):
+        if not self.physical_resource_id.startswith('mysql:endpoints:') or \
+                self.physical_resource_id.split(':', 3)[3] != self.url.split(':', 3)[3]:
+            self.fail('Only the password, grants, resource limits and endpoints of %s can be updated' % self.user)
+            return
+
+        old_properties = self.heuristic_convert_property_types(copy.deepcopy(self.old_properties))
+        old, new = self.old_endpoints, self.endpoints
+        changes = [(e, 'Delete', dict(old_properties, Database=old[e]), None) for e in old if e not in new]
+        changes.extend((e, 'Create', dict(self.properties, Database=new[e]), None) for e in new if e not in old)
+        changes.extend((e, 'Update', dict(self.properties, Database=new[e]), dict(old_properties, Database=old[e]))
+                       for e in new if e in old)
+        try:
+            results = self.apply_to_endpoints(changes)
+            if not self.resume_pending(results):
+                self.report_endpoints(results)
+        except Exception as e:
+            self.fail('Failed to update the user, %s' % e)
+
+    def delete_on_endpoints(self):
+        if self.physical_resource_id == 'could-not-create':
+            self.success('user was never created')
+            return
+        try:
+            results = self.apply_to_endpoints(
+                [(e, 'Delete', dict(self.properties, Database=c), None) for e, c in self.endpoints.items()])
+            if not self.resume_pending(results):
+                self.report_endpoints(results)
+        except Exception as e:
+            self.fail(str(e))
+
+    @property
+    def generates_password(self):
+        """
+        returns true if a new password is to be generated: on create, and on update when `GeneratePassword` or the
+        name of the password changed. The password is generated once per request, so not by the providers of the
+        endpoints nor by a resumed invocation.
+        """
+        generate = self.get('GeneratePassword')
+        if not generate or self.nested or self.checkpoint:
+            return False
+        if self.request_type == 'Create' or self.was_planned:
+            return True
+        old = self.heuristic_convert_property_types(copy.deepcopy(self.get_old('GeneratePassword', {})))
+        return generate != dict({'Length': 32}, **old) or \
+            self.user_password_reference != self.old_generated_password_reference
+
+    @property
+    def old_generated_password_reference(self):
+        """
+        returns the reference of the password the resource generated before the update, or None.
+        """
+        old = self.get_old('GeneratePassword')
+        return self.password_reference({'GeneratePassword': old}) if old else None
+
+    def generate_password(self):
+        """
+        generates a new password for the user, and stores it in the Parameter Store or the Secrets Manager with a
+        single call. The password is used as is, so it is not fetched back. Returns false if it could not be stored.
+
+        Only the parameter or secret the resource generated its password in before is overwritten. Any other is
+        created: if one with the name already exists, it belongs to someone else, and the password is not stored.
+        """
+        kind, name = self.user_password_reference
+        password = random_password(self.get('GeneratePassword')['Length'])
+        owned = self.request_type != 'Create' and not self.was_planned and \
+            self.old_generated_password_reference == (kind, name)
+        if not self.planning:
+            try:
+                with timings.phase('secrets'):
+                    self.retry(lambda: self.store_password(kind, name, password, overwrite=owned),
+                               'storing the password in %s' % name)
+            except Exception as e:
+                self.fail('Failed to store the generated password in %s, %s' % (name, e))
+                return False
+            self.created_password = not owned
+        log.info('generated a new password for %s in %s', self.user, name)
+        secret_cache.invalidate((kind, name))
+        self.passwords[(kind, name)] = password
+        return True
+
+    def store_password(self, kind, name, password, overwrite=True):
+        """
+        stores the `password` in parameter or secret `name`. Unless `overwrite`, it fails if `name` already exists.
+        """
+        if kind == 'ssm':
+            self.ssm.put_parameter(Name=name, Value=password, Type='SecureString', Overwrite=overwrite)
+            return
+
+        from botocore.exceptions import ClientError
+
+        try:
+            self.secretsmanager.create_secret(Name=name, SecretString=password)
+        except ClientError as e:
+            if not overwrite or e.response.get('Error', {}).get('Code') != 'ResourceExistsException':
+                raise
+            self.secretsmanager.put_secret_value(SecretId=name, SecretString=password)
+
+    def delete_generated_password(self):
+        """
+        deletes the generated password of the user from the Parameter Store or the Secrets Manager. A secret is
+        scheduled for deletion, so it can be restored during its recovery window.
+        """
+        from botocore.exceptions import ClientError
+
+        kind, name = self.user_password_reference
+        try:
+            if kind == 'ssm':
+                self.ssm.delete_parameter(Name=name)
+            else:
+                self.secretsmanager.delete_secret(SecretId=name)
+            log.info('deleted the generated password of %s in %s', self.user, name)
+        except ClientError as e:
+            log.warning('failed to delete the generated password of %s in %s, %s', self.user, name, e)
+        secret_cache.invalidate((kind, name))
+
+    def create(self):
+        if self.generates_password and not self.generate_password():
+            self.physical_resource_id = 'could-not-create'
+            return
+        if self.endpoints is not None:
+            self.create_on_endpoints()
+        else:
+            try:
+                self.open(self.user_password_references)
+                self.create_user()
+                self.physical_resource_id = self.url
+            except Exception as e:
+                self.physical_resource_id = 'could-not-create'
+                self.fail('Failed to create user, %s' % e)
+            finally:
+                self.close()
+        # a resource which could not be created is not deleted, so the password it stored is removed now
+        if self.physical_resource_id == 'could-not-create' and self.created_password:
+            self.delete_generated_password()
 
     def update(self):
+        if self.was_planned:
+            # nothing was applied by the plan, so the user is created now
+            self.create()
+            return
+        if self.generates_password and not self.generate_password():
+            return
+        if self.endpoints is not None:
+            self.update_on_endpoints()
+            return
         try:
-            self.connect()
+            self.open(self.user_password_references)
             if self.allow_update:
-                self.update_password()
+                grant_statements = self.grant_statements()
+                if self.password_is_current():
+                    log.info('password of user %s is unchanged', self.user)
+                    self.execute_batch(self.account_statements(password=False) + grant_statements)
+                else:
+                    if self.changes_password():
+                        self.end_sessions()
+                    log.info('update password of user %s', self.user)
+                    self.execute_batch(self.account_statements() + grant_statements)
             else:
-                self.fail('Only the password of %s can be updated' % self.user)
+                self.fail('Only the password, grants and resource limits of %s can be updated' % self.user)
         except Exception as e:
             self.fail('Failed to update the user, %s' % e)
         finally:
             self.close()
 
     def delete(self):
-        if self.physical_resource_id == 'could-not-create':
+        if self.was_planned:
+            self.success('user was only planned')
+            return
+        if self.endpoints is not None:
+            self.delete_on_endpoints()
+        elif self.physical_resource_id == 'could-not-create':
             self.success('user was never created')
             return
+        else:
+            try:
+                self.connect()
+                self.drop()
+            except Continued as e:
+                if self.nested:
+                    raise
+                self.resume_later(e.checkpoint)
+            except Exception as e:
+                return self.fail(str(e))
+            finally:
+                self.close()
+        if self.get('GeneratePassword') and self.deletion_policy == 'Drop' and self.status == 'SUCCESS' and \
+                not (self.nested or self.asynchronous or self.planning):
+            self.delete_generated_password()
 
+    def handle(self, request, context):
+        """
+        handles the request like `ResourceProvider.handle`, and writes the duration of each phase of the request.
+        """
+        properties = request.get('ResourceProperties', {})
+        database = properties.get('Database') if isinstance(properties.get('Database'), dict) else {}
+        host = database.get('Host') if not isinstance(properties.get('Database'), list) else 'multiple'
+        timings.start(request.get('RequestType'), host,
+                      RequestId=request.get('RequestId'), ResourceType=request.get('ResourceType'))
         try:
-            self.connect()
-            self.drop()
-        except Exception as e:
-            return self.fail(str(e))
+            return super(MySQLUser, self).handle(request, context)
         finally:
-            self.close()
+            timings.emit(Status=self.status, Retries=self.retry.count)
+
+    def execute(self):
+        """
+        executes the request like `ResourceProvider.execute`, and reports the retries on transient errors.
+        """
+        creates = self.request_type == 'Create' or self.was_planned
+        super(MySQLUser, self).execute()
+        if self.planning:
+            self.report_plan()
+            # a planned resource gets an id of its own, so that applying the plan is an update which creates it
+            if creates and self.physical_resource_id == self.url:
+                self.physical_resource_id = plan.planned_id(self.url)
+        if self.get('GeneratePassword') and self.request_type != 'Delete':
+            kind, name = self.user_password_reference
+            self.set_attribute('PasswordParameterName' if kind == 'ssm' else 'PasswordSecretName', name)
+        if self.retry.count:
+            log.info('%d retries on transient errors', self.retry.count)
+            self.set_attribute('Retries', self.retry.count)
+
+    def report_plan(self):
+        """
+        reports the planned statements as the `Plan`, with the number of statements and round trips to execute them.
+        """
+        statements, round_trips = plan.count(self.plan)
+        log.info('plan of %d statements in %d round trips\n%s', statements, round_trips, plan.text(self.plan))
+        self.set_attribute('Plan', plan.summary(self.plan))
+        self.set_attribute('Statements', statements)
+        self.set_attribute('RoundTrips', round_trips)
+
+    def send_response(self):
+        """
+        sends the response to `ResponseURL`, reusing the HTTP connection of previous invocations.
+        """
+        self._truncate_reason()
+        url = self.request['ResponseURL']
+        with timings.phase('response'):
+            r = http.put(url, json=self.response, headers={'content-type': ''})
+        if r.status_code != 200:
+            raise Exception('failed to put the response to %s status code %d, %s' %
+                            (url, r.status_code, r.text))
 
 
 provider = MySQLUser()
@@ -0,0 +1,307 @@
+import copy
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from catalog import Catalog
+from mysql_user_provider import Continued, MySQLUser, mysql_password, request_schema as user_request_schema
+from retry import is_connection_lost
+from schema_drop import time_margin
+from timing import timings
+
+log = logging.getLogger()
+
+# the maximum number of statements of the users sent to the server in a single round trip
+batch_size = int(os.environ.get('USERS_BATCH_SIZE', '500'))
+
+request_schema = {
+    "$schema": "http://json-schema.org/draft-04/schema#",
+    "type": "object",
+    "required": ["Database", "Users"],
+    "properties": {
+        "Database": {"$ref": "#/definitions/connection"},
+        "Users": {
+            "type": "array",
+            "items": {"$ref": "#/definitions/user"},
+            "description": "the users to create"
+        },
+        "WithDatabase": {
+            "type": "boolean",
+            "default": True,
+            "description": "create a database with the same name for each user, unless specified on the user"
+        },
+        "DeletionPolicy": {
+            "type": "string",
+            "default": "Retain",
+            "enum": ["Drop", "Retain"]
+        },
+        "DropStrategy": user_request_schema["properties"]["DropStrategy"],
+        "DropChunkSize": user_request_schema["properties"]["DropChunkSize"],
+        "ActiveSessions": user_request_schema["properties"]["ActiveSessions"],
+        "DrainTimeout": user_request_schema["properties"]["DrainTimeout"],
+        "Resumable": user_request_schema["properties"]["Resumable"],
+        "ResourceLimits": user_request_schema["properties"]["ResourceLimits"],
+        "Plan": user_request_schema["properties"]["Plan"]
+    },
+    "definitions": {
+        "connection": user_request_schema["definitions"]["connection"],
+        "user": {
+            "type": "object",
+            "oneOf": [
+                {"required": ["User", "Password"]},
+                {"required": ["User", "PasswordParameterName"]},
+                {"required": ["User", "PasswordSecretName"]},
+                {"required": ["User", "PasswordHash"]},
+                {"required": ["User", "AuthPlugin"],
+                 "properties": {"AuthPlugin": {"enum": ["AWSAuthenticationPlugin"]}}}
+            ],
+            "dependencies": user_request_schema["dependencies"],
+            "properties": {
+                "User": user_request_schema["properties"]["User"],
+                "Password": user_request_schema["properties"]["Password"],
+                "PasswordParameterName": user_request_schema["properties"]["PasswordParameterName"],
+                "PasswordSecretName": user_request_schema["properties"]["PasswordSecretName"],
+                "PasswordHash": user_request_schema["properties"]["PasswordHash"],
+                "AuthPlugin": user_request_schema["properties"]["AuthPlugin"],
+                "ResourceLimits": user_request_schema["properties"]["ResourceLimits"],
+                "WithDatabase": {
+                    "type": "boolean",
+                    "description": "create a database with the same name, or only a user"
+                }
+            }
+        }
+    }
+}
+
+
+class MySQLUsers(MySQLUser):
+    """
+    Provisions a list of users on a single database server with a single connection.
+    """
+
+    def __init__(self):
+        super(MySQLUsers, self).__init__()
+        self.request_schema = request_schema
+        self.durations = OrderedDict()
+
+    def entries(self, properties):
+        """
+        returns the resource properties of each user in `properties`, keyed by user.
+        """
+        defaults = {'WithDatabase': True, 'DeletionPolicy': 'Retain'}
+        defaults.update({k: properties[k] for k in
+                         ['Database', 'WithDatabase', 'DeletionPolicy', 'DropStrategy', 'DropChunkSize',
+                          'ActiveSessions', 'DrainTimeout', 'Resumable', 'ResourceLimits', 'Plan'] if k in properties})
+        return OrderedDict((e['User'], dict(defaults, **e)) for e in properties.get('Users', []))
+
+    @property
+    def users(self):
+        return self.entries(self.properties)
+
+    @property
+    def old_users(self):
+        return self.entries(self.heuristic_convert_property_types(copy.deepcopy(self.old_properties)))
+
+    @property
+    def secrets(self):
+        """
+        returns the secrets of the request, including the passwords and password hashes of the users, as their
+        statements are planned together.
+        """
+        passwords = [u['Password'] for u in self.users.values() if u.get('Password')]
+        hashes = [mysql_password(p) for p in passwords] + \
+            [u['PasswordHash'] for u in self.users.values() if u.get('PasswordHash')]
+        return super(MySQLUsers, self).secrets | set(passwords + hashes)
+
+    @property
+    def url(self):
+        return 'mysql:%s:%s:%s:users:%s' % (self.host, self.port, self.dbname, self.logical_resource_id)
+
+    def load_catalog(self, entries):
+        # detects the server first, so that the providers of the users share its capabilities
+        self.capabilities
+        users = [self.for_properties(e) for e in entries]
+        with timings.phase('catalog'):
+            self.catalog = Catalog.load(self.connection,
+                                        set(u.mysql_user for u in users),
+                                        set(u.mysql_user for u in users if u.with_database),
+                                        any(u.password_is_verifiable for u in users))
+
+    def apply(self, changes):
+        """
+        applies the `changes` on the database, a list of tuples (properties, action). action is one
+        of 'created', 'updated' or 'dropped'. Returns the result per user. The statements of all users are
+        executed together, in round trips of at most `USERS_BATCH_SIZE` statements. When `Resumable`, the users
+        which were done in previous invocations of the request are skipped, and the users for which no time is
+        left are 'continued'. The seconds it took to apply the change are recorded per user in `durations`.
+        """
+        done = self.checkpoint.get('Results', {})
+        results = OrderedDict((p['User'], done[p['User']]) for p, _ in changes if p['User'] in done)
+        changes = [(p, action) for p, action in changes if p['User'] not in done]
+        references = [self.password_reference(p) for p, action in changes if action != 'dropped']
+        self.open(r for r in references if r)
+        self.physical_resource_id = self.url
+        self.load_catalog([p for p, _ in changes])
+
+        remaining_time = self.remaining_time
+        deadline = time.monotonic() + remaining_time - time_margin if remaining_time is not None else None
+        old_users = self.old_users
+        self.durations = OrderedDict()
+        longest = None
+        batch = []
+        for properties, action in changes:
+            old_properties = old_users.get(properties['User']) if action == 'updated' else None
+            provider = self.for_properties(properties, old_properties)
+            # at least one user is done in each invocation, so that the request always makes progress
+            if self.resumable and deadline is not None and longest is not None and \
+                    time.monotonic() + longest >= deadline:
+                results[provider.user] = 'continued'
+                continue
+            started = time.monotonic()
+            try:
+                statements = self.batch_statements(provider, action)
+                batch.extend((provider.user, s) for s in statements)
+                results[provider.user] = action
+            except Continued:
+                results[provider.user] = 'continued'
+            except Exception as e:
+                log.error('failed to %s user %s, %s', action[:-1], provider.user, e)
+                results[provider.user] = 'failed: %s' % e
+            self.durations[provider.user] = time.monotonic() - started
+            longest = max(longest or 0, self.durations[provider.user])
+        self.execute_batches(batch, results)
+        return results
+
+    @staticmethod
+    def batch_statements(provider, action):
+        """
+        returns the statements to apply the `action` for the user of the `provider`, to be executed in a batch.
+        On servers which require existence checks, the action is applied right away and no statements are returned.
+        """
+        if action == 'dropped':
+            statements = provider.prepare_drop()
+            if statements is None:
+                provider.drop_existing()
+        else:
+            if action == 'updated' and provider.changes_password():
+                provider.end_sessions()
+            statements = provider.create_user_batch()
+            if statements is None:
+                provider.create_user()
+        return statements if statements else []
+
+    def execute_batches(self, batch, results):
+        """
+        executes the `batch`, a list of tuples (user, statement), in round trips of at most `batch_size`
+        statements. When a statement fails, its user is marked as failed in the `results` and its remaining
+        statements are skipped, after which the statements of the other users are executed. If the connection is
+        lost, all remaining users fail. The time of a round trip is divided over the users in it.
+        """
+        pending = list(batch)
+        while pending:
+            chunk = pending[:batch_size]
+            completed = []
+            started = time.monotonic()
+            try:
+                self.execute_batch([s for _, s in chunk], completed=completed)
+                pending = pending[len(chunk):]
+            except Exception as e:
+                failed = set(u for u, _ in pending[len(completed):]) if is_connection_lost(e) \
+                    else {chunk[len(completed)][0]}
+                for user in failed:
+                    log.error('failed to %s user %s, %s', results[user][:-1], user, e)
+                    results[user] = 'failed: %s' % e
+                chunk = chunk[:len(completed) + 1]
+                pending = [(u, s) for u, s in pending[len(completed):] if u not in failed]
+            users = set(u for u, _ in chunk)
+            for user in users:
+                self.durations[user] += (time.monotonic() - started) / len(users)
+
+    def report(self, results):
+        for status in ['created', 'updated', 'dropped', 'unchanged', 'failed']:
+            self.set_attribute(status.capitalize(), len([r for r in results.values() if r.startswith(status)]))
+        log.info('results per user %s', json.dumps(results))
+
+        failed = OrderedDict((u, r[len('failed: '):]) for u, r in results.items() if r.startswith('failed'))
+        if failed:
+            self.fail('Failed to provision %d of %d users, %s' % (
+                len(failed), len(results), ', '.join('%s: %s' % f for f in failed.items())))
+
+    def has_unique_users(self):
+        if len(self.users) != len(self.get('Users')):
+            self.fail('Users must be unique')
+            return False
+        return True
+
+    def create(self):
+        if not self.has_unique_users():
+            self.physical_resource_id = 'could-not-create'
+            return
+        try:
+            results = self.apply([(p, 'created') for p in self.users.values()])
+            if not self.resume_pending(results):
+                self.report(results)
+        except Exception as e:
+            if not self.physical_resource_id:
+                self.physical_resource_id = 'could-not-create'
+            self.fail('Failed to create users, %s' % e)
+        finally:
+            self.close()
+
+    def update(self):
+        if self.was_planned:
+            # nothing was applied by the plan, so the users are created now
+            self.create()
+            return
+        if not self.has_unique_users():
+            return
+        if not self.allow_update:
+            self.fail('Only the users can be updated')
+            return
+
+        old, new = self.old_users, self.users
+        changes = [(old[u], 'dropped') for u in old if u not in new]
+        changes.extend((new[u], 'created') for u in new if u not in old)
+        changes.extend((new[u], 'updated') for u in new if u in old and self.is_changed(old[u], new[u]))
+        unchanged = [u for u in new if u in old and not self.is_changed(old[u], new[u])]
+        try:
+            results = self.apply(changes) if changes else OrderedDict()
+            results.update((u, 'unchanged') for u in unchanged)
+            if not self.resume_pending(results):
+                self.report(results)
+        except Exception as e:
+            self.fail('Failed to update the users, %s' % e)
+        finally:
+            self.close()
+
+    @staticmethod
+    def is_changed(old, new):
+        return any(old.get(k) != new.get(k) for k in
+                   ['Password', 'PasswordParameterName', 'PasswordSecretName', 'PasswordHash', 'AuthPlugin',
+                    'ResourceLimits', 'WithDatabase'])
+
+    def delete(self):
+        if self.physical_resource_id == 'could-not-create':
+            self.success('users were never created')
+            return
+        if self.was_planned:
+            self.success('users were only planned')
+            return
+
+        try:
+            results = self.apply([(p, 'dropped') for p in self.users.values()])
+            if not self.resume_pending(results):
+                self.report(results)
+        except Exception as e:
+            self.fail(str(e))
+        finally:
+            self.close()
+
+
+provider = MySQLUsers()
+
+
+def handler(request, context):
+    return provider.handle(request, context)
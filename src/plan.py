@@ -0,0 +1,94 @@
+import re
+
+# the CloudFormation response is limited to 4096 bytes, so a long plan is truncated in the response
+max_plan_length = 3000
+
+redacted = '********'
+
+# the prefix of the physical resource id of a resource which was only planned
+planned_prefix = 'plan:'
+
+
+def planned_id(physical_resource_id):
+    """
+    returns the physical resource id of a planned resource, which differs from the id of the applied resource, so
+    that CloudFormation sends an update once the plan is applied.
+    """
+    return planned_prefix + physical_resource_id
+
+
+def is_planned_id(physical_resource_id):
+    return bool(physical_resource_id) and physical_resource_id.startswith(planned_prefix)
+
+
+def is_read_only(operation):
+    """
+    returns true if `operation` only reads from the server.
+    """
+    return re.match(r'^\s*(SELECT|SHOW)\s', operation, re.IGNORECASE) is not None
+
+
+def render(operation, params, secrets=()):
+    """
+    returns the `operation` with the `params` filled in as quoted literals, and the `secrets` redacted.
+    """
+    if not params:
+        return operation
+    return operation % tuple(redacted if p in secrets else "'%s'" % str(p).replace("'", "''") for p in params)
+
+
+class PlanningCursor(object):
+    """
+    cursor which executes read only statements, and records all other statements as a round trip of the `plan`.
+    """
+
+    def __init__(self, cursor, plan, secrets=()):
+        self.cursor = cursor
+        self.plan = plan
+        self.secrets = secrets
+        self.recorded = False
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        if is_read_only(operation):
+            self.recorded = False
+            return self.cursor.execute(operation, params, *args, **kwargs)
+        self.plan.append([render(operation, params, self.secrets)])
+        self.recorded = True
+
+    def fetchall(self):
+        return [] if self.recorded else self.cursor.fetchall()
+
+    def fetchone(self):
+        return None if self.recorded else self.cursor.fetchone()
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+def is_comment(statements):
+    return statements[0].startswith('-- ')
+
+
+def count(plan):
+    """
+    returns the number of statements and round trips of the `plan`, a list of round trips of statements.
+    """
+    round_trips = [b for b in plan if not is_comment(b)]
+    return sum(len(b) for b in round_trips), len(round_trips)
+
+
+def text(plan):
+    """
+    returns the `plan` as text, with a blank line between round trips.
+    """
+    return '\n\n'.join(b[0] if is_comment(b) else ';\n'.join(b) + ';' for b in plan)
+
+
+def summary(plan):
+    """
+    returns the `plan` as text, truncated to fit in a response.
+    """
+    result = text(plan)
+    if len(result) > max_plan_length:
+        return result[:max_plan_length] + '\n... truncated, the full plan is in the log'
+    return result
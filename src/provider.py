@@ -0,0 +1,18 @@
+import mysql_user_provider
+import mysql_users_provider
+import reconcile
+import rotation
+
+
+def handler(request, context):
+    if request.get('ResourceType') == 'Custom::MySQLUsers':
+        return mysql_users_provider.handler(request, context)
+    return mysql_user_provider.handler(request, context)
+
+
+def reconcile_handler(event, context):
+    return reconcile.handler(event, context)
+
+
+def rotation_handler(event, context):
+    return rotation.handler(event, context)
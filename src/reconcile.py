@@ -0,0 +1,157 @@
+import copy
+import json
+import logging
+import uuid
+from collections import OrderedDict
+
+import grants
+from catalog import Snapshot
+from mysql_user_provider import endpoint_executor, endpoint_key, request_schema as user_request_schema
+from mysql_users_provider import MySQLUsers, request_schema as users_request_schema
+
+log = logging.getLogger()
+
+request_schema = {
+    "$schema": "http://json-schema.org/draft-04/schema#",
+    "type": "object",
+    "required": ["Database", "Users"],
+    "properties": {
+        "Database": user_request_schema["properties"]["Database"],
+        "Users": {
+            "type": "array",
+            "items": {"$ref": "#/definitions/user"},
+            "description": "the users as declared"
+        },
+        "WithDatabase": users_request_schema["properties"]["WithDatabase"],
+        "Statements": {
+            "type": "boolean",
+            "default": False,
+            "description": "report the statements to correct the drift"
+        }
+    },
+    "definitions": {
+        "connection": user_request_schema["definitions"]["connection"],
+        "grant": user_request_schema["definitions"]["grant"],
+        "user": {
+            "type": "object",
+            "required": ["User"],
+            "properties": dict(users_request_schema["definitions"]["user"]["properties"],
+                               Grants=user_request_schema["properties"]["Grants"])
+        }
+    }
+}
+
+
+def compare(user, snapshot):
+    """
+    returns the differences between the declared `user`, a provider for the user, and the `snapshot` of the server,
+    with the statements to correct them.
+    """
+    account = (user.mysql_user, user.mysql_user_host)
+    drift, statements = [], []
+    if not snapshot.has_user(*account):
+        # the password of the user is not at hand, so the user can only be recreated by the provider
+        return ['user does not exist'], []
+
+    if snapshot.is_locked(*account):
+        drift.append('user is locked')
+        statements.append(('ALTER USER %s@%s ACCOUNT UNLOCK', list(account)))
+
+    current = snapshot.database_privileges(*account)
+    if user.with_database:
+        owned = current.pop((user.mysql_user, '*'), set())
+        if not snapshot.has_schema(user.mysql_user):
+            drift.append('database does not exist')
+            statements.append(('CREATE DATABASE IF NOT EXISTS %s' % user.mysql_user, None))
+        if not owned.issuperset({'ALL PRIVILEGES', 'GRANT OPTION'}):
+            drift.append('user does not own its database')
+            statements.append(user.grant_ownership_statement())
+
+    if user.grants is not None:
+        # only database privileges are recorded in mysql.db
+        declared = {k: p for k, p in grants.declared_grants(user.grants).items() if k[0] != '*' and k[1] == '*'}
+        changes = grants.statements(account, current, declared)
+        if changes:
+            drift.append('grants differ')
+            statements.extend(changes)
+    return drift, statements
+
+
+class Reconciler(MySQLUsers):
+    """
+    compares the declared users with the actual accounts, databases and database privileges on one or more
+    servers. Each server is read with a single snapshot of three queries, regardless of the number of users.
+    """
+
+    def __init__(self):
+        super(Reconciler, self).__init__()
+        self.request_schema = request_schema
+
+    def check(self):
+        """
+        returns the drift of the users on the connected server.
+        """
+        users = [self.for_properties(e) for e in self.users.values()]
+        snapshot = Snapshot.load(self.connection,
+                                 set(u.mysql_user for u in users),
+                                 set(u.mysql_user for u in users if u.with_database),
+                                 self.capabilities)
+        drifted = []
+        for user in users:
+            drift, statements = compare(user, snapshot)
+            if drift:
+                entry = OrderedDict([('User', user.user), ('Drift', drift)])
+                if self.get('Statements'):
+                    entry['Statements'] = [[op, params] for op, params in statements]
+                drifted.append(entry)
+        return OrderedDict([('Checked', len(users)), ('Drifted', len(drifted)), ('Users', drifted)])
+
+    def check_endpoint(self, connection):
+        provider = Reconciler()
+        provider.set_request(dict(self.request, ResourceProperties=dict(self.properties, Database=connection)),
+                             self.context)
+        provider.passwords = self.passwords
+        provider.password_versions = self.password_versions
+        provider.retry = self.retry
+        try:
+            provider.connect()
+            return provider.check()
+        finally:
+            provider.close()
+
+    def reconcile(self, event, context):
+        """
+        returns the drift report of the users declared in `event` on each server.
+        """
+        self.set_request({'RequestType': 'Reconcile', 'StackId': '', 'LogicalResourceId': 'Reconcile',
+                          'RequestId': getattr(context, 'aws_request_id', str(uuid.uuid4())),
+                          'ResourceProperties': copy.deepcopy(event)}, context)
+        if not self.is_valid_request():
+            raise ValueError(self.reason)
+
+        database = self.get('Database')
+        connections = database if isinstance(database, list) else [database]
+        references = [self.password_reference(c) for c in connections]
+        self.get_passwords([r for r in references if r])
+
+        jobs = OrderedDict((endpoint_key(c), endpoint_executor.submit(self.check_endpoint, c)) for c in connections)
+        servers = OrderedDict()
+        for endpoint, job in jobs.items():
+            try:
+                servers[endpoint] = job.result()
+            except Exception as e:
+                log.error('failed to reconcile users on %s, %s', endpoint, e)
+                servers[endpoint] = OrderedDict([('Error', str(e))])
+
+        report = OrderedDict([('Drifted', sum(s.get('Drifted', 0) for s in servers.values())),
+                              ('Failed', len([s for s in servers.values() if 'Error' in s])),
+                              ('Servers', servers)])
+        log.info('drift report %s', json.dumps(report))
+        return report
+
+
+reconciler = Reconciler()
+
+
+def handler(event, context):
+    return reconciler.reconcile(event, context)
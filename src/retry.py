@@ -0,0 +1,91 @@
+import logging
+import os
+import random
+import threading
+import time
+
+log = logging.getLogger()
+
+# MySQL errors which are expected to pass: the server cannot be reached or went away, as during a failover, it
+# has too many connections, it is read only while a replica is promoted, or a statement lost a lock conflict.
+transient_errors = {2003, 2006, 2013, 2055, 1040, 1205, 1213, 1290, 1836}
+
+# MySQL errors after which the connection is unusable, and a new one must be opened before retrying
+connection_errors = {2006, 2013, 2055}
+
+# error codes of AWS APIs which are throttled or temporarily unavailable
+transient_error_codes = {'Throttling', 'ThrottlingException', 'TooManyRequestsException', 'RequestLimitExceeded',
+                         'ProvisionedThroughputExceededException', 'InternalServerError', 'InternalServiceError',
+                         'ServiceUnavailable', 'ServiceUnavailableException'}
+
+
+def is_connection_lost(error):
+    return getattr(error, 'errno', None) in connection_errors
+
+
+def is_transient(error):
+    """
+    returns true if the operation which raised `error` may succeed when it is tried again.
+    """
+    import mysql.connector
+
+    if isinstance(error, mysql.connector.Error):
+        return error.errno in transient_errors
+
+    module = type(error).__module__
+    if module.startswith('botocore'):
+        from botocore.exceptions import ClientError, ConnectionError
+
+        if isinstance(error, ClientError):
+            return error.response.get('Error', {}).get('Code') in transient_error_codes
+        return isinstance(error, ConnectionError)
+    return False
+
+
+class Retry(object):
+    """
+    retries operations which fail with a transient error, with full jitter exponential backoff: before attempt n,
+    it waits a random time up to `base_delay` * 2^n seconds, with at most `max_delay` seconds. An operation is tried
+    at most `attempts` times, and is not retried if the wait would end after the `deadline`, a `time.monotonic`
+    value. The retries of all operations are counted, so they can be reported with the response.
+    """
+
+    def __init__(self, attempts=5, base_delay=0.2, max_delay=5.0, deadline=None):
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.deadline = deadline
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def delay(self, attempt):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def __call__(self, operation, description, recover=None):
+        """
+        returns the result of `operation`, called without arguments. Before a retry, `recover` is called with the
+        error, e.g. to reconnect.
+        """
+        attempt = 1
+        while True:
+            try:
+                return operation()
+            except Exception as e:
+                if attempt >= self.attempts or not is_transient(e):
+                    raise
+                delay = self.delay(attempt)
+                if self.deadline is not None and time.monotonic() + delay >= self.deadline:
+                    log.warning('%s failed, no time left to retry, %s', description, e)
+                    raise
+                with self.lock:
+                    self.count += 1
+                log.warning('%s failed with a transient error, retrying in %.2fs (attempt %d of %d), %s',
+                            description, delay, attempt + 1, self.attempts, e)
+                time.sleep(delay)
+                if recover:
+                    recover(e)
+                attempt += 1
+
+
+attempts = int(os.environ.get('RETRY_ATTEMPTS', '5'))
+base_delay = float(os.environ.get('RETRY_BASE_DELAY', '0.2'))
@@ -0,0 +1,318 @@
+import copy
+import datetime
+import json
+import logging
+import time
+import uuid
+from collections import OrderedDict
+
+from aws_clients import get_client
+from mysql_user_provider import endpoint_executor, endpoint_key, random_password
+from mysql_users_provider import MySQLUsers
+from schema_drop import time_margin
+from secret_cache import secret_cache
+
+log = logging.getLogger()
+
+# the tags on a secret which name the MySQL user of the password and the server it is on, and the properties of
+# a Custom::MySQLUser they map to.
+user_tags = OrderedDict([('mysql:user', 'User'), ('mysql:auth-plugin', 'AuthPlugin')])
+connection_tags = OrderedDict([
+    ('mysql:host', 'Host'), ('mysql:port', 'Port'), ('mysql:dbname', 'DBName'), ('mysql:owner', 'User'),
+    ('mysql:owner-password-parameter-name', 'PasswordParameterName'),
+    ('mysql:owner-password-secret-name', 'PasswordSecretName'),
+    ('mysql:owner-iam-authentication', 'IAMAuthentication'), ('mysql:ssl-mode', 'SSLMode'), ('mysql:ssl-ca', 'SSLCA')])
+
+password_length = 32
+
+
+def properties_from_tags(name, tags):
+    """
+    returns the properties of the user with the password in secret `name`, from the `tags` of the secret.
+    """
+    tags = {t['Key']: t['Value'] for t in tags or []}
+    if 'mysql:user' not in tags or 'mysql:host' not in tags:
+        raise ValueError('secret %s is not tagged with mysql:user and mysql:host' % name)
+    properties = {p: tags[t] for t, p in user_tags.items() if t in tags}
+    properties['Database'] = dict({'DBName': 'mysql'}, **{p: tags[t] for t, p in connection_tags.items() if t in tags})
+    return properties
+
+
+def current_version(versions):
+    """
+    returns the id of the AWSCURRENT version in `versions`, a dictionary of version id to staging labels.
+    """
+    return next((v for v, stages in versions.items() if 'AWSCURRENT' in stages), None)
+
+
+class Rotation(MySQLUsers):
+    """
+    sets the new passwords of the users on a single server, in a single round trip.
+    """
+
+    def prepare(self, connection, users, context=None):
+        """
+        sets the request to give the `users` on `connection` a new password, a list of user properties with the
+        new `Password`. Raises a ValueError if they are invalid.
+        """
+        self.set_request({'RequestType': 'Rotate', 'StackId': '', 'LogicalResourceId': 'Rotation',
+                          'RequestId': str(uuid.uuid4()), 'ResourceType': 'Custom::MySQLUsers',
+                          'ResourceProperties': {'Database': copy.deepcopy(connection), 'WithDatabase': False,
+                                                 'Users': copy.deepcopy(users)}}, context)
+        if not self.is_valid_request() or not self.has_unique_users():
+            raise ValueError(self.reason)
+        if any(u.get('AuthPlugin') == 'AWSAuthenticationPlugin' for u in users):
+            raise ValueError('users identified with AWSAuthenticationPlugin have no password to rotate')
+
+    def set_passwords(self):
+        """
+        sets the passwords of all users with a single batch of statements. If the batch fails, the passwords are set
+        one by one, so that a single failure does not hold up the others. Returns the error per user, or None.
+        The accounts are not unlocked: the account of a user retained by a delete stays locked.
+        """
+        users = [self.for_properties(p) for p in self.users.values()]
+        statements = [u.password_statement(unlock=False) for u in users]
+        try:
+            self.execute_batch(statements)
+            return OrderedDict((u.user, None) for u in users)
+        except Exception as e:
+            log.warning('failed to set %d passwords in one batch, setting them one by one, %s', len(users), e)
+
+        results = OrderedDict()
+        for user, statement in zip(users, statements):
+            try:
+                self.execute_batch([statement])
+                results[user.user] = None
+            except Exception as e:
+                log.error('failed to set the password of %s, %s', user.user, e)
+                results[user.user] = str(e)
+        return results
+
+    def verify_passwords(self):
+        """
+        checks that the users can log in with their new password, and returns the error per user, or None. Passwords
+        which can be compared with the stored hash are checked with a single query, the others by logging in.
+        """
+        import mysql.connector
+
+        self.load_catalog(self.users.values())
+        users = [self.for_properties(p) for p in self.users.values()]
+        results = OrderedDict()
+        for user in users:
+            if user.password_is_verifiable:
+                results[user.user] = None if user.password_is_current(unlocked=False) else 'password is not set'
+                continue
+            try:
+                mysql.connector.connect(host=self.host, port=self.port, user=user.mysql_user,
+                                        password=user.user_password, **self.tls_options).close()
+                results[user.user] = None
+            except mysql.connector.Error as e:
+                results[user.user] = str(e)
+        return results
+
+
+class Rotator(object):
+    """
+    rotates the passwords of MySQL users stored in the Secrets Manager.
+
+    As a rotation function, it handles the steps `createSecret`, `setSecret`, `testSecret` and `finishSecret` of a
+    single secret. As a scheduled function, it rotates all tagged secrets which are due at once, with a single
+    connection and round trip per server.
+    """
+
+    def __init__(self, secretsmanager=None):
+        self._secretsmanager = secretsmanager
+
+    @property
+    def secretsmanager(self):
+        return self._secretsmanager if self._secretsmanager else get_client('secretsmanager')
+
+    def pending_password(self, secret_id, token):
+        """
+        returns the AWSPENDING password of version `token`, or None if it does not exist.
+        """
+        from botocore.exceptions import ClientError
+
+        try:
+            return self.secretsmanager.get_secret_value(SecretId=secret_id, VersionId=token,
+                                                        VersionStage='AWSPENDING')['SecretString']
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') != 'ResourceNotFoundException':
+                raise
+            return None
+
+    def create_pending(self, secret_id, token, check=True):
+        """
+        returns the AWSPENDING password of version `token` of the secret, after creating it if it does not exist. With
+        `check` false, the version is known to be new and a password is created right away.
+        """
+        password = self.pending_password(secret_id, token) if check else None
+        if password is None:
+            password = random_password(password_length)
+            self.secretsmanager.put_secret_value(SecretId=secret_id, ClientRequestToken=token,
+                                                 SecretString=password, VersionStages=['AWSPENDING'])
+            log.info('created pending password of %s', secret_id)
+        return password
+
+    def finish(self, secret_id, token, versions):
+        """
+        makes version `token` of the secret the AWSCURRENT version, and drops the cached password of the version it
+        replaced.
+        """
+        current = current_version(versions)
+        if current != token:
+            self.secretsmanager.update_secret_version_stage(SecretId=secret_id, VersionStage='AWSCURRENT',
+                                                            MoveToVersionId=token, RemoveFromVersionId=current)
+            log.info('password of %s is now version %s', secret_id, token)
+        # a password of the new version, cached in the meantime, is kept
+        secret_cache.invalidate(('secretsmanager', secret_id), current if current != token else None)
+
+    def rotate_on_endpoint(self, connection, secrets_to_rotate, context, deadline=None):
+        """
+        rotates the `secrets_to_rotate` on `connection`, a list of tuples (secret name, user properties, versions).
+        The new passwords are set in a single round trip, and only made current when they are verified. Returns the
+        result per secret. The secrets are skipped if the `deadline` has passed before the rotation started.
+        """
+        if deadline is not None and time.monotonic() >= deadline:
+            log.warning('no time left to rotate %d secrets on %s', len(secrets_to_rotate), endpoint_key(connection))
+            return OrderedDict((n, 'skipped') for n, _, _ in secrets_to_rotate)
+
+        tokens, passwords = OrderedDict(), OrderedDict()
+        results = OrderedDict()
+        for name, _, _ in secrets_to_rotate:
+            try:
+                tokens[name] = str(uuid.uuid4())
+                passwords[name] = self.create_pending(name, tokens[name], check=False)
+            except Exception as e:
+                log.error('failed to create a new password for %s, %s', name, e)
+                results[name] = 'failed: %s' % e
+        pending = [(n, p, v) for n, p, v in secrets_to_rotate if n not in results]
+        if not pending:
+            return results
+
+        rotation = Rotation()
+        try:
+            users = [dict(p, Password=passwords[n]) for n, p, _ in pending]
+            rotation.prepare(connection, users, context)
+            rotation.connect()
+            errors = rotation.set_passwords()
+            verified = rotation.verify_passwords()
+        except Exception as e:
+            log.error('failed to rotate passwords on %s, %s', endpoint_key(connection), e)
+            results.update((n, 'failed: %s' % e) for n, _, _ in pending)
+            return results
+        finally:
+            rotation.close()
+
+        for name, properties, versions in pending:
+            error = errors.get(properties['User']) or verified.get(properties['User'])
+            if error:
+                results[name] = 'failed: %s' % error
+                continue
+            try:
+                self.finish(name, tokens[name], versions)
+                results[name] = 'rotated'
+            except Exception as e:
+                results[name] = 'failed: %s' % e
+        return results
+
+    def due_secrets(self, max_age):
+        """
+        returns the secrets tagged with a MySQL user which were not changed in the last `max_age` days, as tuples
+        of (secret name, user properties, versions).
+        """
+        threshold = datetime.datetime.now(datetime.timezone.utc) - datetime.timedelta(days=max_age)
+        result = []
+        kwargs = {'Filters': [{'Key': 'tag-key', 'Values': ['mysql:user']}], 'MaxResults': 100}
+        while True:
+            response = self.secretsmanager.list_secrets(**kwargs)
+            for secret in response.get('SecretList', []):
+                changed = secret.get('LastChangedDate') or secret.get('CreatedDate')
+                if changed and changed > threshold:
+                    continue
+                try:
+                    result.append((secret['Name'], properties_from_tags(secret['Name'], secret.get('Tags')),
+                                   secret.get('SecretVersionsToStages', {})))
+                except ValueError as e:
+                    log.warning('%s', e)
+            if not response.get('NextToken'):
+                return result
+            kwargs['NextToken'] = response['NextToken']
+
+    def rotate_due(self, max_age, context=None):
+        """
+        rotates the passwords of all tagged secrets not changed in the last `max_age` days, grouped per server.
+        Returns the number of secrets `Rotated`, `Failed` and `Skipped`, and the result per secret per server. Secrets
+        are skipped when the invocation runs out of time; as they are still due, the next run rotates them.
+        """
+        get_remaining_time = getattr(context, 'get_remaining_time_in_millis', None)
+        deadline = time.monotonic() + get_remaining_time() / 1000.0 - time_margin if get_remaining_time else None
+        groups = OrderedDict()
+        for name, properties, versions in self.due_secrets(max_age):
+            connection = properties.pop('Database')
+            groups.setdefault(endpoint_key(connection), (connection, []))[1].append((name, properties, versions))
+        log.info('rotating %d secrets on %d servers', sum(len(g[1]) for g in groups.values()), len(groups))
+
+        jobs = OrderedDict((e, endpoint_executor.submit(self.rotate_on_endpoint, c, s, context, deadline))
+                           for e, (c, s) in groups.items())
+        servers = OrderedDict((e, job.result()) for e, job in jobs.items())
+        results = [r for s in servers.values() for r in s.values()]
+        report = OrderedDict([('Rotated', results.count('rotated')),
+                              ('Failed', len([r for r in results if r.startswith('failed')])),
+                              ('Skipped', results.count('skipped')),
+                              ('Servers', servers)])
+        log.info('rotation report %s', json.dumps(report))
+        return report
+
+    def describe(self, secret_id, token):
+        """
+        returns the name, user properties and versions of the secret, after checking that version `token` is
+        being rotated.
+        """
+        secret = self.secretsmanager.describe_secret(SecretId=secret_id)
+        versions = secret.get('VersionIdsToStages', {})
+        if token not in versions:
+            raise ValueError('secret %s has no version %s to rotate' % (secret_id, token))
+        return secret['Name'], properties_from_tags(secret['Name'], secret.get('Tags')), versions
+
+    def step(self, event, context=None):
+        """
+        executes the rotation `Step` of the event for version `ClientRequestToken` of secret `SecretId`.
+        """
+        secret_id, token, step = event['SecretId'], event['ClientRequestToken'], event['Step']
+        name, properties, versions = self.describe(secret_id, token)
+        if 'AWSCURRENT' in versions[token]:
+            log.info('version %s of %s is already current', token, name)
+            return
+        if 'AWSPENDING' not in versions[token]:
+            raise ValueError('version %s of %s is not pending' % (token, name))
+
+        log.info('%s of %s version %s', step, name, token)
+        if step == 'createSecret':
+            self.create_pending(secret_id, token)
+        elif step in ('setSecret', 'testSecret'):
+            password = self.pending_password(secret_id, token)
+            if password is None:
+                raise ValueError('secret %s has no pending password %s' % (name, token))
+            rotation = Rotation()
+            try:
+                rotation.prepare(properties.pop('Database'), [dict(properties, Password=password)], context)
+                rotation.connect()
+                results = rotation.set_passwords() if step == 'setSecret' else rotation.verify_passwords()
+            finally:
+                rotation.close()
+            if results[properties['User']]:
+                raise ValueError('%s of %s failed, %s' % (step, name, results[properties['User']]))
+        elif step == 'finishSecret':
+            self.finish(secret_id, token, versions)
+        else:
+            raise ValueError('invalid rotation step %s' % step)
+
+
+rotator = Rotator()
+
+
+def handler(event, context):
+    if 'Step' in event:
+        return rotator.step(event, context)
+    return rotator.rotate_due(int(event.get('MaxAge', 30)), context)
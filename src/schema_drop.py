@@ -0,0 +1,183 @@
+import logging
+import time
+
+from grants import quote_identifier
+
+log = logging.getLogger()
+
+# the seconds to keep in reserve for sending the response, when the drop has to stop before the Lambda times out
+time_margin = 10
+
+# the seconds a drop waits for a metadata lock held by another session, before it gives up
+lock_wait_timeout = 5
+
+holding_schema_prefix = '_dropped_'
+
+
+class SchemaDrop(object):
+    """
+    drops a large schema in bounded steps, so that the drop fits in the remaining time of the invocation and does
+    not queue behind other sessions on the metadata locks of its tables.
+
+    With the `Chunked` strategy, the tables are dropped `chunk_size` at a time. With the `Rename` strategy, the
+    tables are first moved into a holding schema, which only changes metadata, so that the schema is gone at once;
+    the holding schema is then purged in chunks. Views and triggers, which cannot be moved to another schema, are
+    dropped before the tables. Whatever is not dropped before the deadline stays on the server:
+    the next drop of the schema, or the next drop with the `Rename` strategy on the same server, continues where
+    this one stopped.
+    """
+
+    def __init__(self, provider, schema, strategy='Chunked', chunk_size=100, remaining_time=None):
+        self.provider = provider
+        self.schema = schema
+        self.strategy = strategy
+        self.chunk_size = chunk_size
+        self.deadline = time.monotonic() + remaining_time - time_margin if remaining_time is not None else None
+        self.dropped = 0
+        self.remaining = 0
+
+    def has_time_for(self, seconds):
+        return self.deadline is None or time.monotonic() + seconds < self.deadline
+
+    def query(self, operation, params=None):
+        cursor = self.provider.cursor()
+        try:
+            cursor.execute(operation, params)
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+    def tables(self, schema):
+        return [r[0] for r in self.query(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = %s AND table_type = 'BASE TABLE' "
+            "ORDER BY table_name", [schema])]
+
+    def views_and_triggers(self, schema):
+        """
+        returns the views and triggers of `schema`, as (kind, name) tuples.
+        """
+        return self.query(
+            "SELECT 'VIEW', table_name FROM information_schema.views WHERE table_schema = %s UNION ALL "
+            "SELECT 'TRIGGER', trigger_name FROM information_schema.triggers WHERE trigger_schema = %s",
+            [schema, schema])
+
+    def holding_schemas(self):
+        return [r[0] for r in self.query(
+            'SELECT SCHEMA_NAME FROM information_schema.schemata WHERE SCHEMA_NAME LIKE %s',
+            [holding_schema_prefix.replace('_', '\\_') + '%'])]
+
+    def blocking_sessions(self, schema):
+        """
+        returns the other sessions which are using `schema`, as (id, user, host, command, time, state) tuples.
+        """
+        return self.query('SELECT id, user, host, command, time, state FROM information_schema.processlist '
+                          'WHERE db = %s AND id <> CONNECTION_ID()', [schema])
+
+    def execute_bounded(self, statements):
+        """
+        executes the `statements` in a single round trip, waiting at most `lock_wait_timeout` seconds for a
+        metadata lock. Foreign keys between the tables of the schema do not block the drop.
+        """
+        settings = [('SET SESSION foreign_key_checks = 0', None),
+                    ('SET SESSION lock_wait_timeout = %d' % lock_wait_timeout, None)]
+        defaults = [('SET SESSION foreign_key_checks = DEFAULT', None),
+                    ('SET SESSION lock_wait_timeout = DEFAULT', None)]
+        try:
+            # a blocked drop is resumed by the next delete, rather than retried within the time of this one
+            self.provider.execute_batch(settings + statements + defaults, retry=False)
+        except Exception:
+            self.provider.execute_batch(defaults)
+            raise
+
+    def drop_views_and_triggers(self, schema):
+        """
+        drops the views and triggers of `schema`, `chunk_size` at a time. They hold no data, but a view cannot be
+        moved to another schema, nor can a table with triggers, and a view is not dropped by DROP TABLE.
+        """
+        statements = [('DROP %s IF EXISTS %s.%s' % (kind, quote_identifier(schema), quote_identifier(name)), None)
+                      for kind, name in self.views_and_triggers(schema)]
+        for start in range(0, len(statements), self.chunk_size):
+            self.execute_bounded(statements[start:start + self.chunk_size])
+        if statements:
+            log.info('dropped %d views and triggers of %s', len(statements), schema)
+
+    def drop_tables(self, schema, tables):
+        """
+        drops the `tables` of `schema` in chunks, until all are dropped or the deadline is near. Returns true if
+        all tables were dropped.
+        """
+        duration = 0
+        for start in range(0, len(tables), self.chunk_size):
+            if not self.has_time_for(duration):
+                return False
+            chunk = tables[start:start + self.chunk_size]
+            started = time.monotonic()
+            self.execute_bounded([('DROP TABLE IF EXISTS %s' % ', '.join(
+                '%s.%s' % (quote_identifier(schema), quote_identifier(t)) for t in chunk), None)])
+            duration = time.monotonic() - started
+            self.dropped += len(chunk)
+            self.remaining -= len(chunk)
+            log.info('dropped %d tables of %s, %d remaining', self.dropped, self.schema, self.remaining)
+        return True
+
+    def rename_tables(self, schema, tables):
+        """
+        moves the `tables` of `schema` into a new holding schema, and returns its name.
+        """
+        holding = '%s%s_%s' % (holding_schema_prefix, schema, time.strftime('%Y%m%d%H%M%S', time.gmtime()))
+        self.provider.execute_batch([('CREATE DATABASE IF NOT EXISTS %s' % quote_identifier(holding), None)])
+        for start in range(0, len(tables), self.chunk_size):
+            chunk = tables[start:start + self.chunk_size]
+            self.execute_bounded([('RENAME TABLE %s' % ', '.join(
+                '%s.%s TO %s.%s' % (quote_identifier(schema), quote_identifier(t),
+                                    quote_identifier(holding), quote_identifier(t)) for t in chunk), None)])
+        log.info('moved %d tables of %s into %s', len(tables), schema, holding)
+        return holding
+
+    def purge(self, schema):
+        """
+        drops the tables of `schema` and then `schema` itself, as far as time permits. Returns true if the schema
+        is gone.
+        """
+        self.drop_views_and_triggers(schema)
+        tables = self.tables(schema)
+        self.remaining += len(tables)
+        if not self.drop_tables(schema, tables):
+            return False
+        self.provider.execute_batch([('DROP DATABASE IF EXISTS %s' % quote_identifier(schema), None)])
+        return True
+
+    def run(self):
+        """
+        drops the schema. Returns true if it was dropped completely, false if the drop must be resumed later.
+        """
+        import mysql.connector
+
+        try:
+            sessions = self.blocking_sessions(self.schema)
+            if sessions:
+                log.warning('%d sessions are using %s, %s', len(sessions), self.schema,
+                            ', '.join('%s %s@%s %s for %ss' % tuple(s[:5]) for s in sessions))
+
+            if self.strategy == 'Rename':
+                self.drop_views_and_triggers(self.schema)
+                tables = self.tables(self.schema)
+                if tables:
+                    self.rename_tables(self.schema, tables)
+                self.provider.execute_batch([('DROP DATABASE IF EXISTS %s' % quote_identifier(self.schema), None)])
+                for holding in self.holding_schemas():
+                    if not self.purge(holding):
+                        log.info('purge of %s continues on the next drop, %d tables remaining',
+                                 holding, self.remaining)
+                        break
+                return True
+
+            if not self.purge(self.schema):
+                log.info('drop of %s stopped before the time limit, %d tables remaining', self.schema, self.remaining)
+                return False
+            return True
+        except mysql.connector.Error as e:
+            if e.errno != 1205:
+                raise
+            log.warning('drop of %s is blocked by another session, %s', self.schema, e)
+            return False
@@ -0,0 +1,150 @@
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+log = logging.getLogger()
+
+
+class Secret(object):
+
+    def __init__(self, value, version):
+        self.value = value
+        self.version = version
+        self.fetched = time.time()
+
+
+def is_immutable(reference):
+    """
+    returns true if the `reference` points to a fixed version of a parameter, e.g. `/db/password:3`.
+    """
+    kind, name = reference
+    return kind == 'ssm' and re.search(r':[0-9]+$', name) is not None
+
+
+class SecretCache(object):
+    """
+    bounded cache of resolved passwords from the Parameter Store and the Secrets Manager.
+
+    A reference is a tuple (kind, name), where kind is either `ssm` or `secretsmanager`. Cached
+    values expire after `ttl` seconds, except for references to a fixed parameter version. When an
+    expired value is fetched again with a new version, the old version is replaced. A value known to
+    be stale is evicted by its version, so that a newer version cached in the meantime is kept. Misses
+    are fetched together, with `get_parameters` and `batch_get_secret_value` respectively.
+    """
+
+    def __init__(self, ttl=60, max_size=128):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def is_fresh(self, reference, entry, now):
+        return is_immutable(reference) or now - entry.fetched < self.ttl
+
+    def get_many(self, references, clients, refresh=(), versions=None):
+        """
+        returns a dictionary with the value of each of the `references`. `clients` is called with
+        the kind of reference to obtain the boto3 client. References in `refresh` are always fetched.
+        The version of each value is added to the dictionary `versions`, if given.
+        """
+        now = time.time()
+        result = {}
+        missing = []
+        with self.lock:
+            for reference in references:
+                entry = self.entries.get(reference)
+                if entry and reference not in refresh and self.is_fresh(reference, entry, now):
+                    self.entries.move_to_end(reference)
+                    result[reference] = entry.value
+                    if versions is not None:
+                        versions[reference] = entry.version
+                    self.hits += 1
+                elif reference not in missing:
+                    missing.append(reference)
+            self.misses += len(missing)
+
+        fetched = {}
+        for kind, fetch in [('ssm', self.fetch_parameters), ('secretsmanager', self.fetch_secrets)]:
+            names = [n for k, n in missing if k == kind]
+            if names:
+                fetched.update({(kind, n): s for n, s in fetch(clients(kind), names).items()})
+
+        with self.lock:
+            for reference, secret in fetched.items():
+                previous = self.entries.pop(reference, None)
+                if previous and previous.version != secret.version:
+                    log.info('%s %s changed from version %s to %s', *reference, previous.version, secret.version)
+                self.entries[reference] = secret
+                result[reference] = secret.value
+                if versions is not None:
+                    versions[reference] = secret.version
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        return result
+
+    @staticmethod
+    def fetch_parameters(ssm, names):
+        result = {}
+        if len(names) == 1:
+            response = ssm.get_parameter(Name=names[0], WithDecryption=True)
+            return {names[0]: Secret(response['Parameter']['Value'], response['Parameter']['Version'])}
+
+        for i in range(0, len(names), 10):
+            response = ssm.get_parameters(Names=names[i:i + 10], WithDecryption=True)
+            if response.get('InvalidParameters'):
+                raise ValueError('Could not obtain password using name {}, parameter not found'.format(
+                    ', '.join(response['InvalidParameters'])))
+            for parameter in response['Parameters']:
+                name = parameter['Name'] + parameter.get('Selector', '')
+                result[name] = Secret(parameter['Value'], parameter['Version'])
+
+        for name in [n for n in names if n not in result]:
+            result.update(SecretCache.fetch_parameters(ssm, [name]))
+        return result
+
+    @staticmethod
+    def fetch_secrets(secretsmanager, names):
+        result = {}
+        if len(names) == 1:
+            response = secretsmanager.get_secret_value(SecretId=names[0])
+            return {names[0]: Secret(response['SecretString'], response['VersionId'])}
+
+        for i in range(0, len(names), 20):
+            chunk = names[i:i + 20]
+            response = secretsmanager.batch_get_secret_value(SecretIdList=chunk)
+            for value in response['SecretValues']:
+                for name in chunk:
+                    if name in (value['Name'], value['ARN']):
+                        result[name] = Secret(value['SecretString'], value['VersionId'])
+
+        for name in [n for n in names if n not in result]:
+            result.update(SecretCache.fetch_secrets(secretsmanager, [name]))
+        return result
+
+    def invalidate(self, reference, version=None):
+        """
+        evicts the value of `reference`, or only if it is of `version`, when a specific version is known to be stale.
+        """
+        with self.lock:
+            entry = self.entries.get(reference)
+            if entry and (version is None or entry.version == version):
+                del self.entries[reference]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def stats(self):
+        with self.lock:
+            return {'hits': self.hits, 'misses': self.misses, 'size': len(self.entries)}
+
+
+secret_cache = SecretCache(
+    ttl=int(os.environ.get('SECRET_CACHE_TTL', '60')),
+    max_size=int(os.environ.get('SECRET_CACHE_SIZE', '128')))
@@ -0,0 +1,108 @@
+import logging
+import re
+import threading
+
+log = logging.getLogger()
+
+# Aurora reports only the major and minor version of the MySQL release it is compatible with.
+aurora_compatible_patch_level = {(5, 6): 10, (5, 7): 12, (8, 0): 23}
+
+
+class ServerCapabilities(object):
+    """
+    the vendor, version and supported features of a database server, parsed from `select version()`.
+    """
+
+    def __init__(self, version_string):
+        self.version_string = version_string
+        lowered = version_string.lower()
+        if 'mariadb' in lowered:
+            self.vendor = 'MariaDB'
+            version_string = re.sub(r'^5\.5\.5-', '', version_string)
+        elif 'mysql_aurora' in lowered:
+            self.vendor = 'Aurora'
+        else:
+            self.vendor = 'MySQL'
+
+        match = re.match(r'^([0-9]+)\.([0-9]+)(\.([0-9]+))?', version_string)
+        if not match:
+            raise ValueError('unrecognized database version {}'.format(self.version_string))
+        major, minor = int(match.group(1)), int(match.group(2))
+        if match.group(4) is not None and self.vendor != 'Aurora':
+            patch = int(match.group(4))
+        else:
+            patch = aurora_compatible_patch_level.get((major, minor), 0)
+        self.version = (major, minor, patch)
+
+    def __repr__(self):
+        return '%s %s' % (self.vendor, '.'.join(map(str, self.version)))
+
+    def at_least(self, mysql, mariadb):
+        """
+        returns true if the server version is at least `mysql`, or `mariadb` for MariaDB.
+        """
+        return self.version >= (mariadb if self.vendor == 'MariaDB' else mysql)
+
+    @property
+    def alter_user(self):
+        return self.at_least((5, 7, 6), (10, 2, 0))
+
+    @property
+    def account_lock(self):
+        return self.at_least((5, 7, 6), (10, 4, 2))
+
+    @property
+    def create_user_if_not_exists(self):
+        return self.at_least((5, 7, 6), (10, 1, 3))
+
+    @property
+    def drop_user_if_exists(self):
+        return self.at_least((5, 7, 8), (10, 1, 3))
+
+    @property
+    def auth_plugins(self):
+        plugins = {'mysql_native_password'}
+        if self.vendor != 'MariaDB' and self.version >= (8, 0, 4):
+            plugins.add('caching_sha2_password')
+        if self.vendor != 'MariaDB' or self.version >= (10, 6, 0):
+            plugins.add('AWSAuthenticationPlugin')
+        return plugins
+
+
+class CapabilitiesCache(object):
+    """
+    the capabilities per endpoint, valid as long as the server reports the same version in the handshake.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def detect(self, connection, endpoint):
+        """
+        returns the capabilities of the server on `connection`, querying the version only if it is not known for
+        the `endpoint` or the server was upgraded.
+        """
+        handshake_version = connection.get_server_info()
+        with self.lock:
+            entry = self.entries.get(endpoint)
+        if entry and entry[0] == handshake_version:
+            return entry[1]
+
+        cursor = connection.cursor()
+        try:
+            cursor.execute('select version()')
+            capabilities = ServerCapabilities(cursor.fetchone()[0])
+        finally:
+            cursor.close()
+        log.info('database server %s:%s is %s', endpoint[0], endpoint[1], capabilities)
+        with self.lock:
+            self.entries[endpoint] = (handshake_version, capabilities)
+        return capabilities
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+capabilities_cache = CapabilitiesCache()
@@ -0,0 +1,67 @@
+import logging
+import time
+
+log = logging.getLogger()
+
+# the seconds between two looks at the sessions of a user, while waiting for them to drain
+drain_interval = 0.5
+
+
+def find_sessions(provider, user):
+    """
+    returns the sessions of `user` other than our own as (id, command, time) tuples, with a single query. Sessions are
+    matched on the user name only, as the process list shows the client host instead of the host of the account.
+    """
+    cursor = provider.cursor()
+    try:
+        cursor.execute('SELECT id, command, time FROM information_schema.processlist '
+                       'WHERE user = %s AND id <> CONNECTION_ID()', [user])
+        return [tuple(r) for r in cursor.fetchall()]
+    finally:
+        cursor.close()
+
+
+def is_active(session):
+    return session[1] not in ('Sleep', 'Killed')
+
+
+def drain_sessions(provider, user, deadline):
+    """
+    waits until none of the sessions of `user` is executing a statement, or until the `deadline` passes. Returns the
+    sessions which remain.
+    """
+    sessions = find_sessions(provider, user)
+    while any(is_active(s) for s in sessions) and time.monotonic() + drain_interval < deadline:
+        log.info('waiting for %d active sessions of %s to drain', len([s for s in sessions if is_active(s)]), user)
+        time.sleep(drain_interval)
+        sessions = find_sessions(provider, user)
+    return sessions
+
+
+def kill_sessions(provider, ids):
+    """
+    kills the sessions `ids` in a single round trip. Sessions which ended in the meantime are ignored. If the owner
+    is not allowed to kill the sessions of other users, as on Amazon RDS, `mysql.rds_kill` is used instead.
+    """
+    import mysql.connector
+
+    if not ids:
+        return
+    try:
+        provider.execute_batch([('KILL %d' % i, None) for i in ids])
+        return
+    except mysql.connector.Error as e:
+        if e.errno not in (1094, 1095):
+            raise
+        log.info('killing the sessions one by one, %s', e)
+
+    rds_kill = False
+    for i in ids:
+        try:
+            provider.execute_batch([('CALL mysql.rds_kill(%s)', [i]) if rds_kill else ('KILL %d' % i, None)])
+        except mysql.connector.Error as e:
+            if e.errno == 1095 and not rds_kill:
+                rds_kill = True
+                provider.execute_batch([('CALL mysql.rds_kill(%s)', [i])])
+            elif e.errno not in (1094, 1095):
+                raise
@@ -0,0 +1,80 @@
+import logging
+import os
+import random
+import time
+
+log = logging.getLogger()
+
+# the number of provider operations on a database server at the same time, across all invocations. 0 is unlimited.
+endpoint_concurrency = int(os.environ.get('ENDPOINT_CONCURRENCY', '0'))
+
+# the maximum number of seconds an operation waits for a slot on the database server
+slot_wait = float(os.environ.get('ENDPOINT_SLOT_WAIT', '120'))
+
+lock_prefix = 'cfn-mysql-user-provider'
+
+
+class EndpointSlots(object):
+    """
+    limits the number of operations on a database server to `size` at the same time. The slots are named locks on
+    the server itself, taken with `GET_LOCK` on the connection of the operation, so all invocations of the provider
+    share the limit without any other infrastructure, and a slot is freed when its session ends.
+
+    An operation waiting for a slot polls the slots, and closes its connection between the attempts, so that waiting
+    operations do not hold connections to the server: the slots limit the connections of the provider as well as its
+    statements.
+    """
+
+    def __init__(self, provider, size):
+        self.provider = provider
+        self.size = size
+        self.slot = None
+
+    def slot_name(self, slot):
+        return '%s:slot:%d' % (lock_prefix, slot)
+
+    def query(self, operation, params):
+        # the waits are recorded as the queue phase, not as sql
+        cursor = self.provider.connection.cursor()
+        try:
+            cursor.execute(operation, params)
+            return cursor.fetchone()[0]
+        finally:
+            cursor.close()
+
+    def take_free_slot(self):
+        """
+        returns the number of the slot taken, or None if all slots are taken. The slots are tried in a single round
+        trip, as the server stops at the first lock it gets.
+        """
+        return self.query('SELECT CASE %s ELSE NULL END' % ' '.join(
+            'WHEN GET_LOCK(%%s, 0) THEN %d' % i for i in range(self.size)),
+            [self.slot_name(i) for i in range(self.size)])
+
+    def acquire(self, timeout):
+        """
+        takes a slot, waiting at most `timeout` seconds for one to come free. Raises a ValueError if none did. While
+        all slots are taken, the connection of the provider is closed and opened again for the next attempt.
+        """
+        deadline = time.monotonic() + timeout
+        delay = 0.05
+        while True:
+            self.slot = self.take_free_slot()
+            if self.slot is not None:
+                log.info('took slot %d of %d on %s', self.slot + 1, self.size, self.provider.host)
+                return
+            if time.monotonic() + delay >= deadline:
+                raise ValueError('no slot on %s came free within %d seconds' % (self.provider.host, timeout))
+            self.provider.disconnect()
+            # the waiters are spread out, so they do not all reconnect at the same moment
+            time.sleep(delay * random.uniform(0.5, 1.0))
+            self.provider.open_connection()
+            delay = min(delay * 2, 1.0)
+
+    def release(self):
+        """
+        frees the slot, so the connection can be returned to the pool without holding it.
+        """
+        if self.slot is not None:
+            self.query('SELECT RELEASE_LOCK(%s)', [self.slot_name(self.slot)])
+            self.slot = None
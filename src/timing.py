@@ -0,0 +1,146 @@
+import json
+import logging
+import os
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+log = logging.getLogger()
+
+
+def statement_label(operation):
+    """
+    returns the kind of statement of the SQL `operation`, e.g. `CREATE USER`, without any names or values.
+    """
+    return ' '.join(operation.split()[:2]).upper()
+
+
+class TimedCursor(object):
+    """
+    cursor which records the duration of each `execute` as an `sql` phase.
+    """
+
+    def __init__(self, cursor, timings):
+        self.cursor = cursor
+        self.timings = timings
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        with self.timings.phase('sql', statement_label(operation)):
+            return self.cursor.execute(operation, params, *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self.cursor, name)
+
+
+class Timings(object):
+    """
+    records the duration of each phase of a request: resolving secrets, connecting, the SQL statements and posting
+    the response.
+
+    At the end of a request, the phases are written to standard output as a single line in the CloudWatch Embedded
+    Metric Format, with the host and request type as dimensions. The line is structured JSON, so the individual
+    phases can be queried with CloudWatch Logs Insights as well. Only a fraction `sample_rate` of the requests is
+    recorded; with a rate of 0 the instrumentation is switched off.
+    """
+
+    phases = ['secrets', 'connect', 'detect', 'queue', 'catalog', 'sql', 'response']
+
+    def __init__(self, sample_rate=1.0, namespace='cfn-mysql-user-provider', stream=None):
+        self.sample_rate = sample_rate
+        self.namespace = namespace
+        self.stream = stream
+        self.lock = threading.Lock()
+        self.active = False
+        self.started = None
+        self.dimensions = {}
+        self.properties = {}
+        self.records = []
+
+    def start(self, request_type, host, **properties):
+        """
+        starts recording a request, if it is sampled.
+        """
+        self.active = self.sample_rate > 0 and random.random() < self.sample_rate
+        self.started = time.perf_counter()
+        self.dimensions = {'Host': str(host), 'RequestType': str(request_type)}
+        self.properties = properties
+        self.records = []
+
+    @contextmanager
+    def phase(self, name, statement=None):
+        """
+        records the duration of the enclosed block as phase `name`. May be used from multiple threads.
+        """
+        if not self.active:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            record = {'phase': name, 'ms': round((time.perf_counter() - start) * 1000, 3)}
+            if statement:
+                record['statement'] = statement
+            with self.lock:
+                self.records.append(record)
+
+    def cursor(self, cursor):
+        return TimedCursor(cursor, self) if self.active else cursor
+
+    def totals(self):
+        """
+        returns the total duration in milliseconds per phase of the current request.
+        """
+        with self.lock:
+            records = list(self.records)
+        result = {name: 0.0 for name in self.phases}
+        for record in records:
+            result[record['phase']] = result.get(record['phase'], 0.0) + record['ms']
+        return result, records
+
+    def document(self, **properties):
+        """
+        returns the Embedded Metric Format document of the current request.
+        """
+        totals, records = self.totals()
+        metrics = {'%sTime' % name.capitalize(): round(ms, 3) for name, ms in totals.items()}
+        metrics['TotalTime'] = round((time.perf_counter() - self.started) * 1000, 3)
+        metrics['Statements'] = len([r for r in records if r['phase'] == 'sql'])
+
+        result = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': [sorted(self.dimensions.keys())],
+                    'Metrics': [{'Name': name, 'Unit': 'Count' if name == 'Statements' else 'Milliseconds'}
+                                for name in metrics]
+                }]
+            },
+            'phases': records
+        }
+        result.update(self.dimensions)
+        result.update(self.properties)
+        result.update(properties)
+        result.update(metrics)
+        return result
+
+    def emit(self, **properties):
+        """
+        writes the timings of the current request, if it is sampled, and stops recording.
+        """
+        if not self.active:
+            return
+        try:
+            stream = self.stream if self.stream else sys.stdout
+            stream.write(json.dumps(self.document(**properties)) + '\n')
+            stream.flush()
+        except Exception as e:
+            log.warning('failed to write the timings of the request, %s', e)
+        finally:
+            self.active = False
+
+
+timings = Timings(sample_rate=float(os.environ.get('TIMING_SAMPLE_RATE', '1')))
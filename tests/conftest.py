@@ -0,0 +1,82 @@
+import os
+import uuid
+
+import pytest
+
+os.environ.setdefault('AWS_DEFAULT_REGION', 'eu-central-1')
+
+database = {'User': 'root', 'Password': 'password', 'Host': 'localhost', 'Port': 3306, 'DBName': 'mysql'}
+
+
+def event(request_type='Create', old_properties=None, physical_resource_id=None, resource_type='Custom::MySQLUser',
+          **properties):
+    """
+    returns a CloudFormation request for the user `app` with password `password` on the local server, with the
+    `properties` added. A property set to None is removed. The old properties of an update are the same, with the
+    `old_properties` added. The physical resource id defaults to that of the user with its database.
+    """
+    properties = {k: v for k, v in dict({'User': 'app', 'Password': 'password', 'Database': dict(database)},
+                                        **properties).items() if v is not None}
+    result = {
+        'RequestType': request_type,
+        'ResponseURL': 'https://httpbin.org/put',
+        'StackId': 'arn:aws:cloudformation:us-west-2:EXAMPLE/stack-name/guid',
+        'RequestId': 'request-%s' % str(uuid.uuid4()),
+        'ResourceType': resource_type,
+        'LogicalResourceId': 'Whatever',
+        'ResourceProperties': properties,
+    }
+    if physical_resource_id is None and request_type != 'Create' and 'User' in properties:
+        physical_resource_id = 'mysql:localhost:3306:mysql:%s:%s' % (properties['User'], properties['User'])
+    if physical_resource_id is not None:
+        result['PhysicalResourceId'] = physical_resource_id
+    if request_type == 'Update':
+        result['OldResourceProperties'] = {k: v for k, v in dict(properties, **(old_properties or {})).items()
+                                           if v is not None}
+    return result
+
+
+def statements(server, before=0):
+    """
+    returns the statements executed by the `server`, after the first `before` round trips.
+    """
+    return [op for op, _ in server.statements[before:] for op in op.split(';\n')]
+
+
+@pytest.fixture
+def fake_server(monkeypatch):
+    """
+    replaces the MySQL server with an in-memory fake and stops responses from being posted to CloudFormation.
+    Transient errors are retried without noticeable delay.
+    """
+    import mysql.connector
+    import retry
+    from connection_pool import pool
+    from fake_mysql import FakeServer
+    from mysql_user_provider import MySQLUser
+    from secret_cache import secret_cache
+    from server_capabilities import capabilities_cache
+
+    server = FakeServer()
+    monkeypatch.setattr(mysql.connector, 'connect', server.connect)
+    monkeypatch.setattr(MySQLUser, 'send_response', lambda self: None)
+    monkeypatch.setattr(retry, 'base_delay', 0.001)
+    pool.clear()
+    secret_cache.clear()
+    capabilities_cache.clear()
+    yield server
+    pool.clear()
+
+
+@pytest.fixture
+def fake_aws(monkeypatch):
+    """
+    replaces the ssm and secretsmanager clients with in-memory fakes.
+    """
+    import aws_clients
+    from fake_aws import FakeSSM, FakeSecretsManager
+
+    ssm, secretsmanager = FakeSSM({}), FakeSecretsManager({})
+    monkeypatch.setitem(aws_clients.clients, 'ssm', ssm)
+    monkeypatch.setitem(aws_clients.clients, 'secretsmanager', secretsmanager)
+    return ssm, secretsmanager
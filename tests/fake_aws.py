@@ -0,0 +1,166 @@
+import datetime
+import json
+import time
+
+
+class FakeSSM(object):
+    """
+    stand-in for the ssm client, serving `parameters`, a dictionary of name to (value, version).
+    """
+
+    def __init__(self, parameters, latency=0.0):
+        self.parameters = parameters
+        self.latency = latency
+        self.calls = []
+
+    def get_parameter(self, Name, WithDecryption):
+        self.calls.append(('get_parameter', [Name]))
+        time.sleep(self.latency)
+        value, version = self.parameters[Name]
+        return {'Parameter': {'Name': Name, 'Value': value, 'Version': version}}
+
+    def get_parameters(self, Names, WithDecryption):
+        self.calls.append(('get_parameters', Names))
+        time.sleep(self.latency)
+        return {'Parameters': [{'Name': n, 'Value': self.parameters[n][0], 'Version': self.parameters[n][1]}
+                               for n in Names if n in self.parameters],
+                'InvalidParameters': [n for n in Names if n not in self.parameters]}
+
+    def put_parameter(self, Name, Value, Type, Overwrite):
+        self.calls.append(('put_parameter', [Name]))
+        assert Type == 'SecureString'
+        if Name in self.parameters and not Overwrite:
+            from botocore.exceptions import ClientError
+
+            raise ClientError({'Error': {'Code': 'ParameterAlreadyExists', 'Message': Name}}, 'PutParameter')
+        self.parameters[Name] = (Value, self.parameters[Name][1] + 1 if Name in self.parameters else 1)
+
+    def delete_parameter(self, Name):
+        self.calls.append(('delete_parameter', [Name]))
+        del self.parameters[Name]
+
+
+class FakeSecretsManager(object):
+    """
+    stand-in for the secretsmanager client, serving `secrets`, a dictionary of name to secret string. Secrets may be
+    tagged, and rotated through an AWSPENDING version.
+    """
+
+    def __init__(self, secrets, latency=0.0, tags=None):
+        self.secrets = secrets
+        self.latency = latency
+        self.tags = tags if tags else {}
+        self.versions = {}
+        self.pending = {}
+        self.changed = {}
+        self.calls = []
+
+    @staticmethod
+    def not_found(operation, message):
+        from botocore.exceptions import ClientError
+
+        return ClientError({'Error': {'Code': 'ResourceNotFoundException', 'Message': message}}, operation)
+
+    def get_secret_value(self, SecretId, VersionId=None, VersionStage=None):
+        self.calls.append(('get_secret_value', [SecretId]))
+        time.sleep(self.latency)
+        if VersionStage == 'AWSPENDING':
+            token, value = self.pending.get(SecretId, (None, None))
+            if value is None or (VersionId and VersionId != token):
+                raise self.not_found('GetSecretValue', 'no pending version of %s' % SecretId)
+            return {'SecretString': value, 'VersionId': token}
+        return {'SecretString': self.secrets[SecretId], 'VersionId': self.versions.get(SecretId, 'v1')}
+
+    def batch_get_secret_value(self, SecretIdList):
+        self.calls.append(('batch_get_secret_value', SecretIdList))
+        time.sleep(self.latency)
+        return {'SecretValues': [{'Name': n, 'ARN': 'arn:' + n, 'SecretString': self.secrets[n],
+                                  'VersionId': self.versions.get(n, 'v1')} for n in SecretIdList], 'Errors': []}
+
+    def version_stages(self, name):
+        stages = {self.versions.get(name, 'v1'): ['AWSCURRENT']}
+        if name in self.pending:
+            stages[self.pending[name][0]] = ['AWSPENDING']
+        return stages
+
+    def rotate_secret(self, SecretId, ClientRequestToken):
+        """
+        starts a rotation like the Secrets Manager does, by labelling version `ClientRequestToken` AWSPENDING.
+        """
+        self.calls.append(('rotate_secret', [SecretId]))
+        self.pending[SecretId] = (ClientRequestToken, None)
+
+    def describe_secret(self, SecretId):
+        self.calls.append(('describe_secret', [SecretId]))
+        return {'Name': SecretId, 'ARN': 'arn:' + SecretId,
+                'Tags': [{'Key': k, 'Value': v} for k, v in self.tags.get(SecretId, {}).items()],
+                'VersionIdsToStages': self.version_stages(SecretId)}
+
+    def put_secret_value(self, SecretId, SecretString, ClientRequestToken=None, VersionStages=None):
+        self.calls.append(('put_secret_value', [SecretId]))
+        if VersionStages == ['AWSPENDING']:
+            self.pending[SecretId] = (ClientRequestToken, SecretString)
+        else:
+            self.secrets[SecretId] = SecretString
+
+    def create_secret(self, Name, SecretString):
+        self.calls.append(('create_secret', [Name]))
+        if Name in self.secrets:
+            from botocore.exceptions import ClientError
+
+            raise ClientError({'Error': {'Code': 'ResourceExistsException', 'Message': Name}}, 'CreateSecret')
+        self.secrets[Name] = SecretString
+
+    def delete_secret(self, SecretId):
+        self.calls.append(('delete_secret', [SecretId]))
+        if SecretId not in self.secrets:
+            raise self.not_found('DeleteSecret', SecretId)
+        del self.secrets[SecretId]
+
+    def update_secret_version_stage(self, SecretId, VersionStage, MoveToVersionId, RemoveFromVersionId):
+        self.calls.append(('update_secret_version_stage', [SecretId]))
+        assert VersionStage == 'AWSCURRENT' and RemoveFromVersionId == self.versions.get(SecretId, 'v1')
+        token, value = self.pending.pop(SecretId)
+        assert token == MoveToVersionId
+        self.secrets[SecretId] = value
+        self.versions[SecretId] = token
+        self.changed[SecretId] = datetime.datetime.now(datetime.timezone.utc)
+
+    def list_secrets(self, Filters, MaxResults, NextToken=None):
+        self.calls.append(('list_secrets', [NextToken]))
+        keys = [v for f in Filters if f['Key'] == 'tag-key' for v in f['Values']]
+        names = sorted(n for n in self.secrets if all(k in self.tags.get(n, {}) for k in keys))
+        start = int(NextToken) if NextToken else 0
+        response = {'SecretList': [
+            {'Name': n, 'ARN': 'arn:' + n, 'Tags': [{'Key': k, 'Value': v} for k, v in self.tags.get(n, {}).items()],
+             'LastChangedDate': self.changed.get(n, datetime.datetime(2020, 1, 1, tzinfo=datetime.timezone.utc)),
+             'SecretVersionsToStages': self.version_stages(n)} for n in names[start:start + MaxResults]]}
+        if start + MaxResults < len(names):
+            response['NextToken'] = str(start + MaxResults)
+        return response
+
+
+class FakeRDS(object):
+    """
+    stand-in for the rds client, generating a new authentication token on each call.
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def generate_db_auth_token(self, DBHostname, Port, DBUsername):
+        self.calls.append(('generate_db_auth_token', [DBHostname, Port, DBUsername]))
+        return '%s:%s/?Action=connect&DBUser=%s&X-Amz-Signature=%d' % (DBHostname, Port, DBUsername, len(self.calls))
+
+
+class FakeLambda(object):
+    """
+    stand-in for the lambda client, recording the asynchronous invocations.
+    """
+
+    def __init__(self):
+        self.invocations = []
+
+    def invoke(self, FunctionName, InvocationType, Payload):
+        self.invocations.append((FunctionName, InvocationType, json.loads(Payload)))
+        return {'StatusCode': 202}
@@ -0,0 +1,330 @@
+import hashlib
+import os
+import re
+import threading
+import time
+
+import mysql.connector
+
+import grants
+
+
+class FakeServer(object):
+    """
+    in-memory stand-in for a MySQL server, understanding just enough of the statements issued by the provider.
+    Every call to `execute` is counted as a round trip.
+    """
+
+    def __init__(self, version='8.0.35', latency=0.0, connect_latency=0.0):
+        self.version = version
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.users = {}
+        self.schemas = set()
+        self.grants = {}
+        self.tables = {}
+        self.views = {}
+        self.triggers = {}
+        self.sessions = []
+        self.locked = set()
+        self.rds = False
+        self.statements = []
+        self.connections = 0
+        self.opened = []
+        self.connect_arguments = []
+        self.rejected_passwords = set()
+        self.failures = []
+        self.named_locks = {}
+        self.named_locks_changed = threading.Condition()
+
+    @property
+    def round_trips(self):
+        return len(self.statements)
+
+    @property
+    def open_connections(self):
+        return len([c for c in self.opened if c.connected])
+
+    def connect(self, **kwargs):
+        time.sleep(self.connect_latency)
+        self.connections += 1
+        self.connect_arguments.append(kwargs)
+        self.fail('CONNECT')
+        if kwargs.get('password') in self.rejected_passwords:
+            raise mysql.connector.Error(msg='Access denied for user %s' % kwargs.get('user'), errno=1045)
+        connection = FakeConnection(self, kwargs.get('autocommit', False))
+        self.opened.append(connection)
+        return connection
+
+    def get_lock(self, name, connection, timeout=0):
+        """
+        takes the named lock for `connection` like GET_LOCK, waiting at most `timeout` seconds.
+        """
+        deadline = time.monotonic() + timeout
+        with self.named_locks_changed:
+            while self.named_locks.get(name, connection) is not connection:
+                if time.monotonic() >= deadline:
+                    return 0
+                self.named_locks_changed.wait(deadline - time.monotonic())
+            self.named_locks[name] = connection
+            return 1
+
+    def release_locks(self, connection, names=None):
+        with self.named_locks_changed:
+            released = [n for n, c in self.named_locks.items() if c is connection and (names is None or n in names)]
+            for name in released:
+                del self.named_locks[name]
+            self.named_locks_changed.notify_all()
+            return len(released)
+
+    def fail(self, statement, connection=None):
+        """
+        raises the first of the `failures`, a list of (statement prefix, errno), which matches the `statement`, once.
+        """
+        for i, (prefix, errno) in enumerate(self.failures):
+            if statement.startswith(prefix):
+                del self.failures[i]
+                if connection is not None and errno in (2006, 2013):
+                    connection.connected = False
+                raise mysql.connector.Error(msg='injected failure of %s' % statement, errno=errno)
+
+
+class FakeConnection(object):
+
+    def __init__(self, server, autocommit=False):
+        self.server = server
+        self.connected = True
+        self.autocommit = autocommit
+        self.in_transaction = False
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self.server, self)
+
+    def is_connected(self):
+        return self.connected
+
+    def get_server_info(self):
+        return self.server.version
+
+    def rollback(self):
+        self.in_transaction = False
+        self.rollbacks += 1
+
+    def close(self):
+        self.connected = False
+        self.server.release_locks(self)
+
+
+def authentication_string(plugin, password):
+    if plugin == 'mysql_native_password':
+        return '*' + hashlib.sha1(hashlib.sha1(password.encode('utf-8')).digest()).hexdigest().upper()
+    salt = os.urandom(10).hex()
+    return '$A$005$%s%s' % (salt, hashlib.sha256((salt + password).encode('utf-8')).hexdigest())
+
+
+def unquote(s):
+    return s.strip().strip("'`\"")
+
+
+class FakeCursor(object):
+
+    def __init__(self, server, connection=None):
+        self.server = server
+        self.connection = connection
+        self.rows = []
+
+    def execute(self, operation, params=None, multi=False):
+        if self.connection is not None and not self.connection.connected:
+            raise mysql.connector.Error(msg='MySQL Connection not available', errno=2055)
+        self.server.statements.append((operation, params))
+        if self.connection is not None and not self.connection.autocommit:
+            self.connection.in_transaction = True
+        time.sleep(self.server.latency)
+        self.rows = []
+        results = self.results(operation.split(';\n') if multi else [operation], params)
+        if multi:
+            return results
+        for _ in results:
+            pass
+
+    def results(self, statements, params):
+        """
+        executes the `statements` one by one, yielding after each, like the results of a multi statement execute.
+        """
+        params = list(params) if params else []
+        for statement in statements:
+            count = statement.count('%s') if params else 0
+            statement = ' '.join(statement.split())
+            self.server.fail(statement, self.connection)
+            self.apply(statement, params[:count])
+            params = params[count:]
+            yield self
+
+    def apply(self, statement, params):
+        account = None
+        match = re.match(r"^(CREATE USER|DROP USER|ALTER USER) (IF (NOT )?EXISTS )?('?[^'@ ]+'?@'?[^' ]+'?|%s@%s|%s)",
+                         statement, re.IGNORECASE)
+        if match:
+            if match.group(4) == '%s@%s':
+                account = (params[0], params[1])
+            elif match.group(4) == '%s':
+                user, _, host = params[0].partition('@')
+                account = (user, host if host else '%')
+            else:
+                user, _, host = match.group(4).partition('@')
+                account = (unquote(user), unquote(host))
+
+        if re.match(r'^select version\(\)', statement, re.IGNORECASE):
+            self.rows = [(self.server.version,)]
+        elif statement.startswith('SELECT GET_LOCK(%s, %s)'):
+            self.rows = [(self.server.get_lock(params[0], self.connection, params[1]),)]
+        elif statement.startswith('SELECT CASE WHEN GET_LOCK'):
+            slot = next((i for i, name in enumerate(params) if self.server.get_lock(name, self.connection)), None)
+            self.rows = [(slot,)]
+        elif statement.startswith('SELECT RELEASE_LOCK(%s)'):
+            self.rows = [(self.server.release_locks(self.connection, [params[0]]),)]
+        elif statement.startswith('SELECT * FROM mysql.user WHERE user = %s AND host = %s'):
+            if tuple(params) in self.server.users:
+                self.rows = [tuple(params)]
+        elif statement.startswith('SELECT user, host FROM mysql.user WHERE user IN'):
+            self.rows = [u for u in self.server.users if u[0] in params]
+        elif statement.startswith('SELECT plugin, authentication_string, account_locked FROM mysql.user'):
+            account = self.server.users.get(tuple(params))
+            if account is not None:
+                self.rows = [(account.get('plugin'), account.get('authentication_string'),
+                              'Y' if account.get('locked') else 'N')]
+        elif statement.startswith('SELECT user, host, plugin, authentication_string, account_locked FROM mysql.user'):
+            self.rows = [u + (a.get('plugin'), a.get('authentication_string'), 'Y' if a.get('locked') else 'N')
+                         for u, a in self.server.users.items() if u[0] in params]
+        elif statement.startswith('SELECT user, host, account_locked FROM mysql.user WHERE user IN'):
+            self.rows = [u + ('Y' if a.get('locked') else 'N',) for u, a in self.server.users.items() if u[0] in params]
+        elif statement.startswith('SELECT user, host, db, Select_priv'):
+            columns = list(grants.db_privilege_columns.values())
+            for account, privileges in self.server.grants.items():
+                for (database, table), granted in privileges.items():
+                    if account[0] in params and database != '*' and table == '*':
+                        if 'ALL PRIVILEGES' in granted:
+                            granted = granted | set(columns[:-1])
+                        self.rows.append(account + (database,) + tuple('Y' if c in granted else 'N' for c in columns))
+        elif statement.startswith('SELECT SCHEMA_NAME FROM information_schema.schemata WHERE SCHEMA_NAME = %s'):
+            self.rows = [(s,) for s in self.server.schemas if s == params[0]]
+        elif statement.startswith('SELECT SCHEMA_NAME FROM information_schema.schemata WHERE SCHEMA_NAME IN'):
+            self.rows = [(s,) for s in self.server.schemas if s in params]
+        elif statement.startswith('SELECT SCHEMA_NAME FROM information_schema.schemata WHERE SCHEMA_NAME LIKE %s'):
+            prefix = params[0].replace('\\', '').rstrip('%')
+            self.rows = [(s,) for s in sorted(self.server.schemas) if s.startswith(prefix)]
+        elif statement.startswith('SELECT table_name FROM information_schema.tables WHERE table_schema = %s'):
+            views = [] if "table_type = 'BASE TABLE'" in statement else self.server.views.get(params[0], [])
+            self.rows = [(t,) for t in sorted(set(self.server.tables.get(params[0], [])) | set(views))]
+        elif statement.startswith("SELECT 'VIEW', table_name FROM information_schema.views"):
+            self.rows = [('VIEW', v) for v in sorted(self.server.views.get(params[0], []))] + \
+                [('TRIGGER', t) for t in sorted(self.server.triggers.get(params[1], {}))]
+        elif re.match(r'^DROP (VIEW|TRIGGER) IF EXISTS ', statement):
+            schema, name = (unquote(n) for n in statement.split()[-1].split('.'))
+            self.server.views.get(schema, set()).discard(name)
+            self.server.triggers.get(schema, {}).pop(name, None)
+        elif statement.startswith('SELECT id, user, host, command, time, state FROM information_schema.processlist'):
+            self.rows = [s for s in self.server.sessions if s[6] in params]
+        elif statement.startswith('SELECT id, command, time FROM information_schema.processlist WHERE user = %s'):
+            self.rows = [(s[0], s[3], s[4]) for s in self.server.sessions if s[1] == params[0]]
+        elif re.match(r'^(KILL [0-9]+|CALL mysql.rds_kill\(%s\))$', statement):
+            session_id = int(params[0]) if params else int(statement.split()[1])
+            if statement.startswith('KILL') and self.server.rds:
+                raise mysql.connector.Error(msg='You are not owner of thread %d' % session_id, errno=1095)
+            if session_id not in [s[0] for s in self.server.sessions]:
+                raise mysql.connector.Error(msg='Unknown thread id: %d' % session_id, errno=1094)
+            self.server.sessions = [s for s in self.server.sessions if s[0] != session_id]
+        elif statement.startswith('SET '):
+            pass
+        elif re.match(r'^(DROP TABLE IF EXISTS|RENAME TABLE) ', statement):
+            for target in statement.split(' ', 4 if statement.startswith('DROP') else 2)[-1].split(', '):
+                names = [tuple(unquote(n) for n in name.split('.')) for name in target.split(' TO ')]
+                if names[0][0] in self.server.locked:
+                    raise mysql.connector.Error(msg='Lock wait timeout exceeded', errno=1205)
+                if len(names) > 1 and names[0][1] in self.server.views.get(names[0][0], set()):
+                    raise mysql.connector.Error(msg='Changing schema from %s to %s is not allowed' % (
+                        names[0][0], names[1][0]), errno=1450)
+                if len(names) > 1 and names[0][1] in self.server.triggers.get(names[0][0], {}).values():
+                    raise mysql.connector.Error(msg='Trigger in wrong schema', errno=1435)
+                self.server.tables.get(names[0][0], set()).discard(names[0][1])
+                if len(names) > 1:
+                    if names[1][0] not in self.server.schemas:
+                        raise mysql.connector.Error(msg="Unknown database '%s'" % names[1][0], errno=1049)
+                    self.server.tables.setdefault(names[1][0], set()).add(names[1][1])
+        elif statement.startswith('SHOW GRANTS FOR %s@%s'):
+            if tuple(params) not in self.server.users:
+                raise mysql.connector.Error(msg='There is no such grant defined', errno=1141)
+            self.rows = [('GRANT USAGE ON *.* TO `%s`@`%s`' % tuple(params),)]
+            for (database, table), privileges in sorted(self.server.grants.get(tuple(params), {}).items()):
+                self.rows.append(('GRANT %s ON %s.%s TO `%s`@`%s`%s' % (
+                    ', '.join(sorted(privileges - {'GRANT OPTION'})) or 'USAGE', grants.quote_identifier(database),
+                    grants.quote_identifier(table), params[0], params[1],
+                    ' WITH GRANT OPTION' if 'GRANT OPTION' in privileges else ''),))
+        elif re.match(r'^(GRANT|REVOKE) ', statement):
+            revoke = statement.startswith('REVOKE')
+            grant = grants.parse_grant(re.sub(r'^REVOKE (.*) FROM ', r'GRANT \1 TO ', statement))
+            if params:
+                account = tuple(params)
+            else:
+                user, _, host = statement.split(' TO ')[1].split()[0].partition('@')
+                account = (unquote(user), unquote(host))
+            privileges = self.server.grants.setdefault(account, {}).setdefault(grant[0], set())
+            if statement.endswith('WITH GRANT OPTION'):
+                grant[1].add('GRANT OPTION')
+            if revoke:
+                privileges.difference_update(grant[1])
+            else:
+                privileges.update(grant[1])
+            if not privileges:
+                del self.server.grants[account][grant[0]]
+        elif statement.upper().startswith('CREATE USER'):
+            if account not in self.server.users:
+                self.server.users[account] = {}
+                self.identify(account, statement, params)
+                self.limit(account, statement)
+        elif statement.upper().startswith('DROP USER'):
+            self.server.users.pop(account, None)
+            self.server.grants.pop(account, None)
+        elif statement.upper().startswith('ALTER USER') and account in self.server.users:
+            if statement.upper().endswith(('ACCOUNT LOCK', 'ACCOUNT UNLOCK')):
+                self.server.users[account]['locked'] = statement.upper().endswith('ACCOUNT LOCK')
+            self.identify(account, statement, params)
+            self.limit(account, statement)
+        elif statement.upper().startswith('CREATE DATABASE'):
+            self.server.schemas.add(unquote(statement.split()[-1]))
+        elif statement.upper().startswith('DROP DATABASE'):
+            self.server.schemas.discard(unquote(statement.split()[-1]))
+            self.server.tables.pop(unquote(statement.split()[-1]), None)
+            self.server.views.pop(unquote(statement.split()[-1]), None)
+            self.server.triggers.pop(unquote(statement.split()[-1]), None)
+
+    def identify(self, account, statement, params):
+        """
+        records the authentication plugin and string of an IDENTIFIED clause in the `statement`.
+        """
+        match = re.search(r"IDENTIFIED (WITH (\S+) )?(BY PASSWORD|BY|AS) (%s|'[^']*')", statement)
+        if not match:
+            return
+        default_plugin = 'caching_sha2_password' if self.server.version >= '8' else 'mysql_native_password'
+        plugin = match.group(2) if match.group(2) else default_plugin
+        value = params[-1] if match.group(4) == '%s' else unquote(match.group(4))
+        self.server.users[account]['plugin'] = plugin
+        self.server.users[account]['authentication_string'] = \
+            value if match.group(3) != 'BY' else authentication_string(plugin, value)
+
+    def limit(self, account, statement):
+        """
+        records the resource options of the `statement` on the user.
+        """
+        for option, value in re.findall(r'(MAX_[A-Z_]+) ([0-9]+)', statement):
+            self.server.users[account].setdefault('limits', {})[option] = int(value)
+
+    def fetchall(self):
+        return self.rows
+
+    def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    def close(self):
+        pass
@@ -0,0 +1,110 @@
+import pytest
+
+import mysql_users_provider
+from conftest import event, statements
+from mysql_user_provider import handler, mysql_password
+
+# the properties of a user with a password hash instead of a password
+hashed = {'Password': None, 'AuthPlugin': 'mysql_native_password'}
+
+
+def test_create_with_password_hash(fake_server):
+    password_hash = mysql_password('secret')
+    response = handler(event('Create', PasswordHash=password_hash, **hashed), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.users[('app', '%')]['plugin'] == 'mysql_native_password'
+    assert fake_server.users[('app', '%')]['authentication_string'] == password_hash
+    assert not [p for _, params in fake_server.statements for p in (params or []) if p == 'secret']
+
+
+def test_create_with_plugin(fake_server):
+    response = handler(event('Create', Password='secret', AuthPlugin='mysql_native_password'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.users[('app', '%')]['authentication_string'] == mysql_password('secret')
+    assert 'CREATE USER IF NOT EXISTS %s@%s IDENTIFIED WITH mysql_native_password BY %s' in statements(fake_server)
+
+
+def test_create_with_iam_authentication(fake_server):
+    response = handler(event('Create', Password=None, AuthPlugin='AWSAuthenticationPlugin'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.users[('app', '%')]['plugin'] == 'AWSAuthenticationPlugin'
+    assert fake_server.users[('app', '%')]['authentication_string'] == 'RDS'
+
+
+def test_unchanged_password_is_not_altered(fake_server):
+    password_hash = mysql_password('secret')
+    response = handler(event('Create', PasswordHash=password_hash, **hashed), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+
+    before = len(fake_server.statements)
+    response = handler(event('Update', PasswordHash=password_hash, **hashed), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert not [s for s in statements(fake_server, before) if s.startswith('ALTER USER')]
+
+
+def test_changed_password_hash_is_altered(fake_server):
+    response = handler(event('Create', PasswordHash=mysql_password('secret'), **hashed), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+
+    before = len(fake_server.statements)
+    response = handler(event('Update', PasswordHash=mysql_password('changed'), **hashed), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert 'ALTER USER %s@%s IDENTIFIED WITH mysql_native_password AS %s ACCOUNT UNLOCK' in \
+        statements(fake_server, before)
+    assert fake_server.users[('app', '%')]['authentication_string'] == mysql_password('changed')
+
+
+def test_salted_password_is_always_altered(fake_server):
+    response = handler(event('Create', Password='secret'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+
+    before = len(fake_server.statements)
+    response = handler(event('Update', Password='secret'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert 'ALTER USER %s@%s IDENTIFIED BY %s ACCOUNT UNLOCK' in statements(fake_server, before)
+
+
+def test_password_hash_requires_plugin(fake_server):
+    response = handler(event('Create', Password=None, PasswordHash=mysql_password('secret')), {})
+    assert response['Status'] == 'FAILED'
+    assert 'AuthPlugin' in response['Reason']
+
+
+def test_unsupported_plugin_fails(fake_server):
+    fake_server.version = '5.7.44'
+    response = handler(event('Create', Password='secret', AuthPlugin='caching_sha2_password'), {})
+    assert response['Status'] == 'FAILED'
+    assert 'caching_sha2_password is not supported' in response['Reason']
+
+
+@pytest.mark.parametrize('exists', [False, True])
+def test_plugin_requires_alter_user(fake_server, exists):
+    fake_server.version = '5.6.51'
+    if exists:
+        fake_server.users[('app', '%')] = {'plugin': 'mysql_native_password', 'authentication_string': ''}
+    response = handler(event('Create', Password=None, AuthPlugin='AWSAuthenticationPlugin'), {})
+    assert response['Status'] == 'FAILED'
+    assert 'AWSAuthenticationPlugin requires MySQL 5.7.6' in response['Reason']
+    assert not [s for s in statements(fake_server) if s.startswith(('CREATE', 'SET PASSWORD'))]
+
+
+def test_password_hash_without_alter_user(fake_server):
+    fake_server.version = '5.6.51'
+    response = handler(event('Create', PasswordHash=mysql_password('secret'), **hashed), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.users[('app', '%')]['authentication_string'] == mysql_password('secret')
+
+
+def test_unchanged_password_hashes_of_users_are_read_with_one_query(fake_server):
+    users = [{'User': 'tenant%d' % i, 'PasswordHash': mysql_password('secret%d' % i),
+              'AuthPlugin': 'mysql_native_password'} for i in range(5)]
+    for user in users:
+        fake_server.users[(user['User'], '%')] = {
+            'plugin': 'mysql_native_password', 'authentication_string': user['PasswordHash'], 'locked': False}
+    fake_server.schemas.update(u['User'] for u in users)
+
+    request = event('Create', resource_type='Custom::MySQLUsers', User=None, Password=None, Users=users)
+    response = mysql_users_provider.handler(request, {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert len([s for s, _ in fake_server.statements if s.startswith('SELECT') and 'mysql.user' in s]) == 1
+    assert not [s for s in statements(fake_server) if s.startswith('ALTER USER') and 'IDENTIFIED' in s]
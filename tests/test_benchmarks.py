@@ -0,0 +1,33 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+benchmarks = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks')
+
+
+def run(script, *args):
+    return subprocess.check_output([sys.executable, os.path.join(benchmarks, script)] + list(args), timeout=120)\
+        .decode('utf-8')
+
+
+def test_cold_start():
+    lines = run('cold_start.py', '--runs', '1').splitlines()
+    assert lines[0].split() == ['phase', 'median', 'ms', 'min', 'ms', 'max', 'ms']
+    assert [line.split()[0] for line in lines[1:]] == ['import', 'connector_import', 'first_event', 'total']
+
+
+def test_parallel_io():
+    lines = run('parallel_io.py', '--events', '2', '--aws-latency', '0', '--connect-latency', '0',
+                '--query-latency', '0').splitlines()
+    assert [line.split()[0] for line in lines] == ['mode', 'sequential', 'parallel']
+
+
+@pytest.mark.parametrize('options', [[], ['--timings']])
+def test_suite(tmpdir, options):
+    results = str(tmpdir.join('results.json'))
+    run('suite.py', '--events', '2', '--fan-out', '3', '--fan-out-events', '1', '--json', results, *options)
+    with open(results) as f:
+        assert all(r['events'] > 0 for r in json.load(f))
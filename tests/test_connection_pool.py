@@ -0,0 +1,112 @@
+import time
+
+import connection_pool
+from conftest import event
+from connection_pool import ConnectionPool
+from mysql_user_provider import handler
+
+
+class Connection(object):
+
+    def __init__(self):
+        self.connected = True
+        self.in_transaction = False
+
+    def is_connected(self):
+        return self.connected
+
+    def rollback(self):
+        self.in_transaction = False
+
+    def close(self):
+        self.connected = False
+
+
+def test_reuse_connection():
+    pool = ConnectionPool()
+    key = ('localhost', 3306, 'mysql', 'root')
+    connection = pool.acquire(key, 'password', Connection)
+    pool.release(connection)
+
+    assert pool.acquire(key, 'password', Connection) is connection
+    assert pool.stats()['hits'] == 1
+    assert pool.stats()['misses'] == 1
+
+
+def test_different_endpoints_do_not_share_connections():
+    pool = ConnectionPool()
+    connection = pool.acquire(('localhost', 3306, 'mysql', 'root'), 'password', Connection)
+    pool.release(connection)
+
+    assert pool.acquire(('localhost', 3307, 'mysql', 'root'), 'password', Connection) is not connection
+    assert pool.stats()['misses'] == 2
+
+
+def test_discard_on_password_rotation():
+    pool = ConnectionPool()
+    key = ('localhost', 3306, 'mysql', 'root')
+    connection = pool.acquire(key, 'password', Connection)
+    pool.release(connection)
+
+    assert pool.acquire(key, 'rotated', Connection) is not connection
+    assert not connection.connected
+    assert pool.stats()['discarded'] == 1
+
+
+def test_discard_dead_connection():
+    pool = ConnectionPool()
+    key = ('localhost', 3306, 'mysql', 'root')
+    connection = pool.acquire(key, 'password', Connection)
+    pool.release(connection)
+    connection.connected = False
+
+    assert pool.acquire(key, 'password', Connection) is not connection
+    assert pool.stats()['hits'] == 0
+
+
+def test_discard_idle_and_expired_connections():
+    pool = ConnectionPool(max_idle_time=60, max_lifetime=120)
+    key = ('localhost', 3306, 'mysql', 'root')
+    connection = pool.acquire(key, 'password', Connection)
+    pool.release(connection)
+    pool.idle[key][0].last_used = time.time() - 61
+
+    assert pool.acquire(key, 'password', Connection) is not connection
+    assert not connection.connected
+
+    connection = pool.acquire(key, 'password', Connection)
+    pool.release(connection)
+    pool.idle[key][0].created = time.time() - 121
+    assert pool.acquire(key, 'password', Connection) is not connection
+
+
+def test_pool_size():
+    pool = ConnectionPool(max_size=1)
+    key = ('localhost', 3306, 'mysql', 'root')
+    first = pool.acquire(key, 'password', Connection)
+    second = pool.acquire(key, 'password', Connection)
+    pool.release(first)
+    pool.release(second)
+
+    assert first.connected
+    assert not second.connected
+
+
+def test_open_transaction_is_rolled_back_on_release():
+    pool = ConnectionPool()
+    key = ('localhost', 3306, 'mysql', 'root')
+    connection = pool.acquire(key, 'password', Connection)
+    connection.in_transaction = True
+    pool.release(connection)
+
+    assert not connection.in_transaction
+    assert pool.acquire(key, 'password', Connection) is connection
+
+
+def test_pooled_connections_do_not_keep_a_transaction_open(fake_server):
+    response = handler(event(), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.connect_arguments[0]['autocommit'] is True
+    [entry] = connection_pool.pool.idle[('localhost', 3306, 'mysql', 'root', 'Preferred')]
+    assert not entry.connection.in_transaction
+    assert entry.connection.rollbacks == 0
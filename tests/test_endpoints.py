@@ -0,0 +1,70 @@
+import time
+
+import mysql.connector
+import pytest
+
+from conftest import database, event
+from fake_mysql import FakeServer
+from mysql_user_provider import handler
+
+
+def sharded(request_type, hosts, physical_resource_id=None, old_hosts=None):
+    """
+    returns a request for the user on the `hosts`, which was on the `old_hosts` with another password.
+    """
+    old_properties = {'Password': 'old', 'Database': [dict(database, Host=h) for h in old_hosts or []]}
+    return event(request_type, old_properties, physical_resource_id, DeletionPolicy='Drop',
+                 Database=[dict(database, Host=h) for h in hosts])
+
+
+@pytest.fixture
+def shards(fake_server, monkeypatch):
+    servers = {'shard%d' % i: FakeServer(connect_latency=0.05) for i in range(6)}
+
+    def connect(**kwargs):
+        if kwargs['host'] not in servers:
+            raise mysql.connector.Error(msg="Can't connect to MySQL server on '%s'" % kwargs['host'], errno=2003)
+        return servers[kwargs['host']].connect(**kwargs)
+
+    monkeypatch.setattr(mysql.connector, 'connect', connect)
+    return servers
+
+
+def test_create_on_all_endpoints_in_parallel(shards):
+    start = time.monotonic()
+    response = handler(sharded('Create', sorted(shards)), {})
+    assert time.monotonic() - start < 6 * 0.05
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['PhysicalResourceId'].startswith('mysql:endpoints:')
+    assert response['PhysicalResourceId'].endswith(':app:app')
+    assert response['Data']['Created'] == 6
+    assert all(('app', '%') in s.users and 'app' in s.schemas for s in shards.values())
+
+
+def test_composite_id_does_not_depend_on_order(shards):
+    first = handler(sharded('Create', ['shard0', 'shard1']), {})['PhysicalResourceId']
+    second = handler(sharded('Create', ['shard1', 'shard0']), {})['PhysicalResourceId']
+    assert first == second
+    assert first != handler(sharded('Create', ['shard0', 'shard2']), {})['PhysicalResourceId']
+
+
+def test_failure_on_one_endpoint_is_reported(shards):
+    response = handler(sharded('Create', ['shard0', 'down', 'shard1']), {})
+    assert response['Status'] == 'FAILED'
+    assert response['Reason'].startswith('Failed on 1 of 3 endpoints, down:3306:mysql: Failed to create user')
+    assert response['PhysicalResourceId'].startswith('mysql:endpoints:')
+    assert ('app', '%') in shards['shard0'].users and ('app', '%') in shards['shard1'].users
+
+
+def test_update_adds_and_removes_endpoints(shards):
+    physical_resource_id = handler(sharded('Create', ['shard0', 'shard1']), {})['PhysicalResourceId']
+    response = handler(sharded('Update', ['shard1', 'shard2'], physical_resource_id, ['shard0', 'shard1']), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['PhysicalResourceId'] == physical_resource_id
+    assert (response['Data']['Created'], response['Data']['Updated'], response['Data']['Dropped']) == (1, 1, 1)
+    assert ('app', '%') not in shards['shard0'].users
+    assert ('app', '%') in shards['shard1'].users and ('app', '%') in shards['shard2'].users
+
+    response = handler(sharded('Delete', ['shard1', 'shard2'], physical_resource_id), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert not any(s.users for s in shards.values())
@@ -0,0 +1,115 @@
+from conftest import event
+from mysql_user_provider import handler, mysql_password
+
+
+def generating(request_type, generate, old_generate=None):
+    return event(request_type, {'GeneratePassword': old_generate} if old_generate else None, Password=None,
+                 GeneratePassword=generate, AuthPlugin='mysql_native_password', DeletionPolicy='Drop')
+
+
+def test_generated_password_is_stored_once(fake_server, fake_aws):
+    ssm, _ = fake_aws
+    response = handler(generating('Create', {'ParameterName': '/mysql/app'}), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['Data']['PasswordParameterName'] == '/mysql/app'
+    assert ssm.calls == [('put_parameter', ['/mysql/app'])]
+    password = ssm.parameters['/mysql/app'][0]
+    assert len(password) == 32 and password.isalnum()
+    assert fake_server.users[('app', '%')]['authentication_string'] == mysql_password(password)
+
+
+def test_generated_secret(fake_server, fake_aws):
+    _, secretsmanager = fake_aws
+    response = handler(generating('Create', {'SecretName': '/mysql/app', 'Length': 20}), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['Data']['PasswordSecretName'] == '/mysql/app'
+    assert secretsmanager.calls == [('create_secret', ['/mysql/app'])]
+    assert len(secretsmanager.secrets['/mysql/app']) == 20
+
+
+def test_unchanged_generated_password_is_kept(fake_server, fake_aws):
+    ssm, _ = fake_aws
+    handler(generating('Create', {'ParameterName': '/mysql/app'}), {})
+    password = ssm.parameters['/mysql/app'][0]
+    response = handler(generating('Update', {'ParameterName': '/mysql/app', 'Length': 32},
+                                  {'ParameterName': '/mysql/app'}), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['Data']['PasswordParameterName'] == '/mysql/app'
+    assert ssm.parameters['/mysql/app'][0] == password
+    assert fake_server.users[('app', '%')]['authentication_string'] == mysql_password(password)
+
+
+def test_changed_generated_password_is_replaced(fake_server, fake_aws):
+    ssm, _ = fake_aws
+    handler(generating('Create', {'ParameterName': '/mysql/app'}), {})
+    response = handler(generating('Update', {'ParameterName': '/mysql/app-v2'}, {'ParameterName': '/mysql/app'}), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    password = ssm.parameters['/mysql/app-v2'][0]
+    assert fake_server.users[('app', '%')]['authentication_string'] == mysql_password(password)
+    assert [c for c in ssm.calls if c[0] != 'put_parameter'] == []
+
+
+def test_generated_password_is_deleted_with_the_user(fake_server, fake_aws):
+    ssm, _ = fake_aws
+    handler(generating('Create', {'ParameterName': '/mysql/app'}), {})
+    response = handler(generating('Delete', {'ParameterName': '/mysql/app'}), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert '/mysql/app' not in ssm.parameters
+    assert ('app', '%') not in fake_server.users
+
+
+def test_generated_password_is_removed_when_the_user_cannot_be_created(fake_server, fake_aws):
+    ssm, _ = fake_aws
+    fake_server.failures = [('CREATE USER', 1396)]
+    response = handler(generating('Create', {'ParameterName': '/mysql/app'}), {})
+    assert response['Status'] == 'FAILED'
+    assert '/mysql/app' not in ssm.parameters
+
+
+def test_existing_parameter_is_not_taken_over(fake_server, fake_aws):
+    ssm, _ = fake_aws
+    ssm.parameters['/mysql/app'] = ('someone else', 1)
+    response = handler(generating('Create', {'ParameterName': '/mysql/app'}), {})
+    assert response['Status'] == 'FAILED'
+    assert response['PhysicalResourceId'] == 'could-not-create'
+    assert ssm.parameters['/mysql/app'] == ('someone else', 1)
+    assert ('app', '%') not in fake_server.users
+
+
+def test_existing_secret_is_not_taken_over(fake_server, fake_aws):
+    _, secretsmanager = fake_aws
+    secretsmanager.secrets['/mysql/app'] = 'someone else'
+    response = handler(generating('Create', {'SecretName': '/mysql/app'}), {})
+    assert response['Status'] == 'FAILED'
+    assert secretsmanager.secrets['/mysql/app'] == 'someone else'
+    assert [c for c in secretsmanager.calls if c[0] != 'create_secret'] == []
+
+
+def test_password_is_replaced_in_place_when_only_the_length_changed(fake_server, fake_aws):
+    _, secretsmanager = fake_aws
+    handler(generating('Create', {'SecretName': '/mysql/app'}), {})
+    response = handler(generating('Update', {'SecretName': '/mysql/app', 'Length': 20}, {'SecretName': '/mysql/app'}),
+                       {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert len(secretsmanager.secrets['/mysql/app']) == 20
+    assert fake_server.users[('app', '%')]['authentication_string'] == \
+        mysql_password(secretsmanager.secrets['/mysql/app'])
+
+
+def test_existing_parameter_is_not_taken_over_on_rename(fake_server, fake_aws):
+    ssm, _ = fake_aws
+    handler(generating('Create', {'ParameterName': '/mysql/app'}), {})
+    ssm.parameters['/mysql/other'] = ('someone else', 1)
+    response = handler(generating('Update', {'ParameterName': '/mysql/other'}, {'ParameterName': '/mysql/app'}), {})
+    assert response['Status'] == 'FAILED'
+    assert ssm.parameters['/mysql/other'] == ('someone else', 1)
+
+
+def test_existing_secret_is_not_taken_over_on_rename(fake_server, fake_aws):
+    _, secretsmanager = fake_aws
+    handler(generating('Create', {'SecretName': '/mysql/app'}), {})
+    secretsmanager.secrets['/mysql/other'] = 'someone else'
+    response = handler(generating('Update', {'SecretName': '/mysql/other'}, {'SecretName': '/mysql/app'}), {})
+    assert response['Status'] == 'FAILED'
+    assert secretsmanager.secrets['/mysql/other'] == 'someone else'
+    assert 'put_secret_value' not in [c[0] for c in secretsmanager.calls]
@@ -0,0 +1,92 @@
+from conftest import event
+import grants
+from grants import parse_grant, parse_grants, declared_grants, statements
+from mysql_user_provider import handler
+
+
+def test_parse_grant():
+    assert parse_grant('GRANT SELECT, INSERT ON `shop`.`orders` TO `app`@`%`') == (
+        ('shop', 'orders'), {'SELECT', 'INSERT'})
+    assert parse_grant("GRANT ALL PRIVILEGES ON `app`.* TO 'app'@'%' WITH GRANT OPTION") == (
+        ('app', '*'), {'ALL PRIVILEGES', 'GRANT OPTION'})
+    assert parse_grant('GRANT USAGE ON `shop`.* TO `app`@`%` WITH GRANT OPTION') == (('shop', '*'), {'GRANT OPTION'})
+    assert parse_grant('GRANT RELOAD, PROCESS ON *.* TO `app`@`%`') == (('*', '*'), {'RELOAD', 'PROCESS'})
+    assert parse_grant('GRANT USAGE ON *.* TO `app`@`%`') is None
+    assert parse_grant('GRANT SELECT (`id`) ON `shop`.`orders` TO `app`@`%`') is None
+    assert parse_grant('GRANT EXECUTE ON PROCEDURE `shop`.`p` TO `app`@`%`') is None
+    assert parse_grant('GRANT `reader`@`%` TO `app`@`%`') is None
+
+
+def test_expanded_global_all_privileges():
+    expanded = ', '.join(sorted(grants.global_all_privileges))
+    current = parse_grants(['GRANT %s ON *.* TO `app`@`%%`' % expanded,
+                            'GRANT BACKUP_ADMIN,XA_RECOVER_ADMIN ON *.* TO `app`@`%`'])
+    assert current == {('*', '*'): {'ALL PRIVILEGES', 'BACKUP_ADMIN', 'XA_RECOVER_ADMIN'}}
+    assert statements(('app', '%'), current, declared_grants([{'Database': '*', 'Privileges': ['ALL']}])) == []
+
+
+def test_grant_option_is_granted_and_revoked_on_its_own():
+    current = parse_grants(['GRANT ALL PRIVILEGES ON `logs`.* TO `app`@`%` WITH GRANT OPTION',
+                            'GRANT SELECT ON `shop`.* TO `app`@`%` WITH GRANT OPTION'])
+    desired = declared_grants([{'Database': 'logs', 'Privileges': ['ALL']},
+                               {'Database': 'shop', 'Privileges': ['SELECT', 'GRANT OPTION']},
+                               {'Database': 'new', 'Privileges': ['SELECT', 'grant option']}])
+    assert statements(('app', '%'), current, desired) == [
+        ('REVOKE GRANT OPTION ON `logs`.* FROM %s@%s', ['app', '%']),
+        ('GRANT GRANT OPTION, SELECT ON `new`.* TO %s@%s', ['app', '%']),
+    ]
+
+
+def test_unchanged_grants_yield_no_statements():
+    current = parse_grants(['GRANT SELECT, INSERT ON `shop`.`orders` TO `app`@`%`'])
+    desired = declared_grants([{'Database': 'shop', 'Table': 'orders', 'Privileges': ['insert', 'select']}])
+    assert statements(('app', '%'), current, desired) == []
+
+
+def test_minimal_statements():
+    current = parse_grants(['GRANT SELECT, INSERT ON `shop`.`orders` TO `app`@`%`',
+                            'GRANT ALL PRIVILEGES ON `logs`.* TO `app`@`%`',
+                            'GRANT SELECT ON `old`.* TO `app`@`%`'])
+    desired = declared_grants([{'Database': 'shop', 'Table': 'orders', 'Privileges': ['SELECT', 'UPDATE']},
+                               {'Database': 'logs', 'Table': '*', 'Privileges': ['SELECT']},
+                               {'Database': 'new', 'Table': '*', 'Privileges': ['ALL']}])
+    assert statements(('app', '%'), current, desired) == [
+        ('REVOKE ALL PRIVILEGES ON `logs`.* FROM %s@%s', ['app', '%']),
+        ('REVOKE SELECT ON `old`.* FROM %s@%s', ['app', '%']),
+        ('REVOKE INSERT ON `shop`.`orders` FROM %s@%s', ['app', '%']),
+        ('GRANT SELECT ON `logs`.* TO %s@%s', ['app', '%']),
+        ('GRANT ALL PRIVILEGES ON `new`.* TO %s@%s', ['app', '%']),
+        ('GRANT UPDATE ON `shop`.`orders` TO %s@%s', ['app', '%']),
+    ]
+
+
+def test_update_grants_in_place(fake_server):
+    reporting = [{'Database': 'reporting', 'Privileges': ['SELECT']}]
+    response = handler(event(Grants=reporting), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.grants[('app', '%')] == {
+        ('app', '*'): {'ALL PRIVILEGES', 'GRANT OPTION'}, ('reporting', '*'): {'SELECT'}}
+
+    changed = [{'Database': 'reporting', 'Privileges': ['SELECT', 'SHOW VIEW']}]
+    response = handler(event('Update', {'Grants': reporting}, Grants=changed), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.grants[('app', '%')][('reporting', '*')] == {'SELECT', 'SHOW VIEW'}
+
+    # unchanged grants are not even read
+    before = fake_server.round_trips
+    response = handler(event('Update', Grants=changed), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.round_trips - before == 1
+
+
+def test_declared_grant_option_is_not_granted_again(fake_server):
+    reporting = [{'Database': 'reporting', 'Privileges': ['SELECT', 'GRANT OPTION']}]
+    response = handler(event(Grants=reporting), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.grants[('app', '%')][('reporting', '*')] == {'SELECT', 'GRANT OPTION'}
+
+    changed = reporting + [{'Database': 'logs', 'Privileges': ['SELECT']}]
+    before = fake_server.round_trips
+    response = handler(event('Update', {'Grants': reporting}, Grants=changed), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert 'reporting' not in ' '.join(s for s, _ in fake_server.statements[before:])
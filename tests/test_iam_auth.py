@@ -0,0 +1,61 @@
+import pytest
+
+import aws_clients
+import conftest
+from conftest import database
+from fake_aws import FakeRDS
+from iam_auth import token_cache
+from mysql_user_provider import handler
+
+
+@pytest.fixture
+def fake_rds(monkeypatch):
+    rds = FakeRDS()
+    monkeypatch.setitem(aws_clients.clients, 'rds', rds)
+    token_cache.clear()
+    yield rds
+    token_cache.clear()
+
+
+# the owner authenticated with an IAM token instead of a password
+owner = {k: v for k, v in dict(database, Host='db.example.com', IAMAuthentication=True).items() if k != 'Password'}
+
+
+def event(user='app'):
+    return conftest.event(User=user, Database=dict(owner))
+
+
+def test_token_is_reused_across_events(fake_server, fake_rds):
+    for user in ['app1', 'app2', 'app3']:
+        response = handler(event(user), {})
+        assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_rds.calls == [('generate_db_auth_token', ['db.example.com', 3306, 'root'])]
+    assert fake_server.connections == 1
+    assert fake_server.connect_arguments[0]['auth_plugin'] == 'mysql_clear_password'
+    assert fake_server.connect_arguments[0]['password'].startswith('db.example.com:3306/?Action=connect')
+
+
+def test_pooled_connection_survives_token_refresh(fake_server, fake_rds, monkeypatch):
+    response = handler(event('app1'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    monkeypatch.setattr(token_cache, 'ttl', 0)
+    response = handler(event('app2'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.connections == 1
+    assert len(fake_rds.calls) == 1
+
+
+def test_rejected_token_is_replaced(fake_server, fake_rds):
+    fake_server.rejected_passwords.add('db.example.com:3306/?Action=connect&DBUser=root&X-Amz-Signature=1')
+    response = handler(event(), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert len(fake_rds.calls) == 2
+    assert fake_server.connections == 2
+
+
+def test_password_and_iam_authentication_are_exclusive(fake_server, fake_rds):
+    request = event()
+    request['ResourceProperties']['Database']['Password'] = 'password'
+    response = handler(request, {})
+    assert response['Status'] == 'FAILED'
+    assert not fake_rds.calls
@@ -0,0 +1,73 @@
+import json
+
+import mysql.connector
+import pytest
+
+import manifest
+from fake_mysql import FakeServer
+
+
+def connection(host):
+    return {'User': 'root', 'Password': 'password', 'Host': host, 'Port': 3306, 'DBName': 'mysql'}
+
+
+@pytest.fixture
+def shards(fake_server, monkeypatch):
+    servers = {'shard%d' % i: FakeServer(connect_latency=0.05) for i in range(3)}
+    monkeypatch.setattr(mysql.connector, 'connect', lambda **kwargs: servers[kwargs['host']].connect(**kwargs))
+    return servers
+
+
+def test_users_are_provisioned_per_server(shards):
+    report = manifest.provision({
+        'Database': connection('shard0'),
+        'DeletionPolicy': 'Drop',
+        'Users': [
+            {'User': 'app1', 'Password': 'secret1'},
+            {'User': 'app2', 'Password': 'secret2', 'Database': [connection('shard1'), connection('shard2')]},
+        ]})
+    assert (report['Created'], report['Dropped'], report['Failed']) == (3, 0, 0)
+    assert list(report['Servers']) == ['shard0:3306:mysql', 'shard1:3306:mysql', 'shard2:3306:mysql']
+    assert ('app1', '%') in shards['shard0'].users and 'app1' in shards['shard0'].schemas
+    assert ('app2', '%') in shards['shard1'].users and ('app2', '%') in shards['shard2'].users
+    assert all(s.connections == 1 for s in shards.values())
+    result = report['Servers']['shard0:3306:mysql']['Users']['app1']
+    assert result['Result'] == 'created' and result['Seconds'] >= 0
+
+
+def test_absent_users_are_dropped(shards):
+    users = [{'User': 'app%d' % i, 'Password': 'secret'} for i in range(3)]
+    manifest.provision({'Database': connection('shard0'), 'Users': users})
+    users[1]['State'] = 'Absent'
+    report = manifest.provision({'Database': connection('shard0'), 'DeletionPolicy': 'Drop', 'Users': users})
+    assert (report['Created'], report['Dropped'], report['Failed']) == (2, 1, 0)
+    assert ('app1', '%') not in shards['shard0'].users
+    assert ('app2', '%') in shards['shard0'].users
+    assert shards['shard0'].connections == 1
+
+
+def test_unreachable_server_fails_its_users(shards):
+    report = manifest.provision({
+        'Database': connection('shard0'),
+        'Users': [{'User': 'app1', 'Password': 'secret'},
+                  {'User': 'app2', 'Password': 'secret', 'Database': connection('unknown')}]})
+    assert (report['Created'], report['Failed']) == (1, 1)
+    assert report['Servers']['unknown:3306:mysql']['Users']['app2']['Result'].startswith('failed')
+
+
+def test_invalid_manifest_is_rejected_before_provisioning(shards):
+    with pytest.raises(ValueError):
+        manifest.provision({'Database': connection('shard0'),
+                            'Users': [{'User': 'app1', 'Password': 'secret'}, {'User': 'app2'}]})
+    assert ('app1', '%') not in shards['shard0'].users
+
+
+def test_cli_plan(shards, tmp_path, capsys):
+    path = tmp_path / 'users.json'
+    path.write_text(json.dumps({'Database': connection('shard0'), 'Users': [{'User': 'app1', 'Password': 'secret'}]}))
+    assert manifest.main(['--plan', str(path)]) == 0
+    output = capsys.readouterr().out
+    assert "CREATE USER IF NOT EXISTS 'app1'@'%'" in output
+    assert 'secret' not in output
+    assert '1 created, 0 dropped, 0 failed on 1 servers' in output
+    assert ('app1', '%') not in shards['shard0'].users
@@ -0,0 +1,79 @@
+from conftest import event
+from mysql_users_provider import handler
+
+
+def tenants(request_type, users, physical_resource_id=None, old_users=None):
+    old_properties = {'Users': [{'User': u, 'Password': 'password'} for u in old_users or []]}
+    return event(request_type, old_properties, physical_resource_id, 'Custom::MySQLUsers', User=None, Password=None,
+                 DeletionPolicy='Drop', Users=[{'User': u, 'Password': 'password'} for u in users])
+
+
+def test_create_update_delete(fake_server):
+    response = handler(tenants('Create', ['tenant1', 'tenant2', 'tenant3']), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['PhysicalResourceId'] == 'mysql:localhost:3306:mysql:users:Whatever'
+    assert response['Data']['Created'] == 3
+    assert set(fake_server.users) == {('tenant1', '%'), ('tenant2', '%'), ('tenant3', '%')}
+    assert fake_server.schemas == {'tenant1', 'tenant2', 'tenant3'}
+    assert fake_server.connections == 1
+
+    request = tenants('Update', ['tenant1', 'tenant2', 'tenant4'], response['PhysicalResourceId'],
+                      old_users=['tenant1', 'tenant2', 'tenant3'])
+    request['ResourceProperties']['Users'][1]['Password'] = 'changed'
+    response = handler(request, {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['Data'] == {'Created': 1, 'Updated': 1, 'Dropped': 1, 'Unchanged': 1, 'Failed': 0}
+    assert set(fake_server.users) == {('tenant1', '%'), ('tenant2', '%'), ('tenant4', '%')}
+
+    response = handler(tenants('Delete', ['tenant1', 'tenant2', 'tenant4'], response['PhysicalResourceId']), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.users == {}
+    assert fake_server.schemas == set()
+
+
+def test_existence_is_checked_with_one_query(fake_server):
+    handler(tenants('Create', ['tenant%d' % i for i in range(20)]), {})
+    queries = [s for s, _ in fake_server.statements if s.startswith('SELECT')]
+    assert len([q for q in queries if 'mysql.user' in q]) == 1
+    assert len([q for q in queries if 'information_schema.schemata' in q]) == 1
+
+
+def test_duplicate_users(fake_server):
+    response = handler(tenants('Create', ['tenant1', 'tenant1']), {})
+    assert response['Status'] == 'FAILED'
+    assert response['PhysicalResourceId'] == 'could-not-create'
+
+
+def test_statements_of_all_users_are_executed_in_one_round_trip(fake_server):
+    handler(tenants('Create', ['tenant%d' % i for i in range(5)]), {})
+    before = fake_server.round_trips
+    response = handler(tenants('Create', ['tenant%d' % i for i in range(100)]), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert len(fake_server.users) == 100
+    writes = [s for s, _ in fake_server.statements[before:] if not s.startswith('SELECT')]
+    assert len(writes) == 1
+    assert fake_server.round_trips - before == 3
+
+
+def test_only_sessions_of_users_with_a_new_password_are_killed(fake_server):
+    handler(tenants('Create', ['tenant1', 'tenant2']), {})
+    fake_server.sessions = [(10, 'tenant1', '10.0.0.1:10', 'Sleep', 10, '', 'tenant1'),
+                            (11, 'tenant2', '10.0.0.1:11', 'Sleep', 10, '', 'tenant2')]
+    request = tenants('Update', ['tenant1', 'tenant2'], 'mysql:localhost:3306:mysql:users:Whatever',
+                      old_users=['tenant1', 'tenant2'])
+    request['ResourceProperties']['ActiveSessions'] = 'Kill'
+    request['ResourceProperties']['Users'][0]['ResourceLimits'] = {'MaxUserConnections': 5}
+    request['ResourceProperties']['Users'][1]['Password'] = 'changed'
+    response = handler(request, {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['Data']['Updated'] == 2
+    assert [s[1] for s in fake_server.sessions] == ['tenant1']
+
+
+def test_failing_statement_fails_only_its_user(fake_server):
+    fake_server.failures = [('CREATE DATABASE IF NOT EXISTS tenant1', 1044)]
+    response = handler(tenants('Create', ['tenant0', 'tenant1', 'tenant2']), {})
+    assert response['Status'] == 'FAILED'
+    assert response['Reason'].startswith('Failed to provision 1 of 3 users, tenant1: ')
+    assert fake_server.schemas == {'tenant0', 'tenant2'}
+    assert set(fake_server.grants) == {('tenant0', '%'), ('tenant2', '%')}
@@ -0,0 +1,41 @@
+import pytest
+
+import conftest
+import mysql_user_provider
+from conftest import database
+from mysql_user_provider import handler
+
+
+# the owner with its password in the Parameter Store
+owner = {k: v for k, v in dict(database, PasswordParameterName='/users/root').items() if k != 'Password'}
+
+
+def event(user):
+    return conftest.event(User=user, Password=None, PasswordParameterName='/users/%s' % user, Database=owner)
+
+
+@pytest.mark.parametrize("parallel_io, first_calls", [(True, 2), (False, 1)])
+def test_create_with_passwords_from_parameter_store(fake_server, fake_aws, monkeypatch, parallel_io, first_calls):
+    monkeypatch.setattr(mysql_user_provider, 'parallel_io', parallel_io)
+    ssm, _ = fake_aws
+    ssm.parameters.update({'/users/root': ('password', 1), '/users/user1': ('p1', 1), '/users/user2': ('p2', 1)})
+
+    response = handler(event('user1'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert len(ssm.calls) == first_calls
+
+    # the owner password is cached, only the user password is fetched
+    response = handler(event('user2'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert ssm.calls[first_calls:] == [('get_parameter', ['/users/user2'])]
+    assert any(params and 'p2' in params for _, params in fake_server.statements)
+
+
+def test_connect_failure_is_reported(fake_server, fake_aws, monkeypatch):
+    monkeypatch.setattr(mysql_user_provider, 'parallel_io', True)
+    ssm, _ = fake_aws
+    ssm.parameters.update({'/users/root': ('password', 1)})
+
+    response = handler(event('user1'), {})
+    assert response['Status'] == 'FAILED'
+    assert '/users/user1' in response['Reason']
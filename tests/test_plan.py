@@ -0,0 +1,89 @@
+import mysql_users_provider
+from conftest import event
+from mysql_user_provider import handler
+
+
+# the properties of a planned request, with a password which must not appear in the plan
+planned = {'Password': 'secret', 'DeletionPolicy': 'Drop', 'Plan': True}
+
+
+def writes(server, before=0):
+    return [s for s, _ in server.statements[before:] if not s.upper().startswith(('SELECT', 'SHOW'))]
+
+
+def test_plan_create(fake_server):
+    response = handler(event('Create', **planned), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert ('app', '%') not in fake_server.users
+    assert not writes(fake_server)
+
+    plan = response['Data']['Plan']
+    assert "CREATE USER IF NOT EXISTS 'app'@'%' IDENTIFIED BY ********" in plan
+    assert 'secret' not in plan and 'password' not in plan
+    assert response['Data']['Statements'] >= response['Data']['RoundTrips'] > 0
+
+
+def test_plan_delete_keeps_user(fake_server):
+    response = handler(event('Create', **dict(planned, Plan=False)), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+
+    before = len(fake_server.statements)
+    response = handler(event('Delete', **planned), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert ('app', '%') in fake_server.users
+    assert 'app' in fake_server.schemas
+    assert not writes(fake_server, before)
+    assert 'DROP USER' in response['Data']['Plan']
+
+
+def test_plan_users(fake_server):
+    request = event('Create', resource_type='Custom::MySQLUsers', **dict(
+        planned, User=None, Password=None, Users=[{'User': 'tenant1', 'Password': 'secret1'},
+                                                  {'User': 'tenant2', 'Password': 'secret2'}]))
+    response = mysql_users_provider.handler(request, {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert not writes(fake_server)
+    assert not [u for u in fake_server.users if u[0].startswith('tenant')]
+    assert "'tenant1'@'%'" in response['Data']['Plan']
+    assert "'tenant2'@'%'" in response['Data']['Plan']
+    assert 'secret1' not in response['Data']['Plan']
+
+
+def test_planned_user_is_created_when_the_plan_is_applied(fake_server):
+    response = handler(event('Create', **planned), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    planned_id = response['PhysicalResourceId']
+    assert planned_id == 'plan:mysql:localhost:3306:mysql:app:app'
+
+    response = handler(event('Update', physical_resource_id=planned_id, **planned), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['PhysicalResourceId'] == planned_id
+    assert ('app', '%') not in fake_server.users
+
+    response = handler(event('Update', {'Plan': True}, physical_resource_id=planned_id,
+                             **dict(planned, Plan=False)), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['PhysicalResourceId'] == 'mysql:localhost:3306:mysql:app:app'
+    assert ('app', '%') in fake_server.users and 'app' in fake_server.schemas
+
+    # CloudFormation deletes the planned resource, which was never applied
+    before = len(fake_server.statements)
+    response = handler(event('Delete', physical_resource_id=planned_id, **dict(planned, Plan=False)), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.statements[before:] == []
+    assert ('app', '%') in fake_server.users
+
+
+def test_planned_users_are_created_when_the_plan_is_applied(fake_server):
+    users = {'User': None, 'Password': None, 'Users': [{'User': 'tenant1', 'Password': 'secret1'}]}
+    response = mysql_users_provider.handler(
+        event('Create', resource_type='Custom::MySQLUsers', **dict(planned, **users)), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['PhysicalResourceId'] == 'plan:mysql:localhost:3306:mysql:users:Whatever'
+
+    response = mysql_users_provider.handler(
+        event('Update', physical_resource_id=response['PhysicalResourceId'], resource_type='Custom::MySQLUsers',
+              **dict(planned, Plan=False, **users)), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['PhysicalResourceId'] == 'mysql:localhost:3306:mysql:users:Whatever'
+    assert ('tenant1', '%') in fake_server.users
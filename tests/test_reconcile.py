@@ -0,0 +1,65 @@
+import mysql.connector
+
+from conftest import database, event
+from mysql_user_provider import handler
+from reconcile import handler as reconcile
+
+
+def create(name, grants=None):
+    response = handler(event(User=name, Grants=grants), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+
+
+def test_no_drift(fake_server):
+    reporting = [{'Database': 'reporting', 'Privileges': ['SELECT']}]
+    create('app1', reporting)
+    create('app2')
+    before = fake_server.round_trips
+    report = reconcile({'Database': database,
+                        'Users': [{'User': 'app1', 'Grants': reporting}, {'User': 'app2'}]}, {})
+    assert report['Drifted'] == 0 and report['Failed'] == 0
+    assert report['Servers']['localhost:3306:mysql'] == {'Checked': 2, 'Drifted': 0, 'Users': []}
+    assert fake_server.round_trips - before == 3
+
+
+def test_declared_grant_option_is_no_drift(fake_server):
+    reporting = [{'Database': 'reporting', 'Privileges': ['SELECT', 'GRANT OPTION']}]
+    create('app1', reporting)
+    report = reconcile({'Database': database, 'Users': [{'User': 'app1', 'Grants': reporting}]}, {})
+    assert report['Drifted'] == 0 and report['Failed'] == 0
+
+
+def test_drift_is_reported_with_statements(fake_server):
+    create('app1', [{'Database': 'reporting', 'Privileges': ['SELECT']}])
+    create('app2')
+    fake_server.users[('app1', '%')]['locked'] = True
+    fake_server.schemas.discard('app2')
+    del fake_server.grants[('app2', '%')][('app2', '*')]
+
+    users = [{'User': 'app1', 'Grants': [{'Database': 'reporting', 'Privileges': ['SELECT', 'INSERT']}]},
+             {'User': 'app2'}, {'User': 'app3'}]
+    report = reconcile({'Database': database, 'Users': users, 'Statements': True}, {})
+    assert report['Drifted'] == 3
+    [app1, app2, app3] = report['Servers']['localhost:3306:mysql']['Users']
+    assert app1['Drift'] == ['user is locked', 'grants differ']
+    assert app1['Statements'] == [['ALTER USER %s@%s ACCOUNT UNLOCK', ['app1', '%']],
+                                  ['GRANT INSERT ON `reporting`.* TO %s@%s', ['app1', '%']]]
+    assert app2['Drift'] == ['database does not exist', 'user does not own its database']
+    assert app2['Statements'] == [['CREATE DATABASE IF NOT EXISTS app2', None],
+                                  ["GRANT ALL ON app2.* TO 'app2'@'%' WITH GRANT OPTION", None]]
+    assert app3 == {'User': 'app3', 'Drift': ['user does not exist'], 'Statements': []}
+
+
+def test_unreachable_server_is_reported(fake_server, monkeypatch):
+    create('app1')
+
+    def connect(**kwargs):
+        if kwargs['host'] != 'localhost':
+            raise mysql.connector.Error(msg="Can't connect to MySQL server", errno=2003)
+        return fake_server.connect(**kwargs)
+
+    monkeypatch.setattr(mysql.connector, 'connect', connect)
+    report = reconcile({'Database': [database, dict(database, Host='shard1')], 'Users': [{'User': 'app1'}]}, {})
+    assert report['Failed'] == 1
+    assert report['Servers']['localhost:3306:mysql']['Drifted'] == 0
+    assert report['Servers']['shard1:3306:mysql']['Error'].startswith('Failed to connect')
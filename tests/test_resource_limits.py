@@ -0,0 +1,58 @@
+import mysql_users_provider
+from conftest import event, statements
+from mysql_user_provider import handler, mysql_password
+
+
+def test_limits_are_set_on_create(fake_server):
+    response = handler(event('Create', ResourceLimits={'MaxUserConnections': 10, 'MaxQueriesPerHour': 1000}), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.users[('app', '%')]['limits'] == {'MAX_QUERIES_PER_HOUR': 1000, 'MAX_USER_CONNECTIONS': 10}
+    assert 'CREATE USER IF NOT EXISTS %s@%s IDENTIFIED BY %s WITH MAX_QUERIES_PER_HOUR 1000 MAX_USER_CONNECTIONS 10' \
+        in statements(fake_server)
+
+
+def test_limits_are_set_with_the_password(fake_server):
+    fake_server.users[('app', '%')] = {}
+    before = fake_server.round_trips
+    response = handler(event('Update', {'ResourceLimits': {'MaxUserConnections': 10}},
+                             ResourceLimits={'MaxUserConnections': 5}), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.round_trips - before == 2
+    assert 'ALTER USER %s@%s IDENTIFIED BY %s WITH MAX_USER_CONNECTIONS 5 ACCOUNT UNLOCK' in \
+        statements(fake_server, before)
+    assert fake_server.users[('app', '%')]['limits'] == {'MAX_USER_CONNECTIONS': 5}
+
+
+def test_removed_limits_are_reset(fake_server):
+    fake_server.users[('app', '%')] = {}
+    response = handler(event('Update', {'ResourceLimits': {'MaxUserConnections': 10, 'MaxUpdatesPerHour': 50}},
+                             ResourceLimits={'MaxUserConnections': 5}), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.users[('app', '%')]['limits'] == {'MAX_UPDATES_PER_HOUR': 0, 'MAX_USER_CONNECTIONS': 5}
+
+
+def test_limits_are_set_when_the_password_is_unchanged(fake_server):
+    password_hash = mysql_password('secret')
+    fake_server.users[('app', '%')] = {'plugin': 'mysql_native_password', 'authentication_string': password_hash}
+    response = handler(event('Update', {'ResourceLimits': None}, ResourceLimits={'MaxUserConnections': 5},
+                             Password=None, PasswordHash=password_hash, AuthPlugin='mysql_native_password'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert [s for s in statements(fake_server) if s.startswith('ALTER USER')] == [
+        'ALTER USER %s@%s WITH MAX_USER_CONNECTIONS 5']
+
+
+def test_limits_are_not_managed_when_absent(fake_server):
+    response = handler(event('Create'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert not [s for s in statements(fake_server) if ' WITH MAX_' in s]
+
+
+def test_limits_of_users(fake_server):
+    request = event('Create', resource_type='Custom::MySQLUsers', User=None, Password=None,
+                    ResourceLimits={'MaxUserConnections': 10},
+                    Users=[{'User': 'tenant1', 'Password': 'password'},
+                           {'User': 'tenant2', 'Password': 'password', 'ResourceLimits': {'MaxUserConnections': 2}}])
+    response = mysql_users_provider.handler(request, {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.users[('tenant1', '%')]['limits'] == {'MAX_USER_CONNECTIONS': 10}
+    assert fake_server.users[('tenant2', '%')]['limits'] == {'MAX_USER_CONNECTIONS': 2}
@@ -0,0 +1,102 @@
+from types import SimpleNamespace
+
+import pytest
+
+import aws_clients
+import mysql_user_provider
+import mysql_users_provider
+from conftest import event
+from fake_aws import FakeLambda
+from mysql_user_provider import MySQLUser
+from schema_drop import SchemaDrop
+
+function_arn = 'arn:aws:lambda:eu-central-1:123456789012:function:binxio-cfn-mysql-user-provider'
+
+
+@pytest.fixture
+def invocations(fake_server, monkeypatch):
+    """
+    records the asynchronous invocations and the responses sent.
+    """
+    client = FakeLambda()
+    responses = []
+    monkeypatch.setitem(aws_clients.clients, 'lambda', client)
+    monkeypatch.setattr(MySQLUser, 'send_response', lambda self: responses.append(dict(self.response)))
+    return client.invocations, responses
+
+
+def context(remaining_millis=900000):
+    return SimpleNamespace(invoked_function_arn=function_arn, get_remaining_time_in_millis=lambda: remaining_millis)
+
+
+def resumable(resource_type='Custom::MySQLUser', physical_resource_id=None, **properties):
+    properties = dict({'DeletionPolicy': 'Drop', 'DropStrategy': 'Chunked', 'Resumable': True}, **properties)
+    return event('Delete', physical_resource_id=physical_resource_id, resource_type=resource_type, **properties)
+
+
+def tenant(server, name, tables):
+    server.users[(name, '%')] = {}
+    server.schemas.add(name)
+    server.tables[name] = set('t%04d' % i for i in range(tables))
+
+
+def test_drop_continues_in_new_invocation(fake_server, invocations, monkeypatch):
+    invoked, responses = invocations
+    tenant(fake_server, 'tenant1', 250)
+    monkeypatch.setattr(SchemaDrop, 'has_time_for', lambda self, seconds: self.dropped < 100)
+
+    request = resumable(User='tenant1')
+    mysql_user_provider.handler(request, context())
+    assert responses == []
+    assert len(invoked) == 1
+    name, invocation_type, payload = invoked[0]
+    assert (name, invocation_type) == (function_arn, 'Event')
+    assert payload['Checkpoint'] == {'TablesDropped': 100}
+    assert payload['Invocation'] == 2
+    assert payload['RequestId'] == request['RequestId']
+
+    mysql_user_provider.handler(payload, context())
+    mysql_user_provider.handler(invoked[1][2], context())
+    assert len(invoked) == 2
+    assert [r['Status'] for r in responses] == ['SUCCESS']
+    assert responses[0]['Data'] == {'TablesDropped': 250, 'TablesRemaining': 0}
+    assert ('tenant1', '%') not in fake_server.users
+
+
+def test_invocations_are_bounded(fake_server, invocations, monkeypatch):
+    invoked, responses = invocations
+    tenant(fake_server, 'tenant1', 250)
+    monkeypatch.setattr(SchemaDrop, 'has_time_for', lambda self, seconds: False)
+    monkeypatch.setattr(mysql_user_provider, 'max_invocations', 3)
+
+    request = resumable(User='tenant1')
+    mysql_user_provider.handler(request, context())
+    mysql_user_provider.handler(invoked[-1][2], context())
+    mysql_user_provider.handler(invoked[-1][2], context())
+    assert len(invoked) == 2
+    assert responses[0]['Status'] == 'FAILED'
+    assert 'did not complete within 3 invocations' in responses[0]['Reason']
+
+
+def test_fan_out_continues_with_remaining_users(fake_server, invocations):
+    invoked, responses = invocations
+    for i in range(3):
+        tenant(fake_server, 'tenant%d' % i, 10)
+
+    users = [{'User': 'tenant%d' % i, 'Password': 'password'} for i in range(3)]
+    request = resumable('Custom::MySQLUsers', 'mysql:localhost:3306:mysql:users:Whatever', User=None, Password=None,
+                        Users=users, DropStrategy='Database')
+    # no time is left after the first user of each invocation
+    mysql_users_provider.handler(request, context(remaining_millis=10000))
+    assert invoked[-1][2]['Checkpoint'] == {'Results': {'tenant0': 'dropped'}}
+    assert set(fake_server.users) == {('tenant1', '%'), ('tenant2', '%')}
+
+    mysql_users_provider.handler(invoked[-1][2], context(remaining_millis=10000))
+    assert invoked[-1][2]['Checkpoint'] == {'Results': {'tenant0': 'dropped', 'tenant1': 'dropped'}}
+    assert responses == []
+
+    mysql_users_provider.handler(invoked[-1][2], context(remaining_millis=10000))
+    assert len(invoked) == 2
+    assert responses[0]['Status'] == 'SUCCESS', responses[0]['Reason']
+    assert responses[0]['Data']['Dropped'] == 3
+    assert fake_server.users == {}
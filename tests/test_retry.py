@@ -0,0 +1,104 @@
+import time
+
+import mysql.connector
+import pytest
+from botocore.exceptions import ClientError
+
+import conftest
+from mysql_user_provider import handler
+from retry import Retry, is_transient
+
+
+def event(**properties):
+    return conftest.event(Grants=[{'Database': 'reporting', 'Privileges': ['SELECT']}], **properties)
+
+
+def client_error(code):
+    return ClientError({'Error': {'Code': code, 'Message': code}}, 'GetParameter')
+
+
+def test_classification():
+    assert is_transient(mysql.connector.Error(msg='Deadlock found', errno=1213))
+    assert is_transient(mysql.connector.Error(msg='Too many connections', errno=1040))
+    assert not is_transient(mysql.connector.Error(msg='Access denied', errno=1045))
+    assert is_transient(client_error('ThrottlingException'))
+    assert not is_transient(client_error('AccessDeniedException'))
+    assert not is_transient(ValueError('invalid'))
+
+
+def test_attempts_are_bounded():
+    calls = []
+
+    def operation():
+        calls.append(1)
+        raise mysql.connector.Error(msg='Lock wait timeout exceeded', errno=1205)
+
+    retry = Retry(attempts=3, base_delay=0.001)
+    with pytest.raises(mysql.connector.Error):
+        retry(operation, 'operation')
+    assert len(calls) == 3
+    assert retry.count == 2
+
+
+def test_no_retry_beyond_deadline():
+    calls = []
+
+    def operation():
+        calls.append(1)
+        raise mysql.connector.Error(msg='Lock wait timeout exceeded', errno=1205)
+
+    retry = Retry(base_delay=0.001, deadline=time.monotonic())
+    with pytest.raises(mysql.connector.Error):
+        retry(operation, 'operation')
+    assert len(calls) == 1
+
+
+def test_connect_is_retried(fake_server):
+    fake_server.failures = [('CONNECT', 1040)]
+    response = handler(event(), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['Data']['Retries'] == 1
+    assert fake_server.connections == 2
+
+
+def test_fatal_error_is_not_retried(fake_server):
+    fake_server.failures = [('CREATE USER', 1396)]
+    response = handler(event(), {})
+    assert response['Status'] == 'FAILED'
+    assert len([s for s, _ in fake_server.statements if 'CREATE USER' in s]) == 1
+
+
+def test_deadlock_resumes_the_batch(fake_server):
+    fake_server.failures = [('GRANT SELECT', 1213)]
+    response = handler(event(), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['Data']['Retries'] == 1
+    batches = [s for s, _ in fake_server.statements if 'GRANT SELECT' in s]
+    assert len(batches) == 2
+    assert batches[1].startswith('GRANT SELECT')
+    assert fake_server.connections == 1
+
+
+def test_lost_connection_is_replaced(fake_server):
+    fake_server.failures = [('GRANT SELECT', 2013)]
+    response = handler(event(), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.connections == 2
+    assert 'SELECT' in fake_server.grants[('app', '%')][('reporting', '*')]
+
+
+def test_throttled_parameter_store_is_retried(fake_server, fake_aws):
+    ssm, _ = fake_aws
+    ssm.parameters['/app/password'] = ('password', 1)
+    get_parameter = ssm.get_parameter
+    failures = [client_error('ThrottlingException')]
+
+    def throttled(**kwargs):
+        if failures:
+            raise failures.pop()
+        return get_parameter(**kwargs)
+
+    ssm.get_parameter = throttled
+    response = handler(event(Password=None, PasswordParameterName='/app/password'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['Data']['Retries'] == 1
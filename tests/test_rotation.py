@@ -0,0 +1,104 @@
+import datetime
+
+import pytest
+
+import rotation
+from mysql_user_provider import mysql_password
+from secret_cache import secret_cache
+
+
+def tags(user, plugin='mysql_native_password'):
+    return {'mysql:user': user, 'mysql:auth-plugin': plugin, 'mysql:host': 'localhost', 'mysql:port': '3306',
+            'mysql:owner': 'root', 'mysql:owner-password-secret-name': 'root'}
+
+
+@pytest.fixture
+def secretsmanager(fake_server, fake_aws):
+    _, secretsmanager = fake_aws
+    secretsmanager.secrets['root'] = 'password'
+    for i in range(4):
+        name = '/mysql/tenant%d' % i
+        secretsmanager.secrets[name] = 'secret%d' % i
+        secretsmanager.tags[name] = tags('tenant%d' % i)
+        fake_server.users[('tenant%d' % i, '%')] = {
+            'plugin': 'mysql_native_password', 'authentication_string': mysql_password('secret%d' % i),
+            'locked': False}
+    return secretsmanager
+
+
+def alter_statements(server):
+    return [s for s, _ in server.statements if 'ALTER USER' in s]
+
+
+def test_rotation_steps(fake_server, secretsmanager):
+    secretsmanager.rotate_secret(SecretId='/mysql/tenant0', ClientRequestToken='token')
+    for step in ['createSecret', 'createSecret', 'setSecret', 'testSecret', 'finishSecret']:
+        rotation.handler({'SecretId': '/mysql/tenant0', 'ClientRequestToken': 'token', 'Step': step}, None)
+
+    password = secretsmanager.secrets['/mysql/tenant0']
+    assert password != 'secret0' and len(password) == rotation.password_length
+    assert secretsmanager.versions['/mysql/tenant0'] == 'token'
+    assert len([c for c in secretsmanager.calls if c[0] == 'put_secret_value']) == 1
+    assert fake_server.users[('tenant0', '%')]['authentication_string'] == mysql_password(password)
+    assert len(alter_statements(fake_server)) == 1
+
+
+def test_rotation_does_not_unlock_a_retained_user(fake_server, secretsmanager):
+    fake_server.users[('tenant0', '%')]['locked'] = True
+    report = rotation.handler({'MaxAge': 30}, None)
+    assert report['Servers']['localhost:3306:mysql']['/mysql/tenant0'] == 'rotated'
+    assert fake_server.users[('tenant0', '%')]['locked']
+    assert not fake_server.users[('tenant1', '%')]['locked']
+    assert not any('ACCOUNT UNLOCK' in s for s in alter_statements(fake_server))
+
+
+def test_finished_rotation_is_not_repeated(fake_server, secretsmanager):
+    secretsmanager.rotate_secret(SecretId='/mysql/tenant0', ClientRequestToken='token')
+    for step in ['createSecret', 'setSecret', 'testSecret', 'finishSecret']:
+        rotation.handler({'SecretId': '/mysql/tenant0', 'ClientRequestToken': 'token', 'Step': step}, None)
+    before = len(fake_server.statements)
+    rotation.handler({'SecretId': '/mysql/tenant0', 'ClientRequestToken': 'token', 'Step': 'setSecret'}, None)
+    assert len(fake_server.statements) == before
+
+
+def test_untagged_secret_cannot_be_rotated(secretsmanager):
+    secretsmanager.rotate_secret(SecretId='root', ClientRequestToken='token')
+    with pytest.raises(ValueError):
+        rotation.handler({'SecretId': 'root', 'ClientRequestToken': 'token', 'Step': 'createSecret'}, None)
+
+
+def test_due_secrets_are_rotated_per_server(fake_server, secretsmanager):
+    secretsmanager.changed['/mysql/tenant3'] = datetime.datetime.now(datetime.timezone.utc)
+    report = rotation.handler({'MaxAge': 30}, None)
+    assert (report['Rotated'], report['Failed'], report['Skipped']) == (3, 0, 0)
+    assert list(report['Servers']['localhost:3306:mysql']) == ['/mysql/tenant0', '/mysql/tenant1', '/mysql/tenant2']
+    assert len(alter_statements(fake_server)) == 1
+    assert fake_server.connections == 1
+    for i in range(3):
+        password = secretsmanager.secrets['/mysql/tenant%d' % i]
+        assert fake_server.users[('tenant%d' % i, '%')]['authentication_string'] == mysql_password(password)
+    assert secretsmanager.secrets['/mysql/tenant3'] == 'secret3'
+
+
+def test_failed_password_does_not_hold_up_the_others(fake_server, secretsmanager):
+    fake_server.failures = [('ALTER USER', 1396), ('ALTER USER', 1396)]
+    report = rotation.handler({'MaxAge': 30}, None)
+    assert (report['Rotated'], report['Failed']) == (3, 1)
+    assert report['Servers']['localhost:3306:mysql']['/mysql/tenant0'].startswith('failed')
+    assert secretsmanager.secrets['/mysql/tenant0'] == 'secret0'
+    assert secretsmanager.secrets['/mysql/tenant1'] != 'secret1'
+
+
+def test_rotated_password_is_not_served_from_the_cache(fake_server, secretsmanager):
+    secret_cache.get_many([('secretsmanager', '/mysql/tenant0')], lambda kind: secretsmanager)
+    rotation.handler({'MaxAge': 30}, None)
+    password = secret_cache.get_many([('secretsmanager', '/mysql/tenant0')], lambda kind: secretsmanager)
+    assert password[('secretsmanager', '/mysql/tenant0')] == secretsmanager.secrets['/mysql/tenant0']
+
+
+def test_password_without_hash_is_tested_by_logging_in(fake_server, secretsmanager):
+    secretsmanager.tags['/mysql/tenant0'] = dict(tags('tenant0'))
+    secretsmanager.tags['/mysql/tenant0'].pop('mysql:auth-plugin')
+    report = rotation.handler({'MaxAge': 30}, None)
+    assert fake_server.connect_arguments[-1]['user'] == 'tenant0'
+    assert report['Servers']['localhost:3306:mysql']['/mysql/tenant0'] == 'rotated'
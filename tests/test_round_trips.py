@@ -0,0 +1,55 @@
+import pytest
+
+from conftest import event
+from mysql_user_provider import handler
+
+
+def round_trips(server, request):
+    before = server.round_trips
+    response = handler(request, {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    return server.round_trips - before
+
+
+def test_create_user_with_database_in_single_round_trip(fake_server):
+    # the version is probed once per endpoint
+    assert round_trips(fake_server, event(User='user1')) == 2
+    assert round_trips(fake_server, event(User='user2')) == 1
+    assert ('user2', '%') in fake_server.users
+    assert 'user2' in fake_server.schemas
+
+    # adopting an existing user and database
+    assert round_trips(fake_server, event(User='user2')) == 1
+
+
+@pytest.mark.parametrize("deletion_policy", ['Drop', 'Retain'])
+def test_delete_in_single_round_trip(fake_server, deletion_policy):
+    round_trips(fake_server, event(User='user1'))
+    request = event('Delete', User='user1', DeletionPolicy=deletion_policy)
+    assert round_trips(fake_server, request) == 1
+    assert (('user1', '%') in fake_server.users) == (deletion_policy == 'Retain')
+
+
+def test_older_servers_use_existence_checks(fake_server):
+    fake_server.version = '5.6.51'
+    assert round_trips(fake_server, event(User='user1')) == 6
+    assert ('user1', '%') in fake_server.users
+    assert round_trips(fake_server, event(User='user1')) == 4
+
+
+@pytest.mark.parametrize("version, deletion_policy, statement", [
+    ('5.6.51', 'Drop', 'DROP USER %s@%s'),
+    ('5.7.7', 'Retain', 'ALTER USER %s@%s ACCOUNT LOCK'),
+    ('5.6.51', 'Retain', 'SET PASSWORD FOR %s@%s = %s'),
+])
+def test_older_servers_drop_the_user_on_its_host(fake_server, version, deletion_policy, statement):
+    fake_server.version = version
+    round_trips(fake_server, event(User='app@10.0.0.%', WithDatabase=False))
+    round_trips(fake_server, event('Delete', physical_resource_id='mysql:localhost:3306:mysql::app@10.0.0.%',
+                                   User='app@10.0.0.%', WithDatabase=False, DeletionPolicy=deletion_policy))
+    [params] = [p for s, p in fake_server.statements if s == statement]
+    assert params[:2] == ['app', '10.0.0.%']
+    if deletion_policy == 'Drop':
+        assert ('app', '10.0.0.%') not in fake_server.users
+    elif statement.startswith('ALTER'):
+        assert fake_server.users[('app', '10.0.0.%')]['locked']
@@ -0,0 +1,90 @@
+import pytest
+
+from conftest import event, statements
+from mysql_user_provider import handler
+from schema_drop import SchemaDrop
+
+
+def dropping(user, strategy):
+    return event('Delete', User=user, DeletionPolicy='Drop', DropStrategy=strategy)
+
+
+@pytest.fixture
+def tenant(fake_server):
+    def create(name, tables):
+        fake_server.users[(name, '%')] = {}
+        fake_server.schemas.add(name)
+        fake_server.tables[name] = set('t%04d' % i for i in range(tables))
+    return create
+
+
+def executed(server, prefix):
+    return [s for s in statements(server) if s.startswith(prefix)]
+
+
+def test_chunked_drop(fake_server, tenant):
+    tenant('tenant1', 250)
+    response = handler(dropping('tenant1', 'Chunked'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['Data'] == {'TablesDropped': 250, 'TablesRemaining': 0}
+    assert len(executed(fake_server, 'DROP TABLE')) == 3
+    assert 'tenant1' not in fake_server.schemas
+    assert ('tenant1', '%') not in fake_server.users
+
+
+def test_chunked_drop_resumes_after_time_limit(fake_server, tenant, monkeypatch):
+    tenant('tenant1', 250)
+    with monkeypatch.context() as m:
+        m.setattr(SchemaDrop, 'has_time_for', lambda self, seconds: self.dropped < 100)
+        response = handler(dropping('tenant1', 'Chunked'), {})
+    assert response['Status'] == 'FAILED'
+    assert 'dropped 100 tables of database tenant1, 150 remaining' in response['Reason']
+    assert len(fake_server.tables['tenant1']) == 150
+    assert ('tenant1', '%') in fake_server.users
+
+    response = handler(dropping('tenant1', 'Chunked'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['Data'] == {'TablesDropped': 150, 'TablesRemaining': 0}
+    assert 'tenant1' not in fake_server.schemas
+
+
+def test_rename_drop_is_purged_by_the_next_drop(fake_server, tenant, monkeypatch):
+    tenant('tenant1', 250)
+    tenant('tenant2', 10)
+    with monkeypatch.context() as m:
+        m.setattr(SchemaDrop, 'has_time_for', lambda self, seconds: False)
+        response = handler(dropping('tenant1', 'Rename'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert 'tenant1' not in fake_server.schemas
+    [holding] = [s for s in fake_server.schemas if s.startswith('_dropped_tenant1_')]
+    assert len(fake_server.tables[holding]) == 250
+
+    response = handler(dropping('tenant2', 'Rename'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.schemas == set()
+    assert response['Data'] == {'TablesDropped': 260, 'TablesRemaining': 0}
+
+
+def test_blocked_drop_gives_up(fake_server, tenant):
+    tenant('tenant1', 10)
+    fake_server.sessions.append((12, 'tenant1', '10.0.0.1:5432', 'Query', 600, 'Sending data', 'tenant1'))
+    fake_server.locked.add('tenant1')
+    response = handler(dropping('tenant1', 'Chunked'), {})
+    assert response['Status'] == 'FAILED'
+    assert 'delete again to resume' in response['Reason']
+    assert executed(fake_server, 'SET SESSION')[-2:] == [
+        'SET SESSION foreign_key_checks = DEFAULT', 'SET SESSION lock_wait_timeout = DEFAULT']
+
+
+@pytest.mark.parametrize('strategy', ['Chunked', 'Rename'])
+def test_views_and_triggers_are_dropped_before_the_tables(fake_server, tenant, strategy):
+    tenant('tenant1', 10)
+    fake_server.views['tenant1'] = {'report'}
+    fake_server.triggers['tenant1'] = {'audit': 't0001'}
+    response = handler(dropping('tenant1', strategy), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['Data'] == {'TablesDropped': 10, 'TablesRemaining': 0}
+    assert executed(fake_server, 'DROP VIEW') + executed(fake_server, 'DROP TRIGGER') == [
+        'DROP VIEW IF EXISTS `tenant1`.`report`', 'DROP TRIGGER IF EXISTS `tenant1`.`audit`']
+    assert fake_server.schemas == set()
+    assert fake_server.views == {} and fake_server.triggers == {}
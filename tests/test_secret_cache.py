@@ -0,0 +1,73 @@
+import time
+
+from fake_aws import FakeSSM, FakeSecretsManager
+from secret_cache import SecretCache
+
+
+def test_cache_hit_within_ttl():
+    ssm = FakeSSM({'/root': ('password', 1)})
+    cache = SecretCache(ttl=60)
+    assert cache.get_many([('ssm', '/root')], lambda kind: ssm) == {('ssm', '/root'): 'password'}
+    assert cache.get_many([('ssm', '/root')], lambda kind: ssm) == {('ssm', '/root'): 'password'}
+    assert len(ssm.calls) == 1
+    assert cache.stats()['hits'] == 1
+
+
+def test_refetch_after_ttl_and_on_refresh():
+    ssm = FakeSSM({'/root': ('password', 1)})
+    cache = SecretCache(ttl=60)
+    cache.get_many([('ssm', '/root')], lambda kind: ssm)
+    cache.entries[('ssm', '/root')].fetched = time.time() - 61
+    ssm.parameters['/root'] = ('rotated', 2)
+    assert cache.get_many([('ssm', '/root')], lambda kind: ssm)[('ssm', '/root')] == 'rotated'
+    assert cache.entries[('ssm', '/root')].version == 2
+
+    cache.get_many([('ssm', '/root')], lambda kind: ssm, refresh=[('ssm', '/root')])
+    assert len(ssm.calls) == 3
+
+
+def test_fixed_parameter_version_does_not_expire():
+    ssm = FakeSSM({'/root:3': ('password', 3)})
+    cache = SecretCache(ttl=60)
+    cache.get_many([('ssm', '/root:3')], lambda kind: ssm)
+    cache.entries[('ssm', '/root:3')].fetched = time.time() - 3600
+    cache.get_many([('ssm', '/root:3')], lambda kind: ssm)
+    assert len(ssm.calls) == 1
+
+
+def test_misses_are_fetched_in_batch():
+    ssm = FakeSSM({'/a': ('a', 1), '/b': ('b', 1)})
+    secretsmanager = FakeSecretsManager({'c': 'c', 'd': 'd'})
+    clients = {'ssm': ssm, 'secretsmanager': secretsmanager}
+    result = SecretCache().get_many(
+        [('ssm', '/a'), ('ssm', '/b'), ('secretsmanager', 'c'), ('secretsmanager', 'd')], clients.get)
+
+    assert result == {('ssm', '/a'): 'a', ('ssm', '/b'): 'b', ('secretsmanager', 'c'): 'c',
+                      ('secretsmanager', 'd'): 'd'}
+    assert ssm.calls == [('get_parameters', ['/a', '/b'])]
+    assert secretsmanager.calls == [('batch_get_secret_value', ['c', 'd'])]
+
+
+def test_cache_is_bounded():
+    ssm = FakeSSM({'/a': ('a', 1), '/b': ('b', 1), '/c': ('c', 1)})
+    cache = SecretCache(max_size=2)
+    for name in ['/a', '/b', '/c']:
+        cache.get_many([('ssm', name)], lambda kind: ssm)
+    assert list(cache.entries.keys()) == [('ssm', '/b'), ('ssm', '/c')]
+
+
+def test_stale_version_is_evicted_by_version():
+    ssm = FakeSSM({'/root': ('password', 1)})
+    cache = SecretCache(ttl=60)
+    versions = {}
+    cache.get_many([('ssm', '/root')], lambda kind: ssm, versions=versions)
+    assert versions == {('ssm', '/root'): 1}
+
+    ssm.parameters['/root'] = ('rotated', 2)
+    cache.get_many([('ssm', '/root')], lambda kind: ssm, refresh=[('ssm', '/root')])
+    cache.invalidate(('ssm', '/root'), versions[('ssm', '/root')])
+    assert cache.get_many([('ssm', '/root')], lambda kind: ssm) == {('ssm', '/root'): 'rotated'}
+    assert len(ssm.calls) == 2
+
+    cache.invalidate(('ssm', '/root'), 2)
+    assert ('ssm', '/root') not in cache.entries
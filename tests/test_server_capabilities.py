@@ -0,0 +1,40 @@
+import pytest
+
+from fake_mysql import FakeServer
+from server_capabilities import ServerCapabilities, CapabilitiesCache
+
+
+@pytest.mark.parametrize("version_string, vendor, version, account_lock, drop_user_if_exists", [
+    ('8.0.35', 'MySQL', (8, 0, 35), True, True),
+    ('5.7.44-log', 'MySQL', (5, 7, 44), True, True),
+    ('5.7.7', 'MySQL', (5, 7, 7), True, False),
+    ('5.6.51', 'MySQL', (5, 6, 51), False, False),
+    ('10.3.39-MariaDB', 'MariaDB', (10, 3, 39), False, True),
+    ('5.5.5-10.6.14-MariaDB-log', 'MariaDB', (10, 6, 14), True, True),
+    ('5.7.mysql_aurora.2.11.2', 'Aurora', (5, 7, 12), True, True),
+    ('8.0.mysql_aurora.3.04.0', 'Aurora', (8, 0, 23), True, True),
+])
+def test_parse_version(version_string, vendor, version, account_lock, drop_user_if_exists):
+    capabilities = ServerCapabilities(version_string)
+    assert capabilities.vendor == vendor
+    assert capabilities.version == version
+    assert capabilities.account_lock == account_lock
+    assert capabilities.drop_user_if_exists == drop_user_if_exists
+
+
+def test_auth_plugins():
+    assert 'caching_sha2_password' in ServerCapabilities('8.0.35').auth_plugins
+    assert 'caching_sha2_password' not in ServerCapabilities('5.7.44').auth_plugins
+    assert 'AWSAuthenticationPlugin' not in ServerCapabilities('10.5.1-MariaDB').auth_plugins
+
+
+def test_detect_once_per_endpoint():
+    server = FakeServer('8.0.35')
+    cache = CapabilitiesCache()
+    cache.detect(server.connect(), ('localhost', 3306))
+    cache.detect(server.connect(), ('localhost', 3306))
+    assert server.round_trips == 1
+
+    server.version = '8.0.36'
+    assert cache.detect(server.connect(), ('localhost', 3306)).version == (8, 0, 36)
+    assert server.round_trips == 2
@@ -0,0 +1,89 @@
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import conftest
+import sessions
+from conftest import statements
+from mysql_user_provider import handler, mysql_password
+
+
+def event(request_type, active_sessions, **properties):
+    return conftest.event(request_type, {'Password': 'old'}, ActiveSessions=active_sessions, **properties)
+
+
+def session(session_id, command='Sleep', user='app'):
+    return (session_id, user, '10.0.0.1:%d' % session_id, command, 10, '', 'app')
+
+
+def test_sessions_are_kept_by_default(fake_server):
+    fake_server.sessions = [session(10), session(11)]
+    response = handler(event('Update', 'Keep'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert len(fake_server.sessions) == 2
+
+
+def test_sessions_are_killed_in_a_single_batch(fake_server):
+    fake_server.users[('app', '%')] = {}
+    fake_server.sessions = [session(10), session(11, 'Query'), session(12, user='other')]
+    before = fake_server.round_trips
+    response = handler(event('Delete', 'Kill'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert response['Data']['SessionsKilled'] == 2
+    assert fake_server.sessions == [session(12, user='other')]
+    assert ('KILL 10;\nKILL 11', []) in fake_server.statements[before:]
+    assert fake_server.users[('app', '%')]['locked']
+
+
+def test_rds_kill_is_used_when_kill_is_not_allowed(fake_server):
+    fake_server.rds = True
+    fake_server.sessions = [session(10), session(11)]
+    response = handler(event('Update', 'Kill'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.sessions == []
+    assert [s for s in statements(fake_server) if 'rds_kill' in s] == ['CALL mysql.rds_kill(%s)'] * 2
+
+
+def test_active_sessions_are_drained(fake_server, monkeypatch):
+    fake_server.sessions = [session(10), session(11, 'Query')]
+
+    def finish_queries(seconds):
+        fake_server.sessions = [session(s[0]) for s in fake_server.sessions]
+
+    monkeypatch.setattr(sessions, 'time', SimpleNamespace(monotonic=time.monotonic, sleep=finish_queries))
+    response = handler(event('Update', 'Drain'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.sessions == []
+    assert statements(fake_server).count(
+        'SELECT id, command, time FROM information_schema.processlist WHERE user = %s AND id <> CONNECTION_ID()') == 2
+
+
+def test_drain_is_bounded(fake_server, monkeypatch):
+    monkeypatch.setattr(sessions, 'drain_interval', 0.01)
+    fake_server.sessions = [session(10, 'Query')]
+    start = time.monotonic()
+    response = handler(event('Update', 'Drain', DrainTimeout=0), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert time.monotonic() - start < 1
+    assert fake_server.sessions == []
+
+
+@pytest.mark.parametrize('old', [{'Grants': None}, {'ResourceLimits': {'MaxUserConnections': 5}}])
+def test_sessions_are_kept_when_the_password_is_unchanged(fake_server, old):
+    fake_server.sessions = [session(10), session(11)]
+    response = handler(conftest.event('Update', old, ActiveSessions='Kill', ResourceLimits={'MaxUserConnections': 10},
+                                      Grants=[{'Database': 'sales', 'Privileges': ['SELECT']}]), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert len(fake_server.sessions) == 2
+    assert 'SessionsKilled' not in response.get('Data', {})
+
+
+def test_verified_password_which_is_unchanged_keeps_the_sessions(fake_server):
+    fake_server.users[('app', '%')] = {'plugin': 'mysql_native_password',
+                                       'authentication_string': mysql_password('password'), 'locked': False}
+    fake_server.sessions = [session(10)]
+    response = handler(conftest.event('Update', {'Password': 'old'}, ActiveSessions='Kill',
+                                      AuthPlugin='mysql_native_password'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert len(fake_server.sessions) == 1
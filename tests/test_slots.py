@@ -0,0 +1,102 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+import slots
+from conftest import event
+from mysql_user_provider import MySQLUser, handler
+
+
+@pytest.fixture
+def limited(fake_server, monkeypatch):
+    monkeypatch.setattr(slots, 'endpoint_concurrency', 2)
+    monkeypatch.setattr(slots, 'slot_wait', 5)
+    return fake_server
+
+
+def slot_statements(server):
+    return [s for s, _ in server.statements if 'GET_LOCK' in s or 'RELEASE_LOCK' in s]
+
+
+def test_slot_is_freed_before_the_connection_is_pooled(limited):
+    response = handler(event(), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert limited.named_locks == {}
+    assert len(slot_statements(limited)) == 2
+
+    response = handler(event(User='other'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert limited.connections == 1
+
+
+def test_operations_on_a_server_are_limited(limited, monkeypatch):
+    limited.latency = 0.02
+    get_lock, held = limited.get_lock, []
+
+    def counting_get_lock(name, connection, timeout=0):
+        result = get_lock(name, connection, timeout)
+        held.append(len([n for n in limited.named_locks if ':slot:' in n]))
+        return result
+
+    monkeypatch.setattr(limited, 'get_lock', counting_get_lock)
+    responses = []
+    threads = [threading.Thread(target=lambda u=u: responses.append(MySQLUser().handle(event(User=u), {})))
+               for u in ['app%d' % i for i in range(6)]]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert all(r['Status'] == 'SUCCESS' for r in responses), [r['Reason'] for r in responses]
+    assert max(held) == 2
+    assert all(('app%d' % i, '%') in limited.users for i in range(6))
+    assert limited.named_locks == {}
+
+
+def test_wait_for_a_slot_is_bounded(limited, monkeypatch):
+    monkeypatch.setattr(slots, 'slot_wait', 0.2)
+    other = object()
+    for slot in range(2):
+        limited.get_lock('cfn-mysql-user-provider:slot:%d' % slot, other)
+
+    start = time.monotonic()
+    response = handler(event(), {})
+    assert response['Status'] == 'FAILED'
+    assert 'no slot on localhost came free' in response['Reason']
+    assert time.monotonic() - start < 2
+    assert set(limited.named_locks.values()) == {other}
+
+
+def test_waiting_operation_holds_no_connection(limited, monkeypatch):
+    other = object()
+    for slot in range(2):
+        limited.get_lock('cfn-mysql-user-provider:slot:%d' % slot, other)
+    open_while_waiting = []
+
+    def slot_comes_free(seconds):
+        open_while_waiting.append(limited.open_connections)
+        limited.release_locks(other)
+
+    monkeypatch.setattr(slots, 'time', SimpleNamespace(monotonic=time.monotonic, sleep=slot_comes_free))
+    response = handler(event(), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert open_while_waiting == [0]
+    assert limited.connections == 2
+    assert limited.named_locks == {}
+
+
+def test_server_with_a_single_named_lock_is_polled_without_queue(limited):
+    limited.version = '5.6.40'
+    response = handler(event(), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert not [s for s in slot_statements(limited) if s.startswith('SELECT GET_LOCK')]
+
+
+def test_plan_takes_no_slot(limited):
+    request = event()
+    request['ResourceProperties']['Plan'] = True
+    response = handler(request, {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert not slot_statements(limited)
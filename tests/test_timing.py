@@ -0,0 +1,55 @@
+import io
+import json
+
+import pytest
+
+from conftest import event
+from mysql_user_provider import handler
+from test_round_trips import round_trips
+from timing import timings
+
+
+@pytest.fixture
+def output(monkeypatch):
+    stream = io.StringIO()
+    monkeypatch.setattr(timings, 'stream', stream)
+    monkeypatch.setattr(timings, 'sample_rate', 1.0)
+    return stream
+
+
+def documents(stream):
+    return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+
+def test_phases_are_written_in_embedded_metric_format(fake_server, output):
+    response = handler(event(User='user1'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+
+    [document] = documents(output)
+    metrics = document['_aws']['CloudWatchMetrics'][0]
+    assert metrics['Dimensions'] == [['Host', 'RequestType']]
+    assert document['Host'] == 'localhost' and document['RequestType'] == 'Create'
+    assert document['Status'] == 'SUCCESS'
+    assert all(m['Name'] in document for m in metrics['Metrics'])
+
+    phases = [p['phase'] for p in document['phases']]
+    assert phases == ['connect', 'detect', 'sql']
+    assert document['phases'][2]['statement'] == 'CREATE USER; ALTER USER; CREATE DATABASE; GRANT ALL'
+    assert document['Statements'] == 1
+    assert 'password' not in output.getvalue()
+
+
+def test_statements_are_timed_individually(fake_server, output):
+    fake_server.version = '5.6.40'
+    round_trips(fake_server, event(User='user1'))
+
+    [document] = documents(output)
+    assert [p.get('statement') for p in document['phases'] if p['phase'] == 'sql'] == [
+        'SELECT *', 'CREATE USER', 'SELECT SCHEMA_NAME', 'CREATE DATABASE', 'GRANT ALL']
+
+
+def test_timings_can_be_switched_off(fake_server, output, monkeypatch):
+    monkeypatch.setattr(timings, 'sample_rate', 0)
+    response = handler(event(User='user1'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert output.getvalue() == ''
@@ -0,0 +1,55 @@
+import pytest
+
+import mysql_user_provider
+from conftest import database, event
+from mysql_user_provider import handler
+
+
+def secured(user='app', **connection):
+    return event(User=user, Database=dict(database, **connection))
+
+
+def tls_arguments(server):
+    return [{k: v for k, v in a.items() if k.startswith('ssl')} for a in server.connect_arguments]
+
+
+@pytest.mark.parametrize('mode, arguments', [
+    ('Preferred', {}),
+    ('Disabled', {'ssl_disabled': True}),
+    ('Required', {'ssl_ca': mysql_user_provider.rds_ca_bundle, 'ssl_verify_cert': False,
+                  'ssl_verify_identity': False}),
+    ('VerifyCA', {'ssl_ca': mysql_user_provider.rds_ca_bundle, 'ssl_verify_cert': True,
+                  'ssl_verify_identity': False}),
+    ('VerifyIdentity', {'ssl_ca': mysql_user_provider.rds_ca_bundle, 'ssl_verify_cert': True,
+                        'ssl_verify_identity': True}),
+])
+def test_ssl_modes(fake_server, mode, arguments):
+    response = handler(secured(SSLMode=mode), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert tls_arguments(fake_server) == [arguments]
+
+
+def test_custom_ca_bundle(fake_server):
+    response = handler(secured(SSLMode='VerifyIdentity', SSLCA='/opt/ca/bundle.pem'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert tls_arguments(fake_server)[0]['ssl_ca'] == '/opt/ca/bundle.pem'
+
+
+def test_encrypted_connections_are_reused(fake_server):
+    for user in ['app1', 'app2', 'app3']:
+        response = handler(secured(user, SSLMode='VerifyIdentity'), {})
+        assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.connections == 1
+
+    response = handler(secured('app4', SSLMode='Disabled'), {})
+    assert response['Status'] == 'SUCCESS', response['Reason']
+    assert fake_server.connections == 2
+
+
+def test_iam_authentication_requires_tls(fake_server):
+    request = secured(SSLMode='Disabled', IAMAuthentication=True)
+    del request['ResourceProperties']['Database']['Password']
+    response = handler(request, {})
+    assert response['Status'] == 'FAILED'
+    assert 'IAM authentication requires TLS' in response['Reason']
+    assert fake_server.connections == 0